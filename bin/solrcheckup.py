@@ -36,63 +36,30 @@ This script should run fine in cron.
 """
 
 import argparse
+import collections
 import io
 import logging
 import os
 import re
 import smtplib
-import sqlite3
 import sys
 import tempfile
-import time
-from sqlite3 import Error
-
-import requests
 
 from siskin.mail import send_mail
-from six.moves.urllib.parse import urlencode
+from siskin.metrics import MetricsStore
+from siskin.solr import SolrClient
 
 logging.basicConfig(level=logging.DEBUG)
 
-# The current database schema.
-create_schema = """
-    CREATE TABLE
-        source
-            (source INT PRIMARY KEY NOT NULL);
-
-    CREATE TABLE
-        institution
-            (institution VARCHAR(30) PRIMARY KEY NOT NULL);
-
-    CREATE TABLE
-        sourcebyinstitution
-            (sourcebyinstitution VARCHAR(30) PRIMARY KEY NOT NULL);
-
-    CREATE TABLE
-        history
-            (date DEFAULT CURRENT_TIMESTAMP,
-            sourcebyinstitution VARCHAR(30) NOT NULL,
-            titles INT NOT NULL);
-"""
-
-# Via #15656, #note-3
-#
-# datum, source_id, collection, institution, anzahl
+# Title counts are kept in a siskin.metrics.MetricsStore: per run, the
+# number of titles per source, per institution and per source and
+# institution, refs. #15656, #note-3. This is idea (a), a generic time series:
 #
 # datum, source_id, institution, anzahl
-# datum, collection, institution, anzahl
-#
-# Some other ideas.
-#
-# (a) Generic time series approach with: time, key, value; where key could be
-# various metrics, like "sid:0", "sid:0,isil:DE-15", "isil:DE-15", ...
 #
-# (b) Something, where we could piggyback on some frontend, e.g. kibana /
-# elasticsearch.
-#
-# (c) Logging only. Log some structured JSON to a file and then write and run
-# analyzer scripts for reports.
-
+# Other ideas were (b) something, where we could piggyback on some frontend,
+# e.g. kibana / elasticsearch or (c) logging only. Log some structured JSON to
+# a file and then write and run analyzer scripts for reports.
 
 
 # XXX: Encapsulate this better, to get rid of globals.
@@ -123,270 +90,106 @@ def send_message(message):
               password=smtp_password)
 
 
-def create_connection_and_set_cursor(database):
+# One client (and connection pool) per index.
+clients = {}
+
+
+def get_solr_client(index):
     """
-    Creates a database connection to a SQLite database and returns a cursor
+    Return a shared client for an index, which should be hostport or ip:port,
+    like 10.1.1.1:8085.
     """
-    try:
-        conn = sqlite3.connect(database)
-    except Error as e:
-        logging.error(e)
-        sys.exit("No database connection could be established.")
-    cursor = conn.cursor()
-    return (conn, cursor)
+    if index not in clients:
+        clients[index] = SolrClient(index)
+    return clients[index]
 
 
-def get_solr_result(index, params):
+def is_valid_institution(institution):
     """
-    Takes a Solr index and a dict of parameters and returns a result object.
-    Index should be hostport or ip:port, like 10.1.1.1:8085.
+    Skip facet values like "", " " or "\" \"".
     """
-    params = urlencode(params)
-    result = requests.get("http://%s/solr/biblio/select?%s" % (index, params))
-    return result.json()
+    return institution and institution != " " and '"' not in institution
 
 
 def get_all_current_sources(k10plus, ai):
     """
-    Get all current sources from Solr in both k10plus main index and ai.
+    Get the number of titles of all current sources from Solr in both k10plus
+    main index and ai.
     """
-    params = {
-        "facet": "true",
-        "facet.field": "source_id",
-        "facet.mincount": 3, # because of these cases ["", 2, "\" \"", 1]
-        "q": "!source_id:error",
-        "rows": 0,
-        "wt": "json",
-    }
-
-    result = get_solr_result(k10plus, params)
-    k10plus_sources = result["facet_counts"]["facet_fields"]["source_id"]
-    k10plus_sources = set([int(sid) for sid in k10plus_sources[::2]])
-
-    result = get_solr_result(ai, params)
-    ai_sources = result["facet_counts"]["facet_fields"]["source_id"]
-    ai_sources = set([int(sid) for sid in ai_sources[::2]])
-
-    shared = k10plus_sources.intersection(ai_sources)
+    counts = {}
+    for index in (k10plus, ai):
+        # mincount because of these cases ["", 2, "\" \"", 1]
+        facets = get_solr_client(index).facet("source_id", q="!source_id:error", mincount=3)
+        counts[index] = dict((int(sid), number) for sid, number in facets.items())
+
+    shared = set(counts[k10plus]).intersection(counts[ai])
     if len(shared) > 0:
-        ssid = [str(sid) for sid in shared]
+        ssid = [str(sid) for sid in sorted(shared)]
         message = u"Die folgenden Quellen befinden sich sowohl im K10plus als auch im AI: {}".format(", ".join(ssid))
         messages.append(message)
 
-    return k10plus_sources.union(ai_sources)
-
-
-def get_all_old_sources(conn, sqlite):
-    """
-    Get all old sources from the Database.
-    """
-    query = """
-        SELECT
-            source
-        FROM
-            source
-        GROUP BY
-            source
-    """
-    sqlite.execute(query)
-    return [r[0] for r in sqlite]
-
-
-def update_sources(conn, sqlite, k10plus, ai):
-    """
-    Update the source table.
-    """
-    current_sources = get_all_current_sources(k10plus, ai)
-    old_sources = get_all_old_sources(conn, sqlite)
-
-    # Check if the source table is allready filled and this is not the first checkup
-    source_table_is_filled = len(old_sources) > 100
-
-    for old_source in old_sources:
-        if source_table_is_filled and old_source not in current_sources:
-            message = u"Die SID %s ist im aktuellen Import nicht mehr vorhanden.\nWenn dies beabsichtigt ist, bitte die SID aus der Datenbank loeschen." % old_source
-            messages.append(message)
-
-    for current_source in current_sources:
-        if current_source not in old_sources:
-            message = u"The source %s is new in Solr." % current_source
-            if source_table_is_filled:
-                messages.append(message)
-            else:
-                logging.info(message)
-            sql = "INSERT INTO source (source) VALUES (?)"
-            sqlite.execute(sql, (current_source,))
-            conn.commit()
+    sources = dict(counts[ai])
+    sources.update(counts[k10plus])
+    return sources
 
 
 def get_all_current_institutions(k10plus, ai):
     """
-    Get all current institutions from Solr.
+    Get the number of titles of all current institutions from Solr, in both
+    indices.
     """
-    current_institutions = set()
-
-    params = {
-        "facet": "true",
-        "facet.field": "institution",
-        "facet.mincount": 3, # because of these cases ["", 2, "\" \"", 1]
-        "q": "!source_id:error",
-        "rows": 0,
-        "wt": "json",
-    }
-
+    institutions = collections.Counter()
     for index in (k10plus, ai):
-        result = get_solr_result(index, params)
-        institutions = result["facet_counts"]["facet_fields"]["institution"]
-        for institution in institutions[::2]:
-            current_institutions.add(institution)
-
-    return current_institutions
-
-
-def get_all_old_institutions(conn, sqlite):
-    """
-    Get all old institutions from the SQLite database.
-    """
-    query = """
-        SELECT
-            institution
-        FROM
-            institution
-        GROUP BY
-            institution
-    """
-    sqlite.execute(query)
-    return [r[0] for r in sqlite]
+        facets = get_solr_client(index).facet("institution", q="!source_id:error", mincount=3)
+        institutions.update(dict((k, v) for k, v in facets.items() if is_valid_institution(k)))
+    return dict(institutions)
 
 
-def get_all_old_sourcebyinstitutions(conn, sqlite):
+def get_all_current_sourcebyinstitutions(k10plus, ai):
     """
-    Get all old sourcebyinstitution from the SQLite database.
+    Get the number of titles per source and institution, with a single pivot
+    facet request per index. The k10plus number is used, if there is one.
     """
-    query = """
-        SELECT
-            sourcebyinstitution
-        FROM
-            sourcebyinstitution
-        GROUP BY
-            sourcebyinstitution
-    """
-    sqlite.execute(query)
-    return [r[0] for r in sqlite]
+    titles = {}
+    for index in (ai, k10plus):
+        for (sid, institution), number in get_solr_client(index).pivot(["source_id", "institution"]).items():
+            if is_valid_institution(institution) and number > 0:
+                titles[(int(sid), institution)] = number
+    return titles
 
 
-def get_old_sourcebyinstitution_number(conn, sqlite, sourcebyinstitution):
-    """
-    Get all the old sourcebyinstitution number from the SQLite database.
+def report_changes(store):
     """
-    query = """
-        SELECT
-            titles
-        FROM
-            history
-        WHERE
-            sourcebyinstitution = ?
-        ORDER BY
-            titles DESC
-        LIMIT 1
+    Compare the latest run with the previous one and collect messages.
     """
+    _, previous = store.latest()
+    if previous is None:
+        logging.info("first checkup, nothing to compare")
+        return
 
-    sqlite.execute(query, (sourcebyinstitution,))
-    for record in sqlite:
-        old_sourcebyinstitution_number = record[0]
-        return old_sourcebyinstitution_number
-
-
-def update_institutions(conn, sqlite, k10plus, ai):
-    """
-    Update the institution table.
-    """
-    current_institutions = get_all_current_institutions(k10plus, ai)
-    old_institutions = get_all_old_institutions(conn, sqlite)
-
-    # Check if the institution table is allready filled and this is not the first checkup
-    institution_table_is_filled = len(old_institutions) > 10
-
-    for old_institution in old_institutions:
-        if institution_table_is_filled and old_institution not in current_institutions:
-            message = u"Die ISIL %s ist im aktuellen Import nicht mehr vorhanden.\nWenn dies beabsichtigt ist, bitte die Institution aus der Datenbank loeschen." % old_institution
+    for change in store.diff("sources"):
+        if change.current is None:
+            messages.append(u"Die SID %s ist im aktuellen Import nicht mehr vorhanden." % change.key)
+        elif change.previous is None:
+            messages.append(u"The source %s is new in Solr." % change.key)
+
+    for change in store.diff("institutions"):
+        if change.current is None:
+            messages.append(u"Die ISIL %s ist im aktuellen Import nicht mehr vorhanden." % change.key)
+        elif change.previous is None:
+            messages.append(u"The institution %s is new in Solr." % change.key)
+
+    for change in store.diff("titles"):
+        source, institution = change.key
+        if change.previous is None:
+            logging.info("The %s is now connected to SID %s.", institution, source)
+        elif change.current is None:
+            messages.append(u"Die %s ist nicht laenger fuer die SID %s angesigelt." % (institution, source))
+        elif change.current < change.previous:
+            message = u"Die Anzahl der Titel hat sich bei SID %s (%s) gegenueber dem letzten Import verringert (%s, vorher %s)." % (
+                source, institution, change.current, change.previous)
             messages.append(message)
 
-    for current_institution in current_institutions:
-        if current_institution == " " or '"' in current_institution:
-            continue
-        if current_institution not in old_institutions:
-            message = u"The institution %s is new in Solr." % current_institution
-            if institution_table_is_filled:
-                messages.append(message)
-            else:
-                logging.info(message)
-            sql = "INSERT INTO institution (institution) VALUES (?)"
-            sqlite.execute(sql, (current_institution,))
-            conn.commit()
-
-
-def update_history_and_sourcebyinstitution(conn, sqlite, k10plus, ai):
-    """
-    Get all current sources and title numbers from Solr and log them into database.
-    """
-    current_sources = get_all_current_sources(k10plus, ai)
-    current_institutions = get_all_current_institutions(k10plus, ai)
-    old_sourcebyinstitutions = get_all_old_sourcebyinstitutions(conn, sqlite)
-    current_sourcebyinstitutions = []
-
-    for source in current_sources:
-
-        for institution in current_institutions:
-
-            if not institution or institution == " " or '"' in institution:
-                continue
-
-            sourcebyinstitution = "SID " + str(source) + " (" + institution + ")"
-            current_sourcebyinstitutions.append(sourcebyinstitution)
-
-            params = {
-                "q": 'source_id:%s AND institution:"%s"' % (source, institution),
-                "rows": 0,
-                "wt": "json"
-            }
-
-            # check k10plus
-            result = get_solr_result(k10plus, params)
-            number = result["response"]["numFound"]
-            if number != 0:
-                sql = 'INSERT INTO history (sourcebyinstitution, titles) VALUES (?, ?)'
-                sqlite.execute(sql, (sourcebyinstitution, number))
-                conn.commit()
-            else:
-                # check ai
-                result = get_solr_result(ai, params)
-                number = result["response"]["numFound"]
-                if number != 0:
-                    # TODO: escape via sqlite
-                    sql = 'INSERT INTO history (sourcebyinstitution, titles) VALUES (?, ?)'
-                    sqlite.execute(sql, (sourcebyinstitution, number))
-                    conn.commit()
-
-            if sourcebyinstitution not in old_sourcebyinstitutions:
-                logging.info("The %s is now connected to SID %s.", institution, source)
-                sql = "INSERT INTO sourcebyinstitution (sourcebyinstitution) VALUES (?)"
-                sqlite.execute(sql, (sourcebyinstitution,))
-                conn.commit()
-
-            if number != 0:
-                old_sourcebyinstitution_number = get_old_sourcebyinstitution_number(conn, sqlite, sourcebyinstitution)
-                if number < old_sourcebyinstitution_number:
-                    message = u"Die Anzahl der Titel hat sich bei %s gegenueber einem frueheren Import verringert." % (sourcebyinstitution)
-                    messages.append(message)
-
-            # requests.exceptions.ConnectionError: HTTPConnectionPool(XXXXXX): Max retries exceeded
-            time.sleep(0.25)
-
-    for old_sourcebyinstitution in old_sourcebyinstitutions:
-        if old_sourcebyinstitution not in current_sourcebyinstitutions:
-            message = u"Die %s ist nicht laenger fuer die SID %s angesigelt." % (institution, source)
-            messages.append(message)
 
 # Parse keyword arguments
 parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
@@ -467,28 +270,22 @@ if yaml and not token:
 k10plus = args.k10plus
 ai = args.ai
 
-# Check if database already exists, otherwise create new one
-if not os.path.isfile(database):
-    conn, sqlite = create_connection_and_set_cursor(database)
-    sqlite.executescript(create_schema)
-else:
-    conn, sqlite = create_connection_and_set_cursor(database)
-
+store = MetricsStore(database)
 
 # Collects messages for email report
 messages = []
 
-# 1. Step: Update the source table
-update_sources(conn, sqlite, k10plus, ai)
-
-# 2. Step: Update the institution table
-update_institutions(conn, sqlite, k10plus, ai)
+# 1. Step: Get the number of titles per source, institution and both from Solr
+# and record them, in a single transaction.
+store.record(sources=get_all_current_sources(k10plus, ai),
+             institutions=get_all_current_institutions(k10plus, ai),
+             titles=get_all_current_sourcebyinstitutions(k10plus, ai))
 
-# 3. Step: Get the number of titles for each SID and log them to database
-update_history_and_sourcebyinstitution(conn, sqlite, k10plus, ai)
+# 2. Step: Compare with the previous checkup
+report_changes(store)
 
-# 4. Step: Send report
+# 3. Step: Send report
 message = u"\n".join(messages)
 send_message(message)
 
-sqlite.close()
+store.close()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# coding: utf-8
+# pylint: disable=C0103
+
+"""
+
+Import time of siskin modules, measured with `python -X importtime` (Python
+3.7+) in a fresh interpreter. Reports the cumulative time of the module and
+its slowest dependencies, takes the minimum over a few runs.
+
+    $ python contrib/bench_import.py
+    siskin.utils    64.2ms  (budget 100.0ms)
+        siskin      55.0ms
+        urllib3     44.9ms
+        certifi     24.1ms
+
+Before deferring bs4, requests, backoff, luigi and the mappings, this was
+about 180ms.
+
+Exits with status 1, if a module takes longer to import than --budget
+milliseconds.
+
+"""
+
+from __future__ import print_function
+
+import argparse
+import collections
+import subprocess
+import sys
+
+
+def importtime(module):
+    """
+    Run python -X importtime and return a dictionary of module name to
+    cumulative import time in microseconds.
+    """
+    proc = subprocess.Popen([sys.executable, '-X', 'importtime', '-c', 'import %s' % module],
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE)
+    _, stderr = proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError('import of %s failed: %s' % (module, stderr.decode('utf-8', 'replace')))
+    timings = {}
+    for line in stderr.decode('utf-8').splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        timings[name.strip()] = int(cumulative)
+    return timings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('modules', metavar='MODULE', nargs='*', default=['siskin.utils'], help='modules to import')
+    parser.add_argument('-n', type=int, default=5, help='repetitions')
+    parser.add_argument('--budget', type=float, default=100.0, help='milliseconds allowed per module')
+    parser.add_argument('--top', type=int, default=10, help='number of dependencies to show')
+    args = parser.parse_args()
+
+    if sys.version_info < (3, 7):
+        print('python -X importtime requires Python 3.7+', file=sys.stderr)
+        sys.exit(2)
+
+    failed = False
+    for module in args.modules:
+        best = collections.defaultdict(lambda: float('inf'))
+        for _ in range(args.n):
+            for name, value in importtime(module).items():
+                best[name] = min(best[name], value)
+        total = best[module] / 1000.0
+        print('%s\t%0.1fms\t(budget %0.1fms)' % (module, total, args.budget))
+        deps = sorted((v, k) for k, v in best.items() if k not in (module, 'site'))
+        for value, name in reversed(deps[-args.top:]):
+            print('    %s\t%0.1fms' % (name, value / 1000.0))
+        if total > args.budget:
+            print('%s import %0.1fms over budget of %0.1fms' % (module, total, args.budget), file=sys.stderr)
+            failed = True
+
+    if failed:
+        sys.exit(1)
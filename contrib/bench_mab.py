@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# coding: utf-8
+# pylint: disable=C0103
+
+"""
+
+Microbenchmark for MabRecord field access. Compares the indexed lookups with
+a linear scan over all fields (the previous implementation), with a typical
+conversion script access pattern of a few dozen lookups per record.
+
+    $ python contrib/bench_mab.py fixtures/mab*.xml
+    fixtures/mab0.xml   1 records   linear 63.5us/rec   indexed 27.7us/rec  2.29x
+    fixtures/mab1.xml   1 records   linear 69.3us/rec   indexed 35.2us/rec  1.97x
+    fixtures/mab2.xml   1 records   linear 85.8us/rec   indexed 34.5us/rec  2.49x
+
+"""
+
+from __future__ import print_function
+
+import argparse
+import timeit
+
+from siskin.mab import MabRecord, MabXMLFile
+
+# Fields and subfields a conversion script usually looks at.
+LOOKUPS = [(nr, None) for nr in ("001", "002", "010", "020", "030", "036", "037", "050", "070", "089", "100", "104",
+                                 "108", "200", "331", "333", "335", "359", "403", "410", "412", "425", "433", "434",
+                                 "435", "451", "455", "501", "540", "542", "544", "700", "710")]
+LOOKUPS += [("419", "a"), ("419", "b"), ("419", "c"), ("655", "u"), ("060", "b")]
+
+
+def linear_field(dd, number, code=None, alt=None):
+    for f in dd.get("feld", []):
+        if f.get("@nr") == number:
+            if code:
+                for sf in f.get("uf", []):
+                    if sf.get("@code") == code:
+                        return sf.get("#text", alt)
+            else:
+                return f.get("#text", alt)
+    return alt
+
+
+def linear_fields(dd, number, code=None):
+    result = []
+    for f in dd.get("feld", []):
+        if f.get("@nr") != number:
+            continue
+        if code:
+            for sf in f.get("uf", []):
+                if sf.get("@code") == code and sf.get("#text"):
+                    result.append(sf.get("#text"))
+        elif f.get("#text"):
+            result.append(f.get("#text"))
+    return result
+
+
+def run_linear(dds):
+    for dd in dds:
+        for number, code in LOOKUPS:
+            linear_field(dd, number, code=code)
+            linear_fields(dd, number, code=code)
+
+
+def run_indexed(dds):
+    for dd in dds:
+        record = MabRecord(dd)
+        for number, code in LOOKUPS:
+            record.field(number, code=code)
+            record.fields(number, code=code)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('files', metavar='FILE', nargs='+', help='MAB XML files')
+    parser.add_argument('-n', type=int, default=2000, help='repetitions')
+    args = parser.parse_args()
+
+    for filename in args.files:
+        dds = [record.dd for record in MabXMLFile(filename) if record.dd]
+        if not dds:
+            continue
+        linear = min(timeit.repeat(lambda: run_linear(dds), number=args.n, repeat=3))
+        indexed = min(timeit.repeat(lambda: run_indexed(dds), number=args.n, repeat=3))
+        per = float(args.n * len(dds)) / 1e6
+        print('%s\t%d records\tlinear %0.1fus/rec\tindexed %0.1fus/rec\t%0.2fx' %
+              (filename, len(dds), linear / per, indexed / per, linear / indexed))
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# coding: utf-8
+# pylint: disable=C0103
+
+"""
+
+Startup time of the command line tools. Each variant runs in a fresh
+interpreter: loading a single task (taskdo, taskdeps) or listing all tasks
+(taskdocs, tasktags, siskin) through the registry, compared to the star
+import of all sources and workflows (the previous behaviour).
+
+    $ python contrib/bench_startup.py
+    taskdo      0.27s   0.53s   1.93x
+    taskdocs    0.11s   0.58s   5.44x
+
+Loading a single task still imports the dependencies of its module, so keep
+heavy imports out of module level, where they are not needed.
+
+Exits with status 1, if a registry variant takes longer than --budget.
+
+"""
+
+from __future__ import print_function
+
+import argparse
+import subprocess
+import sys
+import timeit
+
+STAR_IMPORT = 'from siskin.sources import *; from siskin.workflows import *'
+LIST_DOCS = 'from luigi.task import Register; [Register.get_task_cls(n).__doc__ for n in Register.task_names()]'
+
+# Command name, statement using the registry and statement it replaces.
+VARIANTS = (
+    ('taskdo', 'from siskin.registry import import_task_module; import_task_module(%r)', STAR_IMPORT),
+    ('taskdocs', 'from siskin.registry import load_details; load_details()', STAR_IMPORT + '; ' + LIST_DOCS),
+)
+
+
+def run(statement):
+    subprocess.check_call([sys.executable, '-c', statement])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--task', default='CrossrefExport', help='task to load')
+    parser.add_argument('-n', type=int, default=3, help='repetitions')
+    parser.add_argument('--budget', type=float, default=1.0, help='seconds allowed for the registry variant')
+    args = parser.parse_args()
+
+    # Warm up, so the registry file exists.
+    run(VARIANTS[0][1] % args.task)
+
+    def best(statement):
+        if '%r' in statement:
+            statement = statement % args.task
+        return min(timeit.repeat(lambda: run(statement), number=1, repeat=args.n))
+
+    status = 0
+    for name, registry, star in VARIANTS:
+        fast, slow = best(registry), best(star)
+        print('%s\t%0.2fs\t%0.2fs\t%0.2fx' % (name, fast, slow, slow / fast))
+        if fast > args.budget:
+            print('%s startup %0.2fs over budget of %0.2fs' % (name, fast, args.budget), file=sys.stderr)
+            status = 1
+    sys.exit(status)
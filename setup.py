@@ -41,7 +41,7 @@ except ImportError:
 # XXX: Break this up into production and development dependencies.
 install_requires = [
     'astroid>=1.1.1,<2',
-    'backoff>=1.3.1',
+    'backoff>=1.4.0',
     'beautifulsoup4',
     'bs4',
     'colorama>=0.3.3',
@@ -89,7 +89,7 @@ install_requires = [
 ]
 
 if sys.version_info.major < 3:
-    install_requires += ['argparse>=1.2', 'wsgiref>=0.1.2']
+    install_requires += ['argparse>=1.2', 'futures>=3.2', 'wsgiref>=0.1.2']
 
 
 print("""
@@ -6,16 +6,12 @@ from __future__ import print_function
 
 import base64
 import io
-import os
 import re
-import sqlite3
 import sys
-import tempfile
 from builtins import bytes
 
-import xmltodict
-
 import marcx
+from siskin.stream import MergeDuplicates, xml_records
 
 
 def clear_format(format):
@@ -139,38 +135,26 @@ if len(sys.argv) < 3:
     print('usage: %s INFILE OUTFILE' % sys.argv[0], file=sys.stderr)
     sys.exit(1)
 
-_, dbfile = tempfile.mkstemp(prefix='103-')
-
-sqlitecon = sqlite3.connect(dbfile)
-sqlite = sqlitecon.cursor()
-sqlite.execute("DROP TABLE IF EXISTS record")
-
-query = """
-    CREATE TABLE
-       'record' ('id' INTEGER PRIMARY KEY AUTOINCREMENT,
-                 'identifier' TEXT,
-                 'title' TEXT,
-                 'description' TEXT,
-                 'subject' TEXT,
-                 'type' TEXT,
-                 'format' TEXT,
-                 'relation' TEXT,
-                 'publisher' TEXT,
-                 'date' TEXT,
-                 'source' TEXT,
-                 'language' TEXT,
-                 'rights' TEXT,
-                 'url' TEXT,
-                 'creator' TEXT,
-                 'coverage' TEXT)
-"""
-
-sqlite.execute(query)
-
-inputfile = io.open(sys.argv[1], "r", encoding="utf-8")
 outputfile = io.open(sys.argv[2], "wb")
 
-xml = xmltodict.parse(inputfile.read())
+
+def duplicate_key(record):
+    """
+    Records with the same title, format and type are merged, their URLs are
+    joined. Records with a missing (empty) value are kept apart.
+    """
+    key = (record["title"], record["format"], record["type"])
+    return None if None in key else key
+
+
+records = MergeDuplicates(key=duplicate_key, field="url")
+
+# Keys use these prefixes, whatever prefixes the input declares.
+namespaces = {
+    "http://www.openarchives.org/OAI/2.0/": None,
+    "http://www.openarchives.org/OAI/2.0/oai_dc/": "oai_dc",
+    "http://purl.org/dc/elements/1.1/": "dc",
+}
 
 identifier = ""
 title = ""
@@ -188,7 +172,8 @@ url = ""
 creator = ""
 coverage = ""
 
-for record in xml["Records"]["Record"]:
+for doc in xml_records(sys.argv[1], tag="Record", process_namespaces=True, namespaces=namespaces):
+    record = doc["Record"]
 
     if record["header"]["@status"] != "deleted":
 
@@ -250,67 +235,23 @@ for record in xml["Records"]["Record"]:
         if isinstance(coverage, list):
             coverage = "||".join(coverage)
 
-        values = (title, format, type)
-
-        query = """
-            SELECT
-                id,
-                url,
-                COUNT(id) AS matches
-            FROM
-                record
-            WHERE
-                title = ? AND
-                format = ? AND
-                type = ?
-        """
-
-        sqlite.execute(query, values)
-        row = sqlite.fetchone()
-
-        id = row[0]
-        url_old = row[1]
-        matches = row[2]
-
-        if matches == 0:
-
-            values = (identifier, title, description, subject, type, format, relation, publisher, date, source,
-                      language, rights, url, creator, coverage)
-
-            query = """
-                INSERT INTO
-                    record (identifier,
-                            title,
-                            description,
-                            subject,
-                            type,
-                            format,
-                            relation,
-                            publisher,
-                            date,
-                            source,
-                            language,
-                            rights,
-                            url,
-                            creator,
-                            coverage)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """
-        else:
-
-            url = url_old + "||" + url
-            values = (url, id)
-
-            query = """
-                UPDATE
-                    record
-                SET
-                    url = ?
-                WHERE
-                    id = ?
-            """
-
-        sqlite.execute(query, values)
+        records.add({
+            "identifier": identifier,
+            "title": title,
+            "description": description,
+            "subject": subject,
+            "type": type,
+            "format": format,
+            "relation": relation,
+            "publisher": publisher,
+            "date": date,
+            "source": source,
+            "language": language,
+            "rights": rights,
+            "url": url,
+            "creator": creator,
+            "coverage": coverage,
+        })
 
         identifier = ""
         title = ""
@@ -328,30 +269,26 @@ for record in xml["Records"]["Record"]:
         creator = ""
         coverage = ""
 
-query = "SELECT * FROM record"
-sqlite.execute(query)
-rows = sqlite.fetchall()
-
-for row in rows:
-    identifier = row[1]
+for row in records:
+    identifier = row["identifier"]
     identifier = bytes(identifier, "utf-8")
     identifier = base64.b64encode(identifier)
     identifier = identifier.decode("utf-8").rstrip("=")
-    title = row[2]
-    description = row[3]
-    subject = row[4]
-    type = row[5]
-    format = row[6]
+    title = row["title"]
+    description = row["description"]
+    subject = row["subject"]
+    type = row["type"]
+    format = row["format"]
     format = clear_format(format)
-    relation = row[7]
-    publisher = row[8]
-    date = row[9]
-    source = row[10]
-    language = row[11]
-    rights = row[12]
-    url = row[13]
-    creator = row[14]
-    coverage = row[15]
+    relation = row["relation"]
+    publisher = row["publisher"]
+    date = row["date"]
+    source = row["source"]
+    language = row["language"]
+    rights = row["rights"]
+    url = row["url"]
+    creator = row["creator"]
+    coverage = row["coverage"]
 
     if identifier == "":
         continue
@@ -517,8 +454,5 @@ for row in rows:
     marcrecord.add("980", a=f980_a, b=f980_b, c="sid-103-col-margaret")
     outputfile.write(marcrecord.as_marc())
 
-sqlitecon.commit()
-sqlitecon.close()
-inputfile.close()
+records.close()
 outputfile.close()
-os.remove(dbfile)
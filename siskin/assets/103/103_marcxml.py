@@ -15,50 +15,35 @@ from __future__ import print_function
 import base64
 import cgi
 import io
-import os
 import re
-import sqlite3
 import sys
-import tempfile
 
-import xmltodict
+from siskin.stream import MergeDuplicates, xml_records
 
 if len(sys.argv) < 3:
     print('usage: %s INFILE OUTFILE' % sys.argv[0], file=sys.stderr)
     sys.exit(1)
 
-_, dbfile = tempfile.mkstemp(prefix='103-')
-
-sqlitecon = sqlite3.connect(dbfile)
-sqlite = sqlitecon.cursor()
-sqlite.execute("DROP TABLE IF EXISTS record")
-
-query = """
-    CREATE TABLE
-       'record' ('id' INTEGER PRIMARY KEY AUTOINCREMENT,
-                 'identifier' TEXT,
-                 'title' TEXT,
-                 'description' TEXT,
-                 'subject' TEXT,
-                 'type' TEXT,
-                 'format' TEXT,
-                 'relation' TEXT,
-                 'publisher' TEXT,
-                 'date' TEXT,
-                 'source' TEXT,
-                 'language' TEXT,
-                 'rights' TEXT,
-                 'url' TEXT,
-                 'creator' TEXT,
-                 'coverage' TEXT)
-"""
+outputfile = io.open(sys.argv[2], "w", encoding='utf-8')
 
-sqlite.execute(query)
 
-inputfile = io.open(sys.argv[1], "r", encoding='utf-8')
-outputfile = io.open(sys.argv[2], "w", encoding='utf-8')
+def duplicate_key(record):
+    """
+    Records with the same title, format and type are merged, their URLs are
+    joined. Records with a missing (empty) value are kept apart.
+    """
+    key = (record["title"], record["format"], record["type"])
+    return None if None in key else key
+
 
-xml = xmltodict.parse(inputfile.read())
+records = MergeDuplicates(key=duplicate_key, field="url")
+
+# Keys use these prefixes, whatever prefixes the input declares.
+namespaces = {
+    "http://www.openarchives.org/OAI/2.0/": None,
+    "http://www.openarchives.org/OAI/2.0/oai_dc/": "oai_dc",
+    "http://purl.org/dc/elements/1.1/": "dc",
+}
 
 identifier = ""
 title = ""
@@ -76,10 +61,8 @@ url = ""
 creator = ""
 coverage = ""
 
-inserts = 0
-updates = 0
-
-for i, record in enumerate(xml["collection"]["Record"]):
+for doc in xml_records(sys.argv[1], tag="Record", process_namespaces=True, namespaces=namespaces):
+    record = doc["Record"]
 
     if record["header"]["@status"] != "deleted":
 
@@ -183,72 +166,23 @@ for i, record in enumerate(xml["collection"]["Record"]):
         except (TypeError, KeyError):
             coverage = ''
 
-        values = (title, format, type)
-
-        query = """
-            SELECT
-                id,
-                url,
-                COUNT(id) AS matches
-            FROM
-                record
-            WHERE
-                title = ? AND
-                format = ? AND
-                type = ?
-        """
-
-        sqlite.execute(query, values)
-        row = sqlite.fetchone()
-
-        id = row[0]
-        url_old = row[1]
-        matches = row[2]
-
-        if matches == 0:
-
-            values = (identifier, title, description, subject, type, format, relation, publisher, date, source,
-                      language, rights, url, creator, coverage)
-
-            query = """
-                INSERT INTO
-                    record (identifier,
-                            title,
-                            description,
-                            subject,
-                            type,
-                            format,
-                            relation,
-                            publisher,
-                            date,
-                            source,
-                            language,
-                            rights,
-                            url,
-                            creator,
-                            coverage)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """
-
-            inserts = inserts + 1
-
-        else:
-
-            url = url_old + "||" + url
-            values = (url, id)
-
-            query = """
-                UPDATE
-                    record
-                SET
-                    url = ?
-                WHERE
-                    id = ?
-            """
-
-            updates = updates + 1
-
-        sqlite.execute(query, values)
+        records.add({
+            "identifier": identifier,
+            "title": title,
+            "description": description,
+            "subject": subject,
+            "type": type,
+            "format": format,
+            "relation": relation,
+            "publisher": publisher,
+            "date": date,
+            "source": source,
+            "language": language,
+            "rights": rights,
+            "url": url,
+            "creator": creator,
+            "coverage": coverage,
+        })
 
         identifier = ""
         title = ""
@@ -266,39 +200,33 @@ for i, record in enumerate(xml["collection"]["Record"]):
         creator = ""
         coverage = ""
 
-        #print("Inserts:", inserts, "Updates", updates)
-
-query = "SELECT * FROM record"
-sqlite.execute(query)
-rows = sqlite.fetchall()
-
 outputfile.write(u"<collection>")
 outputfile.write(u"\n")
 
-for row in rows:
-    identifier = row[1]
+for row in records:
+    identifier = row["identifier"]
     identifier = base64.b64encode(identifier.encode()).decode().rstrip("=")
-    title = row[2]
+    title = row["title"]
     title = cgi.escape(title)
-    description = row[3]
+    description = row["description"]
     description = cgi.escape(description)
-    subject = row[4]
+    subject = row["subject"]
     subject = cgi.escape(subject)
-    type = row[5]
-    format = row[6]
-    relation = row[7]
-    publisher = row[8]
+    type = row["type"]
+    format = row["format"]
+    relation = row["relation"]
+    publisher = row["publisher"]
     publisher = cgi.escape(publisher)
-    date = row[9]
-    source = row[10]
+    date = row["date"]
+    source = row["source"]
     source = cgi.escape(source)
-    language = row[11]
-    rights = row[12]
+    language = row["language"]
+    rights = row["rights"]
     rights = cgi.escape(rights)
-    url = row[13]
-    creator = row[14]
+    url = row["url"]
+    creator = row["creator"]
     creator = cgi.escape(creator)
-    coverage = row[15]
+    coverage = row["coverage"]
     coverage = cgi.escape(coverage)
 
     if identifier == "":
@@ -734,8 +662,5 @@ for row in rows:
 
 outputfile.write(u"</collection>")
 
-sqlitecon.commit()
-sqlitecon.close()
-inputfile.close()
+records.close()
 outputfile.close()
-os.remove(dbfile)
@@ -23,6 +23,7 @@ import sys
 import xmltodict
 
 import marcx
+from siskin.stream import SanitizingReader, open_source, xml_control_chars
 from siskin.utils import marc_build_imprint, xmlstream
 
 formatmap = {
@@ -164,10 +165,21 @@ if len(sys.argv) == 3:
 
 outputfile = open(outputfilename, "wb")
 
+
+def records():
+    """
+    Yield record snippets, control characters in the dump are replaced by
+    spaces on the fly.
+    """
+    with open_source(inputfilename) as handle:
+        for snippet in xmlstream(SanitizingReader(handle, xml_control_chars()), "record"):
+            yield snippet
+
+
 parent_ids = []
 parent_titles = {}
 
-for oldrecord in xmlstream(inputfilename, "record"):
+for oldrecord in records():
 
     record = xmltodict.parse(oldrecord)
     parent_id = get_datafield(record, "010", "a")
@@ -175,7 +187,7 @@ for oldrecord in xmlstream(inputfilename, "record"):
     if len(parent_id) > 0:
         parent_ids.append(parent_id)
 
-for oldrecord in xmlstream(inputfilename, "record"):
+for oldrecord in records():
 
     record = xmltodict.parse(oldrecord)
     id = get_datafield(record, "001", "a")
@@ -184,7 +196,7 @@ for oldrecord in xmlstream(inputfilename, "record"):
     if id in parent_ids:
         parent_titles[id] = title
 
-for oldrecord in xmlstream(inputfilename, "record"):
+for oldrecord in records():
 
     record = xmltodict.parse(oldrecord)
     marcrecord = marcx.Record(force_utf8=True)
@@ -9,17 +9,16 @@
 
 from __future__ import print_function
 
-import collections
 import io
 import re
 import sys
 from builtins import *
 
-import requests
 import xmltodict
 
 import marcx
-from siskin.mab import MabXMLFile
+from siskin.mab import LinkCollector, MabXMLStream, SetCollector, collect
+from siskin.solr import SolrClient, quote
 from siskin.utils import marc_build_imprint
 
 formatmap = {
@@ -36,21 +35,28 @@ formatmap = {
 }
 
 
-def check_swb_isbn(isbn):
-    """
-    The length of the response can indicate, whether records exist.
-    """
-    req = requests.get("%s?q=source_id:0+institution:DE-105+isbn:%s&wt=csv&fl=id" % (servername, isbn))
-    return len(req.text)
+# Records already in the SWB holdings of DE-105 are skipped.
+swb_query = "source_id:0 AND institution:DE-105"
 
 
-def check_swb_issn(issn, title):
-    """
-    The length of the response can indicate, whether records exist.
-    """
-    req = requests.get('%s?q=source_id:0+institution:DE-105+issn:%s+title_short:"%s"&wt=csv&fl=id' %
-                       (servername, issn, title))
-    return len(req.text)
+def get_isbn(record):
+    f020a = record.field("540", alt="")
+    match = re.search("([0-9xX-]{10,17})", f020a)
+    return match.group(1) if match else None
+
+
+def get_issn(record):
+    f022a = record.field("542", alt="")
+    match = re.search("([0-9xX-]{9,9})", f022a)
+    return match.group(1) if match else None
+
+
+def isbn_query(isbn):
+    return "isbn:%s" % quote(isbn)
+
+
+def issn_query(issn, title):
+    return "issn:%s AND title_short:%s" % (quote(issn), quote(title))
 
 
 inputfilename = "130_input.xml"
@@ -60,22 +66,29 @@ servername = "https://index.ub.uni-leipzig.de/solr/biblio/select"
 if len(sys.argv) == 4:
     inputfilename, outputfilename, servername = sys.argv[1:]
 
-reader = MabXMLFile(inputfilename, replace=((u"¬", ""), ))
+reader = MabXMLStream(inputfilename, replace=(u"¬", ""))
 outputfile = open(outputfilename, "wb")
 
-hierarchymap = collections.defaultdict(list)
 
-for record in reader:
+def swb_queries(record):
+    """
+    ISBN and ISSN/title queries of a record, to be checked against SWB in a
+    few batches.
+    """
+    isbn = get_isbn(record)
+    if isbn:
+        yield isbn_query(isbn)
+    issn = get_issn(record)
+    if issn:
+        yield issn_query(issn, record.field("331", alt=""))
 
-    f010 = ""
-    f089 = ""
 
-    f010 = record.field("010")
-    f089 = record.field("089")
+# First pass, only parses the fields needed for the volumes and SWB queries.
+hierarchymap = LinkCollector("010", "089", normalize=lambda v: v.lstrip("0"))
+queries = SetCollector(("540", "542", "331"), swb_queries)
+collect(reader, hierarchymap, queries)
 
-    if f010 and f089:
-        f010 = f010.lstrip("0")
-        hierarchymap[f010].append(f089)
+swb = SolrClient(servername, workers=4).matching(sorted(queries.values), q=swb_query)
 
 for record in reader:
 
@@ -152,26 +165,18 @@ for record in reader:
     marcrecord.add("008", data=f008)
 
     # ISBN
-    f020a = record.field("540", alt="")
+    f020a = get_isbn(record)
     if f020a:
-        match = re.search("([0-9xX-]{10,17})", f020a)
-        if match:
-            f020a = match.group(1)
-            x = check_swb_isbn(f020a)
-            if x > 3:
-                continue
-            marcrecord.add("020", a=f020a)
+        if isbn_query(f020a) in swb:
+            continue
+        marcrecord.add("020", a=f020a)
 
     # ISSN
-    f022a = record.field("542", alt="")
+    f022a = get_issn(record)
     if f022a:
-        match = re.search("([0-9xX-]{9,9})", f022a)
-        if match:
-            f022a = match.group(1)
-            x = check_swb_issn(f022a, f245a)
-            if x > 3:
-                continue
-            marcrecord.add("022", a=f022a)
+        if issn_query(f022a, record.field("331", alt="")) in swb:
+            continue
+        marcrecord.add("022", a=f022a)
 
     # Sprache
     languages = record.field("037", alt="")
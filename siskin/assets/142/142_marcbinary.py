@@ -37,7 +37,7 @@ import sys
 import xmltodict
 
 import marcx
-from siskin.mab import MabXMLFile
+from siskin.mab import MabXMLStream
 from siskin.mappings import formats
 from siskin.utils import check_isbn, check_issn, marc_build_field_008
 
@@ -47,7 +47,7 @@ outputfilename = "142_output.mrc"
 if len(sys.argv) == 3:
     inputfilename, outputfilename = sys.argv[1:]
 
-reader = MabXMLFile(inputfilename, replace=(u"¬", ""), encoding='latin-1')
+reader = MabXMLStream(inputfilename, replace=(u"¬", ""), encoding="latin-1")
 outputfile = open(outputfilename, "wb")
 
 parent_ids = []
@@ -31,22 +31,60 @@ Ticket: #8700, #15871, #16012
 
 """
 
-import io
 import re
 import sys
 
 import marcx
 
 from siskin.mappings import formats, roles
+from siskin.stream import convert_file, delimited_records
 from siskin.utils import check_isbn, marc_build_field_008
 from six.moves import html_parser
 
 
 parser = html_parser.HTMLParser()
 
+field_patterns = {}
+subfield_patterns = {}
+
+# format recognition
+format_patterns = [
+    re.compile("\d\]?\sS\."),
+    re.compile("\d\]?\sSeit"),
+    re.compile("\d\]?\sBl"),
+    re.compile("\s?Illl?\."),
+    re.compile("[XVI],\s"),
+    re.compile("^\d+\s[SsPp]"),
+    re.compile("^DVD"),
+    re.compile("^Blu.?-[Rr]ay"),
+    re.compile("^H[DC] [Cc][Aa][Mm]"),
+    re.compile("^HDCAM"),
+    re.compile("[Bb]et.?-?[Cc]am"),
+    re.compile("CD"),
+    re.compile("[kKCc]asss?ette"),
+    re.compile("^VHS"),
+    re.compile("^Noten"),
+    re.compile("^Losebl"),
+    re.compile("^Film\s?\["),
+    re.compile("\d\smin"),
+    re.compile("S\.\s\d+\s?-\s?\d+"),
+]
+
+extent_patterns = [
+    re.compile("(.*)\s?:\s(.*);\s(.*)"),
+    re.compile("(.*)\s?:\s(.*)"),
+    re.compile("(.*)\s?;\s(.*)"),
+]
+
+role_pattern = re.compile("\[(.*?)\]")
+person_pattern = re.compile('tag="1\d\d"')
+field_split_pattern = re.compile("(</controlfield>|</datafield>)")
+
 
 def get_field(field, tag):
-    regexp = re.search('<.*? tag="%s">(.*)$' % tag, field)
+    if tag not in field_patterns:
+        field_patterns[tag] = re.compile('<.*? tag="%s">(.*)$' % tag)
+    regexp = field_patterns[tag].search(field)
     if regexp:
         _field = regexp.group(1)
         _field = parser.unescape(_field)
@@ -56,7 +94,10 @@ def get_field(field, tag):
 
 
 def get_subfield(field, tag, subfield):
-    regexp = re.search('^<datafield.*tag="%s".*><subfield code="%s">(.*?)<\/subfield>' % (tag, subfield), field)
+    if (tag, subfield) not in subfield_patterns:
+        subfield_patterns[(tag, subfield)] = re.compile(
+            '^<datafield.*tag="%s".*><subfield code="%s">(.*?)<\/subfield>' % (tag, subfield))
+    regexp = subfield_patterns[(tag, subfield)].search(field)
     if regexp:
         _field = regexp.group(1)
         _field = parser.unescape(_field)
@@ -65,21 +106,10 @@ def get_subfield(field, tag, subfield):
         return ""
 
 
-# default input and output
-inputfilename = "151_input.xml"
-outputfilename = "151_output.mrc"
-
-if len(sys.argv) == 3:
-    inputfilename, outputfilename = sys.argv[1:]
-
-inputfile = io.open(inputfilename, "r")
-outputfile = io.open(outputfilename, "wb")
-
-records = inputfile.read()
-records = records.split("</record>")
-
-for record in records:
-
+def convert_record(record):
+    """
+    Convert the text of a single record to MARC, return None to skip.
+    """
     format = ""
     form = ""
     f001 = ""
@@ -104,7 +134,7 @@ for record in records:
 
     marcrecord = marcx.Record(force_utf8=True)
     marcrecord.strict = False
-    fields = re.split("(</controlfield>|</datafield>)", record)
+    fields = field_split_pattern.split(record)
 
     for field in fields:
 
@@ -117,25 +147,25 @@ for record in records:
         # format recognition
         if form and not format:
             
-            regexp1 = re.search("\d\]?\sS\.", form)
-            regexp2 = re.search("\d\]?\sSeit", form)
-            regexp3 = re.search("\d\]?\sBl", form)
-            regexp4 = re.search("\s?Illl?\.", form)
-            regexp5 = re.search("[XVI],\s", form)
-            regexp6 = re.search("^\d+\s[SsPp]", form)
-            regexp7 = re.search("^DVD", form)
-            regexp8 = re.search("^Blu.?-[Rr]ay", form)
-            regexp9 = re.search("^H[DC] [Cc][Aa][Mm]", form)
-            regexp10 = re.search("^HDCAM", form)
-            regexp11 = re.search("[Bb]et.?-?[Cc]am", form)
-            regexp12 = re.search("CD", form)
-            regexp13 = re.search("[kKCc]asss?ette", form)
-            regexp14 = re.search("^VHS", form)
-            regexp15 = re.search("^Noten", form)
-            regexp16 = re.search("^Losebl", form)
-            regexp17 = re.search("^Film\s?\[", form)
-            regexp18 = re.search("\d\smin", form)
-            regexp19 = re.search("S\.\s\d+\s?-\s?\d+", form)
+            regexp1 = format_patterns[0].search(form)
+            regexp2 = format_patterns[1].search(form)
+            regexp3 = format_patterns[2].search(form)
+            regexp4 = format_patterns[3].search(form)
+            regexp5 = format_patterns[4].search(form)
+            regexp6 = format_patterns[5].search(form)
+            regexp7 = format_patterns[6].search(form)
+            regexp8 = format_patterns[7].search(form)
+            regexp9 = format_patterns[8].search(form)
+            regexp10 = format_patterns[9].search(form)
+            regexp11 = format_patterns[10].search(form)
+            regexp12 = format_patterns[11].search(form)
+            regexp13 = format_patterns[12].search(form)
+            regexp14 = format_patterns[13].search(form)
+            regexp15 = format_patterns[14].search(form)
+            regexp16 = format_patterns[15].search(form)
+            regexp17 = format_patterns[16].search(form)
+            regexp18 = format_patterns[17].search(form)
+            regexp19 = format_patterns[18].search(form)
 
             if regexp1 or regexp2 or regexp3 or regexp4 or regexp5 or regexp6:
                 format = "Book"
@@ -171,7 +201,7 @@ for record in records:
                 f100.append(f100a)
                 role = get_subfield(field, "100", "b")
                 if role != "":
-                    match = re.search("\[(.*?)\]", role)
+                    match = role_pattern.search(role)
                     if match:
                         role = match.group(1)
                         role = role.lower()
@@ -197,11 +227,11 @@ for record in records:
         if f300a == "":
             f300 = get_field(field, "433")
             # 335 S. : zahlr. Ill. ; 32 cm
-            regexp1 = re.search("(.*)\s?:\s(.*);\s(.*)", f300)
+            regexp1 = extent_patterns[0].search(f300)
             # 289 S.: Zahlr. Ill.
-            regexp2 = re.search("(.*)\s?:\s(.*)", f300)
+            regexp2 = extent_patterns[1].search(f300)
             # 106 S. ; 21 cm
-            regexp3 = re.search("(.*)\s?;\s(.*)", f300)
+            regexp3 = extent_patterns[2].search(f300)
 
             if regexp1:
                 f300a, f300b, f300c = regexp1.groups()
@@ -216,7 +246,7 @@ for record in records:
         if f650a != "":
             subjects.append(f650a)
 
-        regexp = re.search('tag="1\d\d"', field) # checks if there is a person field
+        regexp = person_pattern.search(field) # checks if there is a person field
         if regexp:
             for i in range(101, 197):  
                 f700a = get_subfield(field, i, "a")
@@ -225,7 +255,7 @@ for record in records:
                     f700.append(f700a)
                     role = get_subfield(field, i, "b")
                     if role != "":
-                        match = re.search("\[(.*?)\]", role)
+                        match = role_pattern.search(role)
                         if match:
                             role = match.group(1)
                             role = role.lower()
@@ -240,7 +270,7 @@ for record in records:
                     break
 
     if not f001:
-        continue
+        return None
 
     if not format:
         format = "Book"
@@ -309,7 +339,14 @@ for record in records:
     collections = ["a", f001, "b", "151", "c", "sid-151-col-filmakademiebawue"]
     marcrecord.add("980", subfields=collections)
 
-    outputfile.write(marcrecord.as_marc())
+    return marcrecord
+
+
+# default input and output
+inputfilename = "151_input.xml"
+outputfilename = "151_output.mrc"
+
+if len(sys.argv) == 3:
+    inputfilename, outputfilename = sys.argv[1:]
 
-inputfile.close()
-outputfile.close()
+convert_file(inputfilename, outputfilename, convert_record, reader=delimited_records)
@@ -0,0 +1,48 @@
+# coding: utf-8
+"""
+Shared test fixtures.
+
+The `http_server` fixture starts a local HTTP server in a background thread,
+for tests that want to talk to a real socket instead of mocking requests:
+
+    def test_fetch(http_server):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                ...
+
+        url = http_server(Handler)
+
+"""
+
+import threading
+
+import pytest
+from six.moves.BaseHTTPServer import HTTPServer
+from six.moves.socketserver import ThreadingMixIn
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def http_server():
+    """
+    Return a function, that takes a request handler class, starts a server on
+    a free port and returns its base URL. Servers are shut down on teardown.
+    """
+    servers = []
+
+    def start(handler):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        servers.append(server)
+        return 'http://127.0.0.1:%d' % server.server_address[1]
+
+    yield start
+
+    for server in servers:
+        server.shutdown()
+        server.server_close()
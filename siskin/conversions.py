@@ -27,8 +27,8 @@ A new module for conversions. Complement assets.
 
 import base64
 import collections
+import functools
 import logging
-import tarfile
 import tempfile
 from xml.sax.saxutils import escape, unescape
 
@@ -36,7 +36,7 @@ import six
 import xmltodict
 
 import marcx
-import pymarc
+from siskin.stream import convert, parallel_convert, tar_records
 
 html_escape_table = {'"': "&quot;", "'": "&apos;"}
 html_unescape_table = {v: k for k, v in html_escape_table.items()}
@@ -63,7 +63,7 @@ def html_unescape(text):
     return unescape(text, html_unescape_table)
 
 
-def imslp_tarball_to_marc(tarball, outputfile=None, legacy_mapping=None, max_failures=30):
+def imslp_tarball_to_marc(tarball, outputfile=None, legacy_mapping=None, max_failures=30, processes=1):
     """
     Convert an IMSLP tarball to MARC binary output file without extracting it.
     If outputfile is not given, write to a temporary location.
@@ -72,28 +72,20 @@ def imslp_tarball_to_marc(tarball, outputfile=None, legacy_mapping=None, max_fai
 
     A maximum number of failed conversions can be specified with `max_failures`,
     as of 2018-04-25, there were 30 records w/o title.
+
+    With `processes` greater than one, the XML documents are converted in a
+    process pool, output order stays the same.
     """
     if outputfile is None:
         _, outputfile = tempfile.mkstemp(prefix="siskin-")
 
-    stats = collections.Counter()
+    mapping = functools.partial(imslp_xml_to_marc, legacy_mapping=legacy_mapping)
 
     with open(outputfile, "wb") as output:
-        writer = pymarc.MARCWriter(output)
-        with tarfile.open(tarball) as tar:
-            for member in tar.getmembers():
-                fobj = tar.extractfile(member)
-                try:
-                    record = imslp_xml_to_marc(fobj.read(), legacy_mapping=legacy_mapping)
-                    writer.write(record)
-                except ValueError as exc:
-                    logger.warn("conversion failed: %s", exc)
-                    stats["failed"] += 1
-                finally:
-                    fobj.close()
-                    stats["processed"] += 1
-
-        writer.close()
+        if processes == 1:
+            stats = convert(tar_records(tarball), mapping, output)
+        else:
+            stats = parallel_convert(tar_records(tarball), mapping, output, processes=processes)
 
         if stats["failed"] > max_failures:
             logger.warn("%d records failed, only %d failures allowed", stats["failed"], max_failures)
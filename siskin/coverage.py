@@ -0,0 +1,155 @@
+# coding: utf-8
+# pylint: disable=C0103,W0232,C0301,W0703
+
+# Copyright 2019 by Leipzig University Library, http://ub.uni-leipzig.de
+#                   The Finc Authors, http://finc.info
+#                   Martin Czygan, <martin.czygan@uni-leipzig.de>
+#
+# This file is part of some open source application.
+#
+# Some open source application is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+#
+# Some open source application is distributed in the hope that it will
+# be useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+#
+# @license GPL-3.0+ <http://spdx.org/licenses/GPL-3.0+>
+"""
+ISSN coverage of holding files by a number of sources.
+
+An ISSN has seven digits and a check digit (0-9 or X), so it fits into a
+small integer (see `issn_to_int`). Each source list becomes a sorted NumPy
+array of integers; membership of the ISSN of a holding file in all sources
+is computed at once, as a boolean matrix (ISSN x source).
+
+    matrix = CoverageMatrix([("crossref", issn_array(handle)), ...])
+    for issn, label in matrix.report(kbart_issn_array(holdings)):
+        print(issn, label)  # 2091-2145 crossref|doaj, or 2091-2730 NOT_FOUND
+
+Since the source arrays are only built once, many holding files can be
+checked in one go.
+"""
+
+import re
+
+import numpy as np
+import six
+
+issn_pattern = re.compile(r'[0-9]{4}-?[0-9]{3}[0-9Xx]')
+
+
+def issn_to_int(s):
+    """
+    Turn the first ISSN found in a string into an integer, None if there is no
+    ISSN. The check digit is not verified.
+
+    >>> issn_to_int('2091-2145')
+    23003359
+    """
+    if isinstance(s, six.binary_type):
+        s = s.decode('utf-8', 'replace')
+    match = issn_pattern.search(s)
+    if not match:
+        return None
+    value = match.group().replace('-', '')
+    check = 10 if value[7] in 'Xx' else int(value[7])
+    return int(value[:7]) * 11 + check
+
+
+def int_to_issn(value):
+    """
+    Turn an integer back into an ISSN, e.g. 2091-2145.
+    """
+    value = int(value)
+    digits, check = divmod(value, 11)
+    return '%04d-%03d%s' % (digits // 1000, digits % 1000, 'X' if check == 10 else check)
+
+
+def issn_array(lines):
+    """
+    Sorted array of the distinct ISSN found in an iterable of strings, one
+    ISSN per string at most.
+    """
+    values = (issn_to_int(line) for line in lines)
+    return np.unique(np.fromiter((v for v in values if v is not None), dtype=np.int64))
+
+
+def kbart_issn_array(lines, columns=(1, 2)):
+    """
+    Sorted array of the distinct ISSN in the print and online identifier
+    columns of a KBART file; lines with fewer than three columns are skipped.
+    """
+    def issns():
+        for line in lines:
+            if isinstance(line, six.binary_type):
+                line = line.decode('utf-8', 'replace')
+            fields = line.rstrip('\r\n').split('\t')
+            if len(fields) < 3:
+                continue
+            for column in columns:
+                value = issn_to_int(fields[column])
+                if value is not None:
+                    yield value
+
+    return np.unique(np.fromiter(issns(), dtype=np.int64))
+
+
+class CoverageMatrix(object):
+    """
+    Membership of ISSN in a number of sources, given as (name, issn array)
+    pairs. The order of the sources determines the order of names in labels.
+    """
+    def __init__(self, sources, missing='NOT_FOUND'):
+        self.names = [name for name, _ in sources]
+        self.arrays = [np.asarray(array, dtype=np.int64) for _, array in sources]
+        self.missing = missing
+
+    @classmethod
+    def from_targets(cls, targets, names, **kwargs):
+        """
+        Build a matrix from ISSN lists, given a dictionary of targets (anything
+        with an open method, e.g. luigi.LocalTarget) and the names to use.
+        """
+        sources = []
+        for name in names:
+            with targets[name].open() as handle:
+                sources.append((name, issn_array(handle)))
+        return cls(sources, **kwargs)
+
+    def matrix(self, issns):
+        """
+        Boolean matrix with a row for each ISSN and a column for each source.
+        """
+        issns = np.asarray(issns, dtype=np.int64)
+        result = np.zeros((len(issns), len(self.names)), dtype=bool)
+        for j, array in enumerate(self.arrays):
+            result[:, j] = np.isin(issns, array)
+        return result
+
+    def labels(self, issns):
+        """
+        List of labels like crossref|doaj for each ISSN, or the missing label.
+        """
+        matrix = self.matrix(issns)
+        weights = 1 << np.arange(len(self.names), dtype=np.int64)
+        masks = matrix.astype(np.int64).dot(weights)
+        unique, inverse = np.unique(masks, return_inverse=True)
+        lookup = []
+        for mask in unique:
+            names = [name for j, name in enumerate(self.names) if mask & (1 << j)]
+            lookup.append('|'.join(names) if names else self.missing)
+        return [lookup[i] for i in inverse.ravel()]
+
+    def report(self, issns):
+        """
+        Yield (ISSN, label) tuples, in order of the given ISSN.
+        """
+        for value, label in zip(issns, self.labels(issns)):
+            yield int_to_issn(value), label
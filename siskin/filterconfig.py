@@ -0,0 +1,238 @@
+# coding: utf-8
+# pylint: disable=C0103,W0232,C0301,W0703
+
+# Copyright 2019 by Leipzig University Library, http://ub.uni-leipzig.de
+#                   The Finc Authors, http://finc.info
+#                   Martin Czygan, <martin.czygan@uni-leipzig.de>
+#
+# This file is part of some open source application.
+#
+# Some open source application is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+#
+# Some open source application is distributed in the hope that it will
+# be useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+#
+# @license GPL-3.0+ <http://spdx.org/licenses/GPL-3.0+>
+"""
+Evaluate a span filterconfig, as created by AMSLFilterConfig, in Python.
+
+A filterconfig maps an ISIL to a filter tree. The usual tree is a disjunction
+of conjunctions of source, collection and holdings filters:
+
+    {"DE-15": {"or": [{"and": [{"source": ["49"]},
+                               {"collection": ["Crossref"]},
+                               {"holdings": {"urls": ["https://x.y.z/kbart"]}}]},
+                      ...]}}
+
+The naive way to attach ISILs is to walk each tree for each document, see
+`evaluate`. `FilterConfig` compiles the trees into an index by source id and
+collection, so only the few branches, that can match a document, are looked
+at. Holdings filters are reduced to a set of ISSN per branch.
+
+    holdings = {"https://x.y.z/kbart": kbart_issns(handle)}
+    matcher = FilterConfig(filterconfig, holdings=holdings)
+    matcher.isils(doc)  # ["DE-15", ...]
+
+Holdings files only contribute their ISSN; coverage and embargo are not
+checked. Filters other than source, collection, subject and holdings, as well
+as nested trees, are evaluated naively.
+"""
+
+import collections
+import logging
+
+import six
+
+logger = logging.getLogger('siskin')
+
+
+def doc_values(doc, *fields):
+    """
+    Return the set of values of a number of (list or scalar) fields.
+    """
+    result = set()
+    for field in fields:
+        value = doc.get(field)
+        if value is None:
+            continue
+        if isinstance(value, list):
+            result.update(v for v in value if v)
+        else:
+            result.add(value)
+    return result
+
+
+def doc_collections(doc):
+    return doc_values(doc, 'finc.mega_collection', 'finc.technical_collection_id')
+
+
+def doc_issns(doc):
+    return doc_values(doc, 'rft.issn', 'rft.eissn')
+
+
+def kbart_issns(handle):
+    """
+    Read the print and online identifiers from a KBART file (text lines).
+    """
+    issns = set()
+    header = None
+    for line in handle:
+        if isinstance(line, six.binary_type):
+            line = line.decode('utf-8', 'replace')
+        fields = line.rstrip('\r\n').split('\t')
+        if header is None:
+            header = dict((name.strip(), i) for i, name in enumerate(fields))
+            continue
+        for name in ('print_identifier', 'online_identifier'):
+            i = header.get(name)
+            if i is not None and i < len(fields) and fields[i].strip():
+                issns.add(fields[i].strip())
+    return issns
+
+
+def evaluate(tree, doc, holdings=None):
+    """
+    Evaluate a single filter tree for a document, the naive way. Holdings is
+    a dictionary from URL to a set of ISSN.
+    """
+    holdings = holdings or {}
+    if len(tree) != 1:
+        raise ValueError('filter must have a single key: %s' % tree)
+    name, value = list(tree.items())[0]
+    if name == 'or':
+        return any(evaluate(t, doc, holdings) for t in value)
+    if name == 'and':
+        return all(evaluate(t, doc, holdings) for t in value)
+    if name == 'not':
+        return not evaluate(value, doc, holdings)
+    if name == 'source':
+        return doc.get('finc.source_id') in value
+    if name == 'collection':
+        return any(c in value for c in doc_collections(doc))
+    if name == 'subject':
+        return any(s in value for s in doc_values(doc, 'x.subjects'))
+    if name == 'holdings':
+        issns = doc_issns(doc)
+        return any(issn in holdings.get(url, ()) for url in value.get('urls', []) for issn in issns)
+    raise ValueError('unsupported filter: %s' % name)
+
+
+# A conjunction of simple filters, every set given must intersect the
+# corresponding document values.
+Clause = collections.namedtuple('Clause', 'isil sources collections subjects holdings')
+
+
+class FilterConfig(object):
+    """
+    A compiled filterconfig. Branches are indexed by source id and collection
+    name (or None, if the branch does not restrict collections).
+    """
+    def __init__(self, config, holdings=None):
+        self.holdings = holdings or {}
+        self.index = collections.defaultdict(lambda: collections.defaultdict(list))
+        self.generic = []
+        self._issns = {}
+
+        for url in set(self._urls(config)) - set(self.holdings):
+            logger.warning('no holdings for %s, treating as empty', url)
+
+        for isil, tree in sorted(config.items()):
+            terms = tree['or'] if list(tree) == ['or'] else [tree]
+            for term in terms:
+                clause = self.compile(isil, term)
+                if clause is None:
+                    self.generic.append((isil, term))
+                    continue
+                for sid in clause.sources:
+                    for coll in ((None, ) if clause.collections is None else clause.collections):
+                        self.index[sid][coll].append(clause)
+
+        logger.debug('compiled filterconfig: %d sources, %d generic branches', len(self.index), len(self.generic))
+
+    def _urls(self, tree):
+        if isinstance(tree, dict):
+            for name, value in tree.items():
+                if name == 'holdings':
+                    for url in value.get('urls', []):
+                        yield url
+                else:
+                    for url in self._urls(value):
+                        yield url
+        elif isinstance(tree, list):
+            for value in tree:
+                for url in self._urls(value):
+                    yield url
+
+    def compile(self, isil, term):
+        """
+        Turn a single branch into a Clause, return None, if this branch needs
+        to be evaluated naively.
+        """
+        filters = term['and'] if list(term) == ['and'] else [term]
+        sources, collections_, subjects, holdings = None, None, None, []
+        for f in filters:
+            if len(f) != 1:
+                return None
+            name, value = list(f.items())[0]
+            if name == 'source' and sources is None:
+                sources = frozenset(value)
+            elif name == 'collection' and collections_ is None:
+                collections_ = frozenset(value)
+            elif name == 'subject' and subjects is None:
+                subjects = frozenset(value)
+            elif name == 'holdings':
+                urls = tuple(sorted(value.get('urls', [])))
+                if urls not in self._issns:
+                    self._issns[urls] = frozenset(issn for url in urls for issn in self.holdings.get(url, ()))
+                holdings.append(self._issns[urls])
+            else:
+                return None
+        if sources is None:
+            return None
+        return Clause(isil, sources, collections_, subjects, tuple(holdings))
+
+    def isils(self, doc):
+        """
+        Return the sorted list of ISIL attached to a document.
+        """
+        result = set()
+        index = self.index.get(doc.get('finc.source_id'))
+        if index:
+            candidates = list(index.get(None, ()))
+            for coll in doc_collections(doc):
+                candidates.extend(index.get(coll, ()))
+            issns, subjects = None, None
+            for clause in candidates:
+                if clause.isil in result:
+                    continue
+                if clause.subjects is not None:
+                    if subjects is None:
+                        subjects = doc_values(doc, 'x.subjects')
+                    if clause.subjects.isdisjoint(subjects):
+                        continue
+                if clause.holdings:
+                    if issns is None:
+                        issns = doc_issns(doc)
+                    if any(h.isdisjoint(issns) for h in clause.holdings):
+                        continue
+                result.add(clause.isil)
+        for isil, term in self.generic:
+            if isil not in result and evaluate(term, doc, self.holdings):
+                result.add(isil)
+        return sorted(result)
+
+
+def naive_isils(config, doc, holdings=None):
+    """
+    Return the sorted list of ISIL attached to a document, by evaluating each
+    tree in turn.
+    """
+    return sorted(isil for isil, tree in config.items() if evaluate(tree, doc, holdings))
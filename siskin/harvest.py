@@ -0,0 +1,635 @@
+# coding: utf-8
+# pylint: disable=C0103,W0232,C0301,W0703
+
+# Copyright 2019 by Leipzig University Library, http://ub.uni-leipzig.de
+#                   The Finc Authors, http://finc.info
+#                   Martin Czygan, <martin.czygan@uni-leipzig.de>
+#
+# This file is part of some open source application.
+#
+# Some open source application is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+#
+# Some open source application is distributed in the hope that it will
+# be useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+#
+# @license GPL-3.0+ <http://spdx.org/licenses/GPL-3.0+>
+"""
+Resumable, parallel deep paging harvests, e.g. for the Crossref /works API.
+
+A harvest is split into windows (e.g. months). Each window is paged through
+with a cursor, every page is appended as a separate gzip member to a partial
+file and the next cursor is saved in a checkpoint file next to it. After a
+crash, the partial file is truncated to the last checkpoint and the harvest
+continues with the saved cursor, instead of restarting the window.
+
+Windows are harvested concurrently by a bounded thread pool, all workers share
+a single RateLimiter, so the politeness limit holds for the whole process.
+
+    harvester = CursorHarvester("https://api.crossref.org/works", rate=2)
+    harvester.harvest_windows([
+        ((datetime.date(2019, 1, 1), datetime.date(2019, 2, 1)), "2019-01.ldj.gz"),
+        ((datetime.date(2019, 2, 1), datetime.date(2019, 3, 1)), "2019-02.ldj.gz"),
+    ], workers=4)
+
+Snapshots, that are split into a number of files, can be fetched with a
+PartDownloader. Parts are downloaded concurrently, checked and converted right
+away, then the converted parts are concatenated in the original order. Parts
+are kept in a directory, so a failed run can be resumed.
+
+    downloader = PartDownloader("/tmp/parts", convert=convert, workers=4)
+    downloader.run(["https://x.y.z/teil1.xml.gz", "https://x.y.z/teil2.xml.gz"], "snapshot.mrc")
+
+Selections from an SRU server, given as a disjunction, can be fetched with an
+SRUHarvester. Each clause is paged through separately (and concurrently),
+records are converted to binary MARC right away and deduplicated by their
+identifier (001) at the end.
+
+    harvester = SRUHarvester("https://sru.k10plus.de/opac-de-627", workers=4)
+    harvester.run('pica.bkl="05.15" or pica.ssg="bbi"', "/tmp/sru", "selection.mrc")
+
+"""
+
+import collections
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import xml.etree.cElementTree as ET
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import six
+import urllib3
+from six.moves.urllib.parse import urlencode, urlparse
+
+import backoff
+import pymarc
+from siskin.utils import RateLimiter
+
+logger = logging.getLogger('siskin')
+
+
+class CursorHarvester(object):
+    """
+    Harvest a cursor based API, window by window. Each page is written as one
+    line, containing the unaltered JSON response body.
+    """
+    def __init__(self,
+                 url='https://api.crossref.org/works',
+                 rows=1000,
+                 filter='deposit',
+                 mailto=None,
+                 rate=1.0,
+                 max_tries=10,
+                 timeout=600):
+        """
+        The `filter` is the crossref date filter type (index, deposit, update),
+        `rate` the maximum number of requests per second across all workers.
+        HTTP errors and unparsable responses are retried at most `max_tries`
+        times with exponential backoff.
+        """
+        self.url = url
+        self.rows = rows
+        self.filter = filter
+        self.mailto = mailto
+        self.limiter = RateLimiter(rate=rate)
+        self.max_tries = max_tries
+        self.timeout = timeout
+        self.sess = requests.session()
+
+    def window_params(self, begin, end):
+        """
+        Query parameters for a window, without cursor.
+        """
+        params = {
+            'rows': self.rows,
+            'filter': 'from-{f}-date:{begin},until-{f}-date:{end}'.format(f=self.filter, begin=begin, end=end),
+        }
+        # Do not fail, if user has not configured mailto, https://git.io/vFyN5.
+        if self.mailto:
+            params['mailto'] = self.mailto
+        return params
+
+    def fetch_page(self, params):
+        """
+        Fetch and decode a single page. Returns the body and the decoded message.
+        """
+        @backoff.on_exception(backoff.expo, (RuntimeError, ValueError, requests.exceptions.RequestException),
+                              max_tries=self.max_tries)
+        def fetch(url):
+            self.limiter.wait()
+            r = self.sess.get(url, timeout=self.timeout)
+            if r.status_code >= 400:
+                raise RuntimeError('%s on %s' % (r.status_code, url))
+            return r.text, json.loads(r.text)
+
+        url = '%s?%s' % (self.url, urlencode(sorted(params.items())))
+        return fetch(url)
+
+    def harvest_window(self, begin, end, path):
+        """
+        Harvest a single window into a gzip compressed file at path. Resumes
+        from `path.checkpoint`, if it exists. Returns a counter with the number
+        of pages and items harvested in this run.
+        """
+        stats = collections.Counter()
+        partial, checkpoint = '%s.part' % path, '%s.checkpoint' % path
+
+        state = {'cursor': '*', 'offset': 0}
+        if os.path.exists(checkpoint) and os.path.exists(partial):
+            with open(checkpoint) as handle:
+                state = json.load(handle)
+            logger.debug('resuming %s at cursor %s', path, state['cursor'])
+
+        params = self.window_params(begin, end)
+
+        if not os.path.exists(os.path.dirname(os.path.abspath(path))):
+            os.makedirs(os.path.dirname(os.path.abspath(path)))
+
+        with open(partial, 'ab') as output:
+            # Drop anything written after the last checkpoint.
+            output.truncate(state['offset'])
+            output.seek(state['offset'])
+
+            while True:
+                params['cursor'] = state['cursor']
+                body, content = self.fetch_page(params)
+
+                count = len(content['message']['items'])
+                logger.debug('%s [%s, %s]: %s', state['cursor'], begin, end, count)
+                if count == 0:
+                    break
+
+                if not 'next-cursor' in content['message']:
+                    raise RuntimeError('missing key: next-cursor')
+
+                with gzip.GzipFile(fileobj=output, mode='wb') as member:
+                    member.write(body.encode('utf-8') if isinstance(body, six.text_type) else body)
+                    member.write(b'\n')
+                output.flush()
+                os.fsync(output.fileno())
+
+                state = {'cursor': content['message']['next-cursor'], 'offset': output.tell()}
+                write_checkpoint(checkpoint, state)
+
+                stats['pages'] += 1
+                stats['items'] += count
+
+            if output.tell() == 0:
+                # An empty window, a zero byte file is not valid gzip.
+                gzip.GzipFile(fileobj=output, mode='wb').close()
+
+        os.rename(partial, path)
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        return stats
+
+    def harvest_windows(self, windows, workers=4):
+        """
+        Harvest a list of ((begin, end), path) tuples concurrently with at most
+        `workers` threads. Windows whose path already exists are skipped.
+        Returns the aggregated counter. Any failed window raises, after all
+        other windows have finished.
+        """
+        stats = collections.Counter()
+        pending = [(window, path) for window, path in windows if not os.path.exists(path)]
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [(executor.submit(self.harvest_window, begin, end, path), path)
+                       for (begin, end), path in pending]
+            errors = []
+            for future, path in futures:
+                try:
+                    stats.update(future.result())
+                except Exception as exc:
+                    logger.warning('harvest failed for %s: %s', path, exc)
+                    errors.append(exc)
+
+        stats['windows'] = len(pending)
+        if errors:
+            raise RuntimeError('%d of %d windows failed, rerun to resume: %s' % (len(errors), len(pending), errors[0]))
+        return stats
+
+
+def write_checkpoint(path, state):
+    """
+    Atomically replace the checkpoint file at path with the JSON state.
+    """
+    fd, tmp = tempfile.mkstemp(prefix='siskin-', dir=os.path.dirname(os.path.abspath(path)))
+    with os.fdopen(fd, 'w') as handle:
+        json.dump(state, handle)
+    os.rename(tmp, path)
+
+
+def check_gzip(path, size=1 << 20):
+    """
+    Raise a ValueError, if the file at path starts like gzip, but is not
+    a complete and valid gzip file. Other files pass.
+    """
+    with open(path, 'rb') as handle:
+        if handle.read(2) != b'\x1f\x8b':
+            return
+    try:
+        with gzip.open(path, 'rb') as handle:
+            while handle.read(size):
+                pass
+    except (IOError, EOFError, zlib.error) as exc:
+        raise ValueError('invalid gzip file: %s: %s' % (path, exc))
+
+
+class PartDownloader(object):
+    """
+    Download a list of URLs concurrently into a directory, convert each part
+    as soon as it is complete and concatenate the converted parts in order.
+
+    A part is downloaded to a partial file first. Interrupted downloads are
+    continued with a range request, if the server supports it. A finished
+    download must match the announced content length and pass `check` (by
+    default a gzip integrity check), otherwise it is removed and retried.
+    Downloaded and converted parts are kept, so a rerun only does the
+    missing work.
+    """
+    def __init__(self, directory, convert=None, workers=4, max_tries=5, timeout=600, check=check_gzip,
+                 chunk_size=1 << 16):
+        """
+        The `convert` function gets the path to a downloaded part and the path
+        to write the result to, without a function, parts are concatenated
+        as they are.
+        """
+        self.directory = directory
+        self.convert = convert
+        self.workers = workers
+        self.max_tries = max_tries
+        self.timeout = timeout
+        self.check = check
+        self.chunk_size = chunk_size
+        self.sess = requests.session()
+
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+    def part_path(self, i, url):
+        """
+        Local path for the i-th part.
+        """
+        name = os.path.basename(urlparse(url).path) or 'part'
+        return os.path.join(self.directory, '%05d-%s' % (i, name))
+
+    def download(self, url, path):
+        """
+        Download url to path, resuming a partial download, if possible.
+        """
+        partial = '%s.part' % path
+
+        @backoff.on_exception(
+            backoff.expo,
+            (RuntimeError, ValueError, requests.exceptions.RequestException, urllib3.exceptions.HTTPError),
+            max_tries=self.max_tries)
+        def fetch():
+            offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+            headers = {'Range': 'bytes=%d-' % offset} if offset > 0 else {}
+            r = self.sess.get(url, headers=headers, stream=True, timeout=self.timeout)
+            if r.status_code == 416 and offset > 0:
+                # Partial file is complete or broken, start over.
+                os.remove(partial)
+                raise RuntimeError('416 on %s, restarting download' % url)
+            if r.status_code >= 400:
+                raise RuntimeError('%s on %s' % (r.status_code, url))
+            mode = 'ab' if r.status_code == 206 else 'wb'
+            if mode == 'wb':
+                offset = 0
+            expected = r.headers.get('Content-Length')
+            written = 0
+            with open(partial, mode) as output:
+                # Keep the bytes as sent, even with a Content-Encoding (e.g.
+                # gzip files served as x-gzip), since Content-Length and
+                # ranges count these bytes.
+                for chunk in r.raw.stream(self.chunk_size, decode_content=False):
+                    output.write(chunk)
+                    written += len(chunk)
+            if expected is not None and written != int(expected):
+                raise RuntimeError('short read on %s: got %d of %s bytes' % (url, written, expected))
+            try:
+                if self.check:
+                    self.check(partial)
+            except ValueError:
+                os.remove(partial)
+                raise
+            logger.debug('downloaded %s (%d bytes, resumed at %d)', url, offset + written, offset)
+
+        fetch()
+        os.rename(partial, path)
+
+    def process(self, i, url):
+        """
+        Download and convert the i-th part, skipping work already done.
+        Returns the path to the converted part.
+        """
+        path = self.part_path(i, url)
+        converted = '%s.out' % path
+        if os.path.exists(converted):
+            return converted
+        if not os.path.exists(path):
+            self.download(url, path)
+        if self.convert is None:
+            return path
+        tmp = '%s.tmp' % converted
+        self.convert(path, tmp)
+        os.rename(tmp, converted)
+        return converted
+
+    def run(self, urls, output, cleanup=True):
+        """
+        Fetch and convert all URLs, write the concatenated result to output.
+        Any failure raises, after all parts have been attempted. With
+        cleanup, the directory is removed after a successful run.
+        """
+        stats = collections.Counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [(executor.submit(self.process, i, url), url) for i, url in enumerate(urls)]
+            errors = []
+            results = []
+            for future, url in futures:
+                try:
+                    results.append(future.result())
+                except Exception as exc:
+                    logger.warning('part failed: %s: %s', url, exc)
+                    errors.append(exc)
+
+        if errors:
+            raise RuntimeError('%d of %d parts failed, rerun to resume: %s' % (len(errors), len(futures), errors[0]))
+
+        with open(output, 'wb') as handle:
+            for path in results:
+                with open(path, 'rb') as part:
+                    shutil.copyfileobj(part, handle, 1 << 20)
+                stats['bytes'] += os.path.getsize(path)
+        stats['parts'] = len(results)
+
+        if cleanup:
+            shutil.rmtree(self.directory)
+        return stats
+
+
+def split_or(query):
+    """
+    Split a CQL query into the clauses of its top level disjunction. Clauses
+    are returned in order, without duplicates and with whitespace collapsed.
+    Quoted strings and parenthesized expressions are not split.
+
+        >>> split_or('a="1" or (b="2" or c="3") OR d="x or y"')
+        ['a="1"', '(b="2" or c="3")', 'd="x or y"']
+
+    CQL evaluates booleans left to right, without precedence, so `a or b and
+    c` means `(a or b) and c`. If there is another boolean (and, not, prox)
+    at the top level, the query is returned unsplit, as a single clause.
+
+        >>> split_or('a="1" or b="2" and c="3"')
+        ['a="1" or b="2" and c="3"']
+
+    """
+    clauses, current, depth, mixed = [], [], 0, False
+    for token in re.findall(r'"(?:[^"\\]|\\.)*"?|[()]|[^\s()"]+|\s+', query):
+        if token.startswith('"'):
+            token = ' '.join(token.split())
+        elif token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        elif token.isspace():
+            token = ' '
+        elif depth == 0 and token.lower().split('/')[0] in ('and', 'not', 'prox'):
+            mixed = True
+        elif token.lower() == 'or' and depth == 0:
+            clauses.append(''.join(current).strip())
+            current = []
+            continue
+        current.append(token)
+    clauses.append(''.join(current).strip())
+    if mixed and len(clauses) > 1:
+        clauses = [' or '.join(clauses)]
+    result = []
+    for clause in clauses:
+        if not clause:
+            raise ValueError('empty clause in query: %s' % query)
+        if clause not in result:
+            result.append(clause)
+    return result
+
+
+def marc_control_field(data, tag='001'):
+    """
+    Return the value of a control field from a binary MARC record (bytes) as
+    text, by looking at the directory only. None, if there is no such field.
+    """
+    base = int(data[12:17])
+    directory = data[24:base - 1]
+    tag = tag.encode('ascii')
+    for i in range(0, len(directory) - 11, 12):
+        if directory[i:i + 3] == tag:
+            length, start = int(directory[i + 3:i + 7]), int(directory[i + 7:i + 12])
+            return data[base + start:base + start + length - 1].decode('utf-8', 'replace')
+    return None
+
+
+def iter_marc(handle):
+    """
+    Yield the raw bytes of each record in a binary MARC file.
+    """
+    while True:
+        leader = handle.read(5)
+        if not leader:
+            break
+        length = int(leader)
+        data = leader + handle.read(length - 5)
+        if len(data) != length:
+            raise ValueError('truncated MARC record')
+        yield data
+
+
+def local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+class SRUHarvester(object):
+    """
+    Harvest MARCXML records from an SRU server (searchRetrieve, version 1.1),
+    e.g. K10plus. A query is split into the clauses of its disjunction, which
+    are paged through concurrently. Every page is converted to binary MARC and
+    appended to a part file per clause; like CursorHarvester, the position is
+    saved in a checkpoint file after each page, so an interrupted run resumes
+    with the next page. Parts are concatenated in clause order, records with a
+    001 seen before are dropped.
+    """
+    def __init__(self,
+                 url='https://sru.k10plus.de/opac-de-627',
+                 schema='marcxml',
+                 rows=100,
+                 workers=4,
+                 max_tries=10,
+                 timeout=600):
+        """
+        Fetch `rows` records per request, with at most `workers` requests at
+        a time. HTTP errors and unparsable responses are retried at most
+        `max_tries` times with exponential backoff.
+        """
+        self.url = url
+        self.schema = schema
+        self.rows = rows
+        self.workers = workers
+        self.max_tries = max_tries
+        self.timeout = timeout
+        self.sess = requests.session()
+        self.sess.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=workers))
+        self.sess.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=workers))
+
+    def fetch_page(self, query, start):
+        """
+        Fetch a single page. Returns the number of hits, the list of records
+        (pymarc) and the position of the next page (None, on the last page).
+        SRU diagnostics raise a RuntimeError right away.
+        """
+        @backoff.on_exception(backoff.expo, (RuntimeError, ValueError, requests.exceptions.RequestException),
+                              max_tries=self.max_tries)
+        def fetch(url):
+            r = self.sess.get(url, timeout=self.timeout)
+            if r.status_code >= 400:
+                raise RuntimeError('%s on %s' % (r.status_code, url))
+            try:
+                return r.content, ET.fromstring(r.content)
+            except ET.ParseError as exc:
+                raise ValueError('invalid response: %s' % exc)
+
+        params = {
+            'operation': 'searchRetrieve',
+            'version': '1.1',
+            'query': query,
+            'startRecord': start,
+            'maximumRecords': self.rows,
+            'recordSchema': self.schema,
+        }
+        body, root = fetch('%s?%s' % (self.url, urlencode(sorted(params.items()))))
+
+        values = {}
+        for elem in root.iter():
+            name = local_name(elem.tag)
+            if name in ('numberOfRecords', 'nextRecordPosition', 'message') and name not in values:
+                values[name] = (elem.text or '').strip()
+            if name == 'diagnostic':
+                message = ' '.join(t.strip() for t in elem.itertext() if t.strip())
+                raise RuntimeError('SRU diagnostic for %s: %s' % (query, message))
+
+        records = pymarc.marcxml.parse_xml_to_array(io.BytesIO(body), strict=True)
+        next_position = values.get('nextRecordPosition')
+        return int(values.get('numberOfRecords') or 0), records, int(next_position) if next_position else None
+
+    def harvest_query(self, query, path):
+        """
+        Harvest all records for a query into a binary MARC file at path.
+        Resumes from `path.checkpoint`, if it exists. Returns a counter with
+        the number of pages and records fetched in this run.
+        """
+        stats = collections.Counter()
+        partial, checkpoint = '%s.part' % path, '%s.checkpoint' % path
+
+        state = {'start': 1, 'offset': 0}
+        if os.path.exists(checkpoint) and os.path.exists(partial):
+            with open(checkpoint) as handle:
+                state = json.load(handle)
+            logger.debug('resuming %s at %s', query, state['start'])
+
+        with open(partial, 'ab') as output:
+            output.truncate(state['offset'])
+            output.seek(state['offset'])
+
+            while state['start'] is not None:
+                total, records, next_position = self.fetch_page(query, state['start'])
+                logger.debug('%s [%s/%s]: %s', query, state['start'], total, len(records))
+                if not records:
+                    break
+
+                for record in records:
+                    record.force_utf8 = True
+                    output.write(record.as_marc())
+                output.flush()
+                os.fsync(output.fileno())
+
+                state = {'start': next_position, 'offset': output.tell()}
+                write_checkpoint(checkpoint, state)
+
+                stats['pages'] += 1
+                stats['records'] += len(records)
+
+        os.rename(partial, path)
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        return stats
+
+    def part_path(self, directory, i, query):
+        """
+        Local path for the i-th clause; changing a clause changes the path.
+        """
+        digest = hashlib.sha1(query.encode('utf-8')).hexdigest()[:12]
+        return os.path.join(directory, '%05d-%s.mrc' % (i, digest))
+
+    def run(self, query, directory, output, cleanup=True):
+        """
+        Harvest all clauses of query into directory, then write the records
+        to output (binary MARC), keeping only the first record per 001. Parts
+        already in directory are reused. Any failed clause raises, after all
+        other clauses have finished. With cleanup, the directory is removed
+        after a successful run.
+        """
+        stats = collections.Counter()
+        queries = split_or(query)
+        paths = [self.part_path(directory, i, q) for i, q in enumerate(queries)]
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        pending = [(q, path) for q, path in zip(queries, paths) if not os.path.exists(path)]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [(executor.submit(self.harvest_query, q, path), q) for q, path in pending]
+            errors = []
+            for future, q in futures:
+                try:
+                    stats.update(future.result())
+                except Exception as exc:
+                    logger.warning('harvest failed for %s: %s', q, exc)
+                    errors.append(exc)
+
+        if errors:
+            raise RuntimeError('%d of %d queries failed, rerun to resume: %s' % (len(errors), len(pending), errors[0]))
+
+        seen = set()
+        with open(output, 'wb') as handle:
+            for path in paths:
+                with open(path, 'rb') as part:
+                    for data in iter_marc(part):
+                        identifier = marc_control_field(data)
+                        if identifier is not None:
+                            if identifier in seen:
+                                stats['duplicates'] += 1
+                                continue
+                            seen.add(identifier)
+                        handle.write(data)
+                        stats['written'] += 1
+        stats['queries'] = len(queries)
+
+        if cleanup:
+            shutil.rmtree(directory)
+        return stats
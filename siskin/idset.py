@@ -0,0 +1,244 @@
+# coding: utf-8
+# pylint: disable=C0103,W0232,C0301,W0703
+
+# Copyright 2019 by Leipzig University Library, http://ub.uni-leipzig.de
+#                   The Finc Authors, http://finc.info
+#                   Martin Czygan, <martin.czygan@uni-leipzig.de>
+#
+# This file is part of some open source application.
+#
+# Some open source application is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+#
+# Some open source application is distributed in the hope that it will
+# be useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+#
+# @license GPL-3.0+ <http://spdx.org/licenses/GPL-3.0+>
+"""
+Set operations on identifier lists (DOI, ISSN, ...), one identifier per line.
+
+Instead of loading lists into Python sets, identifiers are kept in sorted,
+deduplicated files (sorted bytewise, like `LC_ALL=C sort -u`) and combined by
+merging: intersection, union and difference are generators over sorted
+iterables and use constant memory.
+
+`overlaps` reads any number of lists once, in a single merged sweep, and
+counts the identifiers per exact combination of lists, from which the size of
+every pairwise or n-way intersection follows.
+
+    lists = [(name, SortedIdentifiers(path)) for name, path in paths.items()]
+    result = overlaps(lists)
+    result.sizes["crossref"]                 # number of identifiers
+    result.intersection("crossref", "doaj")  # size of the intersection
+
+Identifiers are bytes.
+"""
+
+import collections
+import heapq
+import itertools
+import logging
+import os
+import subprocess
+import tempfile
+
+logger = logging.getLogger('siskin')
+
+
+def read_identifiers(path):
+    """
+    Yield the stripped, non-empty lines of a file, as bytes.
+    """
+    with open(path, 'rb') as handle:
+        for line in handle:
+            line = line.strip()
+            if line:
+                yield line
+
+
+def is_sorted(path):
+    """
+    Return True, if the identifiers in file are in ascending (bytewise) order,
+    duplicates allowed.
+    """
+    previous = None
+    for value in read_identifiers(path):
+        if previous is not None and value < previous:
+            return False
+        previous = value
+    return True
+
+
+def unique(iterable):
+    """
+    Drop consecutive duplicates from a sorted iterable. Raises ValueError, if
+    the iterable is not sorted.
+    """
+    previous = None
+    for value in iterable:
+        if previous is not None:
+            if value == previous:
+                continue
+            if value < previous:
+                raise ValueError('input not sorted: %r after %r' % (value, previous))
+        yield value
+        previous = value
+
+
+def sort_unique(path, output, buffer_size='20%'):
+    """
+    Sort the lines of a file bytewise and drop duplicates, with `LC_ALL=C sort
+    -u`. Output may be the input file.
+    """
+    env = dict(os.environ, LC_ALL='C')
+    subprocess.check_call(['sort', '-u', '-S', buffer_size, '-o', output, path], env=env)
+    logger.debug('sorted %s into %s', path, output)
+
+
+class SortedIdentifiers(object):
+    """
+    The distinct identifiers of a file, in sorted order. If the file is not
+    sorted already, a sorted copy is made with `LC_ALL=C sort -u`, which is
+    removed on close. Can be iterated over more than once.
+    """
+    def __init__(self, path, buffer_size='20%'):
+        self.path = path
+        self.tempfile = None
+        if not is_sorted(path):
+            fd, self.tempfile = tempfile.mkstemp(prefix='siskin-idset-')
+            os.close(fd)
+            sort_unique(path, self.tempfile, buffer_size=buffer_size)
+
+    def __iter__(self):
+        return unique(read_identifiers(self.tempfile or self.path))
+
+    def close(self):
+        if self.tempfile and os.path.exists(self.tempfile):
+            os.remove(self.tempfile)
+        self.tempfile = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _tagged(iterable, tag):
+    """
+    Like unique, but yield (value, tag) tuples.
+    """
+    previous = None
+    for value in iterable:
+        if previous is not None:
+            if value == previous:
+                continue
+            if value < previous:
+                raise ValueError('input not sorted: %r after %r' % (value, previous))
+        yield value, tag
+        previous = value
+
+
+def merge(*iterables):
+    """
+    Merge sorted iterables, yield each distinct value together with the
+    sorted tuple of the indices of the iterables, that contain it.
+    """
+    tagged = [_tagged(iterable, i) for i, iterable in enumerate(iterables)]
+    current, members = None, []
+    for value, i in heapq.merge(*tagged):
+        if members and value == current:
+            members.append(i)
+            continue
+        if members:
+            yield current, tuple(members)
+        current, members = value, [i]
+    if members:
+        yield current, tuple(members)
+
+
+def intersection(*iterables):
+    """
+    Values contained in all sorted iterables.
+    """
+    n = len(iterables)
+    for value, members in merge(*iterables):
+        if len(members) == n:
+            yield value
+
+
+def union(*iterables):
+    """
+    Values contained in any of the sorted iterables.
+    """
+    for value, _ in merge(*iterables):
+        yield value
+
+
+def difference(iterable, *others):
+    """
+    Values of the first sorted iterable, not contained in any of the others.
+    """
+    for value, members in merge(iterable, *others):
+        if members == (0, ):
+            yield value
+
+
+class Overlaps(object):
+    """
+    Counts of identifiers per exact combination of lists, as computed by
+    `overlaps`.
+    """
+    def __init__(self, names):
+        self.names = list(names)
+        self.exact = collections.Counter()
+
+    @property
+    def sizes(self):
+        """
+        Number of identifiers per list.
+        """
+        sizes = collections.Counter(dict((name, 0) for name in self.names))
+        for combination, count in self.exact.items():
+            for name in combination:
+                sizes[name] += count
+        return sizes
+
+    def intersection(self, *names):
+        """
+        Number of identifiers contained in all given lists.
+        """
+        wanted = set(names)
+        return sum(count for combination, count in self.exact.items() if wanted.issubset(combination))
+
+    def pairs(self):
+        """
+        Yield (name, name, size of the intersection) for all pairs of lists.
+        """
+        for a, b in itertools.combinations(self.names, 2):
+            yield a, b, self.intersection(a, b)
+
+
+def overlaps(named, callback=None):
+    """
+    Given a list of (name, sorted iterable) pairs, read all iterables once and
+    return an Overlaps object. If given, callback is called with each value
+    and the tuple of names of the lists containing it, in sorted order.
+    """
+    names = [name for name, _ in named]
+    counts = collections.Counter()
+    for value, members in merge(*[iterable for _, iterable in named]):
+        counts[members] += 1
+        if callback is not None:
+            callback(value, tuple(names[i] for i in members))
+    result = Overlaps(names)
+    for members, count in counts.items():
+        result.exact[tuple(names[i] for i in members)] = count
+    return result
@@ -23,8 +23,8 @@
 # @license GPL-3.0+ <http://spdx.org/licenses/GPL-3.0+>
 """
 Slight MABXML abstraction layer, using xmltodict under the hood. Usable up to
-file sizes of 50M. TODO: For larger files, rewrite this with streaming. MAB is
-being phased out since 2013.
+file sizes of 50M. For larger files, use MabXMLStream, which parses one record
+at a time with constant memory. MAB is being phased out since 2013.
 
 MAB specification: https://www.dnb.de/DE/Standardisierung/Formate/MAB/mab_node.html
 
@@ -45,25 +45,60 @@ Example MABXML files: https://git.io/fhFHr.
         for isbn in record.fields("540"):
             print(isbn)
 
+The streaming variant has the same interface, accepts gzip compressed files
+and can be iterated multiple times, if it was given a filename:
+
+    from siskin.mab import MabXMLStream
+
+    for record in MabXMLStream("dump.xml.gz", replace=(u"¬", "")):
+        print(record.field("001"))
+
+Conversions, that need information from other records (e.g. volumes of a
+parent record), can collect it in a cheap first pass, which only parses the
+fields needed, then convert in a second pass:
+
+    from siskin.mab import LinkCollector, MabXMLStream, collect
+
+    stream = MabXMLStream("dump.xml.gz")
+    volumes = LinkCollector("010", "089", normalize=lambda v: v.lstrip("0"))
+    collect(stream, volumes)
+
+    for record in stream:
+        print(record.field("001"), volumes.get(record.field("001").lstrip("0"), []))
+
 """
 
+import codecs
+import collections
+import gzip
 import io
 import os
+import re
+import xml.etree.cElementTree as ET
 
 import six
 import xmltodict
 
+from siskin.stream import SanitizingReader
+
 
 class MabRecord(object):
     """
     A single MAB record.
+
+    Field access goes through an index from (field number, subfield code) to
+    values, which is built on first access, so repeated lookups do not scan
+    all fields again.
     """
+    __slots__ = ("dd", "_index")
+
     def __init__(self, dd):
         """
         Initialize with the default dictionary created by xmltodict for a
         single datensatz element.
         """
         self.dd = dd
+        self._index = None
 
     def status(self):
         return self.dd.get("@status")
@@ -86,44 +121,54 @@ class MabRecord(object):
         """
         return self.fields(number, code=code)
 
+    def index(self):
+        """
+        Return the index, a dictionary mapping (number, code) to a tuple of
+        the first value (None, if missing) and a tuple of all non-empty
+        values. Field values use None as code.
+        """
+        if self._index is not None:
+            return self._index
+
+        first, values = {}, {}
+        for f in (self.dd or {}).get("feld", []):
+            number = f.get("@nr")
+            key = (number, None)
+            if key not in first:
+                first[key] = f.get("#text")
+            if f.get("#text"):
+                values.setdefault(key, []).append(f.get("#text"))
+            for sf in f.get("uf", []):
+                key = (number, sf.get("@code"))
+                if key not in first:
+                    first[key] = sf.get("#text")
+                if sf.get("#text"):
+                    values.setdefault(key, []).append(sf.get("#text"))
+
+        self._index = dict((key, (value, tuple(values.get(key, ())))) for key, value in first.items())
+        return self._index
+
     def field(self, number, code=None, alt=None):
         """
         Returns the value of the first (only) field matching number or None.
         """
-        for f in self.dd.get("feld", []):
-            if f.get("@nr") == number:
-                if code:
-                    for sf in f.get("uf", []):
-                        if sf.get("@code") == code:
-                            return sf.get("#text", alt)
-                else:
-                    return f.get("#text", alt)
-        return alt
+        entry = self.index().get((number, code or None))
+        if entry is None or entry[0] is None:
+            return alt
+        return entry[0]
 
     def fields(self, number, code=None):
         """
         Returns the values of the all fields matching number and possibly
         subfield or empty list.
         """
-        result = []
-
-        for f in self.dd.get("feld", []):
-            if f.get("@nr") != number:
-                continue
-            if code:
-                for sf in f.get("uf", []):
-                    if sf.get("@code") != code:
-                        continue
-                    if sf.get("#text"):
-                        result.append(sf.get("#text"))
-            else:
-                if f.get("#text"):
-                    result.append(f.get("#text"))
-
-        return result
+        entry = self.index().get((number, code or None))
+        if entry is None:
+            return []
+        return list(entry[1])
 
     def size(self):
-        return len([_ for _ in self.dd.get("feld", [])])
+        return len((self.dd or {}).get("feld", []))
 
     def __str__(self):
         return '<MabXMLRecord status=%s, typ=%s, with %s fields>' % (self.status(), self.typ(), self.size())
@@ -141,7 +186,7 @@ class MabXMLFile(object):
         Eagerly parse the XML from filename, filelike or string into a
         xmltodict defaultdict. Basic checks for MAB like XML.
 
-        TODO(miku): Use streaming mode.
+        For large files, use MabXMLStream.
 
         The replace optional argument should be a list of desired substitutions
         in the content, e.g.  (("¬", ""),) to be applied before parsing.
@@ -203,3 +248,215 @@ class MabXMLFile(object):
 
     def __repr__(self):
         return self.__str__()
+
+
+class EncodingReader(object):
+    """
+    Filelike wrapper around a text stream, returning UTF-8 encoded bytes,
+    read in chunks of `size` characters. The encoding in the XML declaration
+    is rewritten to UTF-8 accordingly.
+    """
+    declaration = re.compile(r"""^(<\?xml[^>]*encoding=["'])[^"']*(["'])""")
+
+    def __init__(self, handle, size=1 << 16):
+        self.handle = handle
+        self.size = size
+        self.first = True
+
+    def read(self, size=-1):
+        text = self.handle.read(self.size)
+        if self.first:
+            # Make sure, the whole declaration is seen.
+            while (text.startswith("<?xml") or "<?xml".startswith(text)) and "?>" not in text:
+                chunk = self.handle.read(self.size)
+                if not chunk:
+                    break
+                text += chunk
+            text = self.declaration.sub(r"\1utf-8\2", text)
+            self.first = False
+        return text.encode("utf-8")
+
+
+class ReplacingReader(SanitizingReader):
+    """
+    Filelike wrapper around a text stream, applying string replacements and
+    returning UTF-8 encoded bytes, see EncodingReader. Replacements are done
+    on the encoded bytes, chunk by chunk, so memory use does not depend on
+    the length of the lines. A replacement should not create a match for
+    another one.
+    """
+    def __init__(self, handle, replace=None, size=1 << 16):
+        replace = [(value.encode("utf-8"), replacement.encode("utf-8")) for value, replacement in replace or ()]
+        super(ReplacingReader, self).__init__(EncodingReader(handle, size=size), replace=replace, size=size)
+
+
+def element_to_dict(elem, numbers=None):
+    """
+    Convert an ElementTree element into the structure xmltodict would create
+    for it (with feld and uf forced to be lists). Namespaces are dropped. If
+    numbers are given, only direct children with a nr attribute in numbers
+    are kept, e.g. only some fields of a datensatz.
+    """
+    dd = dict(("@%s" % strip_ns(k), v) for k, v in elem.attrib.items())
+    for child in elem:
+        if numbers is not None and child.get("nr") not in numbers:
+            continue
+        name = strip_ns(child.tag)
+        if not isinstance(name, six.string_types):
+            continue  # Comments and processing instructions.
+        dd.setdefault(name, []).append(element_to_dict(child))
+    parts = [elem.text] + [child.tail for child in elem]
+    text = "".join(p for p in parts if p).strip()
+    if text:
+        dd["#text"] = text
+    return dd
+
+
+def strip_ns(tag):
+    """
+    Strip namespace from a tag, e.g. {http://www.ddb.de/...}feld becomes feld.
+    """
+    if not isinstance(tag, six.string_types) or not "}" in tag:
+        return tag
+    return tag.split("}")[1]
+
+
+class MabXMLStream(object):
+    """
+    Streaming counterpart of MabXMLFile. Records are parsed one datensatz at a
+    time, memory usage does not depend on the file size.
+    """
+    def __init__(self, data, replace=None, encoding='utf-8'):
+        """
+        Data can be a filename (plain or gzip compressed), a filelike or a
+        string. The replace and encoding arguments work like in MabXMLFile, but
+        replacements are applied to fixed size chunks (see ReplacingReader).
+        """
+        if replace and len(replace) == 2 and isinstance(replace[0], six.string_types):
+            replace = (replace, )
+        self.data = data
+        self.replace = replace
+        self.encoding = encoding
+
+    def open(self):
+        """
+        Return a text stream for the data.
+        """
+        if isinstance(self.data, six.string_types):
+            if os.path.exists(self.data):
+                with open(self.data, "rb") as handle:
+                    magic = handle.read(2)
+                if magic == b"\x1f\x8b":
+                    return io.TextIOWrapper(gzip.open(self.data), encoding=self.encoding)
+                return io.open(self.data, encoding=self.encoding)
+            return io.StringIO(six.text_type(self.data))
+        if isinstance(self.data.read(0), six.binary_type):
+            return codecs.getreader(self.encoding)(self.data)
+        return self.data
+
+    def __iter__(self):
+        return self.records()
+
+    def records(self, numbers=None):
+        """
+        Yield records; with numbers, records only contain these fields, which
+        is cheaper, e.g. for a first pass, that only needs a few fields.
+        """
+        if numbers is not None:
+            numbers = frozenset(numbers)
+        handle = self.open()
+        owned = isinstance(self.data, six.string_types)
+        try:
+            context = ET.iterparse(ReplacingReader(handle, replace=self.replace), events=("start", "end"))
+            _, root = next(context)
+            if strip_ns(root.tag) != "datei":
+                raise ValueError("datei tag not found")
+            for event, elem in context:
+                if event != "end" or strip_ns(elem.tag) != "datensatz":
+                    continue
+                yield MabRecord(element_to_dict(elem, numbers=numbers))
+                root.clear()
+        except ET.ParseError as exc:
+            raise ValueError("invalid XML: %s" % exc)
+        finally:
+            if owned:
+                handle.close()
+
+    def __str__(self):
+        return '<MabXMLStream>'
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class Collector(object):
+    """
+    Gathers a small side index from records in a first pass, e.g. links
+    between records, before the records are converted in a second pass.
+    Subclasses list the field `numbers` they need and implement `add`.
+    """
+    numbers = ()
+
+    def add(self, record):
+        raise NotImplementedError
+
+
+class LinkCollector(Collector):
+    """
+    Map the value of a key field to the values of a value field of all
+    records with that key, e.g. parent id (010) to volume (089). Keys are
+    normalized with `normalize`, e.g. to strip leading zeros.
+
+        links = LinkCollector("010", "089", normalize=lambda v: v.lstrip("0"))
+    """
+    def __init__(self, key, value, normalize=None):
+        self.numbers = (key, value)
+        self.key = key
+        self.value = value
+        self.normalize = normalize
+        self.index = collections.defaultdict(list)
+
+    def add(self, record):
+        key, value = record.field(self.key), record.field(self.value)
+        if key and value:
+            if self.normalize is not None:
+                key = self.normalize(key)
+            self.index[key].append(value)
+
+    def get(self, key, default=None):
+        return self.index.get(key, default)
+
+
+class SetCollector(Collector):
+    """
+    Collect the distinct values returned by func (an iterable, or None) for
+    each record. Func may only access fields in numbers.
+    """
+    def __init__(self, numbers, func):
+        self.numbers = tuple(numbers)
+        self.func = func
+        self.values = set()
+
+    def add(self, record):
+        self.values.update(self.func(record) or ())
+
+
+def collect(stream, *collectors):
+    """
+    Run a first pass over a MabXMLStream, parsing only the fields needed by
+    the collectors and passing each record to every collector. Returns the
+    collectors. After that, iterate over the stream again to convert:
+
+        links = LinkCollector("010", "089")
+        collect(stream, links)
+        for record in stream:
+            ... links.get(record.field("001")) ...
+
+    """
+    numbers = set()
+    for collector in collectors:
+        numbers.update(collector.numbers)
+    for record in stream.records(numbers=numbers):
+        for collector in collectors:
+            collector.add(record)
+    return collectors
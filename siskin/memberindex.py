@@ -0,0 +1,171 @@
+# coding: utf-8
+# pylint: disable=C0103,W0232,C0301,W0703
+
+# Copyright 2019 by Leipzig University Library, http://ub.uni-leipzig.de
+#                   The Finc Authors, http://finc.info
+#                   Martin Czygan, <martin.czygan@uni-leipzig.de>
+#
+# This file is part of some open source application.
+#
+# Some open source application is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+#
+# Some open source application is distributed in the hope that it will
+# be useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+#
+# @license GPL-3.0+ <http://spdx.org/licenses/GPL-3.0+>
+"""
+Persistent index of the latest shipment of each member in a set of zip
+archives, e.g. for JSTOR, where updates ship the same XML members again.
+
+Archives are ordered by the timestamp found in their path (then by path), a
+member belongs to the latest archive containing it. Only archives not seen
+before (or changed in size or modification time) are listed on update.
+
+    index = MemberIndex("/tmp/members.db")
+    index.update(["a/jstor-2018-03-10T06-52-44Z-part-001.zip", ...])
+    for archive, member in index.latest():
+        print(archive, member)
+
+"""
+
+import collections
+import logging
+import os
+import re
+import sqlite3
+import zipfile
+
+from siskin.utils import nwise
+
+logger = logging.getLogger('siskin')
+
+# Shipment timestamps, e.g. 2018-03-10T06-52-44Z, 2015-03-23-18-04-17 or 20170904T133503.
+timestamp_pattern = re.compile(r'(\d{4})-?(\d{2})-?(\d{2})[T-]?(\d{2})-?(\d{2})-?(\d{2})')
+
+
+def shipment_timestamp(path):
+    """
+    Return the shipment timestamp as YYYYMMDDHHMMSS, from the filename or, if
+    not found, from the whole path. Empty string, if there is none.
+    """
+    for s in (os.path.basename(path), path):
+        match = timestamp_pattern.search(s)
+        if match:
+            return ''.join(match.groups())
+    return ''
+
+
+class MemberIndex(object):
+    """
+    Member name to latest archive mapping, stored in SQLite.
+    """
+    def __init__(self, path, suffix='xml', predicate=None):
+        """
+        Only members ending in `suffix` are indexed and, if given, only those
+        for which `predicate(archive path, member)` is true. An index file
+        should always be used with the same predicate.
+        """
+        self.path = path
+        self.suffix = suffix
+        self.predicate = predicate
+
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.conn = sqlite3.connect(path, timeout=600)
+        with self.conn:
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS archives (
+                id INTEGER PRIMARY KEY, path TEXT UNIQUE, shipped TEXT, size INTEGER, mtime REAL, members INTEGER)""")
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS members (
+                member TEXT PRIMARY KEY, archive INTEGER NOT NULL) WITHOUT ROWID""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS members_archive ON members (archive)")
+
+    def close(self):
+        self.conn.close()
+
+    def reset(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM members")
+            self.conn.execute("DELETE FROM archives")
+
+    def update(self, paths, batch_size=10000):
+        """
+        Index all new or changed archives in paths. If an archive known to the
+        index is missing from paths, the index is rebuilt, since the members
+        of that archive may now belong to an older archive. Returns a counter
+        of archives scanned and members updated.
+        """
+        stats = collections.Counter()
+        known = dict((row[0], (row[1], row[2], row[3])) for row in self.conn.execute(
+            "SELECT path, id, size, mtime FROM archives"))
+
+        missing = set(known) - set(paths)
+        if missing:
+            logger.warning('%d archives disappeared (e.g. %s), rebuilding index', len(missing), sorted(missing)[0])
+            self.reset()
+            known = {}
+
+        pending = []
+        for path in paths:
+            st = os.stat(path)
+            if path in known and known[path][1:] == (st.st_size, st.st_mtime):
+                continue
+            pending.append((shipment_timestamp(path), path, st))
+
+        for shipped, path, st in sorted(pending):
+            with zipfile.ZipFile(path) as zf:
+                names = [
+                    name for name in zf.namelist()
+                    if name.endswith(self.suffix) and (self.predicate is None or self.predicate(path, name))
+                ]
+
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO archives (id, path, shipped, size, mtime, members) VALUES (?, ?, ?, ?, ?, ?)",
+                    (known[path][0] if path in known else None, path, shipped, st.st_size, st.st_mtime, len(names)))
+                archive = self.conn.execute("SELECT id FROM archives WHERE path = ?", (path, )).fetchone()[0]
+                # A changed archive may not contain all of its former members.
+                self.conn.execute("DELETE FROM members WHERE archive = ?", (archive, ))
+
+                for batch in nwise(names, n=batch_size):
+                    stats['members'] += self._add(batch, archive, (shipped, path))
+
+            stats['archives'] += 1
+            logger.debug('indexed %s with %d members', path, len(names))
+
+        return stats
+
+    def _add(self, names, archive, key):
+        """
+        Point names to archive, unless they already belong to a later archive
+        (by shipment timestamp, then path). Returns number of rows written.
+        """
+        current = {}
+        for chunk in nwise(names, n=500):
+            query = """SELECT m.member, a.shipped, a.path FROM members m JOIN archives a ON a.id = m.archive
+                       WHERE m.member IN (%s)""" % ','.join('?' * len(chunk))
+            for member, shipped, path in self.conn.execute(query, chunk):
+                current[member] = (shipped, path)
+
+        updates = [(name, archive) for name in names if name not in current or current[name] <= key]
+        self.conn.executemany("INSERT OR REPLACE INTO members (member, archive) VALUES (?, ?)", updates)
+        return len(updates)
+
+    def latest(self):
+        """
+        Yield (archive path, member) tuples, ordered by archive path and member.
+        """
+        archives = self.conn.execute("SELECT id, path FROM archives ORDER BY path").fetchall()
+        for archive, path in archives:
+            for (member, ) in self.conn.execute("SELECT member FROM members WHERE archive = ? ORDER BY member",
+                                                (archive, )):
+                yield path, member
@@ -0,0 +1,151 @@
+# coding: utf-8
+# pylint: disable=C0103,W0232,C0301,W0703
+
+# Copyright 2019 by Leipzig University Library, http://ub.uni-leipzig.de
+#                   The Finc Authors, http://finc.info
+#                   Martin Czygan, <martin.czygan@uni-leipzig.de>
+#
+# This file is part of some open source application.
+#
+# Some open source application is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+#
+# Some open source application is distributed in the hope that it will
+# be useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+#
+# @license GPL-3.0+ <http://spdx.org/licenses/GPL-3.0+>
+"""
+Time series of title counts in the index, as recorded by solrcheckup.py.
+
+Each checkup is a run. A run records the number of titles per source, per
+institution and per source and institution, in typed tables indexed by key
+and run. Changes between two runs are computed with a single query.
+
+    store = MetricsStore("solrcheckup.sqlite")
+    store.record(sources={49: 1000}, institutions={"DE-15": 900}, titles={(49, "DE-15"): 900})
+    ...
+    for change in store.diff("titles"):
+        print(change.key, change.previous, change.current)
+
+A previous value of None means the key is new, a current value of None,
+that it disappeared.
+"""
+
+import collections
+import datetime
+import logging
+import os
+import sqlite3
+
+logger = logging.getLogger('siskin')
+
+# Table name to key columns and their types.
+TABLES = collections.OrderedDict([
+    ('sources', (('source', 'INTEGER'), )),
+    ('institutions', (('institution', 'TEXT'), )),
+    ('titles', (('source', 'INTEGER'), ('institution', 'TEXT'))),
+])
+
+Change = collections.namedtuple('Change', 'key previous current')
+
+
+class MetricsStore(object):
+    """
+    Title counts per run, stored in SQLite.
+    """
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.conn = sqlite3.connect(path, timeout=600)
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, date TEXT NOT NULL)")
+            for table, columns in TABLES.items():
+                keys = ', '.join(name for name, _ in columns)
+                self.conn.execute("""CREATE TABLE IF NOT EXISTS %s (run INTEGER NOT NULL REFERENCES runs (id), %s,
+                    titles INTEGER NOT NULL, PRIMARY KEY (%s, run)) WITHOUT ROWID""" %
+                                  (table, ', '.join('%s %s NOT NULL' % c for c in columns), keys))
+                self.conn.execute("CREATE INDEX IF NOT EXISTS %s_run ON %s (run)" % (table, table))
+
+    def close(self):
+        self.conn.close()
+
+    def record(self, date=None, **values):
+        """
+        Record a run, given a dictionary from key to number of titles for each
+        table (sources, institutions, titles). Keys of titles are (source,
+        institution) tuples. Everything is written in a single transaction.
+        Returns the run id.
+        """
+        unknown = set(values) - set(TABLES)
+        if unknown:
+            raise ValueError('unknown tables: %s' % ', '.join(sorted(unknown)))
+        if date is None:
+            date = datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S')
+        with self.conn:
+            run = self.conn.execute("INSERT INTO runs (date) VALUES (?)", (date, )).lastrowid
+            for table, counts in values.items():
+                columns = [name for name, _ in TABLES[table]]
+                query = "INSERT INTO %s (run, %s, titles) VALUES (?, %s, ?)" % (table, ', '.join(columns), ', '.join(
+                    '?' * len(columns)))
+                rows = ((run, ) + (key if isinstance(key, tuple) else (key, )) + (count, )
+                        for key, count in counts.items())
+                self.conn.executemany(query, rows)
+        logger.debug('recorded run %s at %s', run, date)
+        return run
+
+    def runs(self):
+        """
+        List of (id, date) tuples, oldest first.
+        """
+        return self.conn.execute("SELECT id, date FROM runs ORDER BY date, id").fetchall()
+
+    def latest(self):
+        """
+        Return the latest and previous run ids, None if there is none.
+        """
+        ids = [row[0] for row in self.conn.execute("SELECT id FROM runs ORDER BY date DESC, id DESC LIMIT 2")]
+        ids.extend([None, None])
+        return ids[0], ids[1]
+
+    def values(self, table, run=None):
+        """
+        Dictionary from key to number of titles for a run, the latest by default.
+        """
+        if run is None:
+            run, _ = self.latest()
+        columns = [name for name, _ in TABLES[table]]
+        query = "SELECT %s, titles FROM %s WHERE run = ?" % (', '.join(columns), table)
+        return dict((row[0] if len(columns) == 1 else tuple(row[:-1]), row[-1])
+                    for row in self.conn.execute(query, (run, )))
+
+    def diff(self, table, run=None, previous=None, unchanged=False):
+        """
+        Compare two runs, by default the latest and the previous one. Returns a
+        list of Change tuples, sorted by key; only changed values, unless
+        unchanged is True.
+        """
+        if run is None and previous is None:
+            run, previous = self.latest()
+        columns = ', '.join(name for name, _ in TABLES[table])
+        query = """
+            SELECT %s, MAX(CASE WHEN run = :previous THEN titles END) AS old,
+                       MAX(CASE WHEN run = :run THEN titles END) AS new
+            FROM %s WHERE run IN (:previous, :run)
+            GROUP BY %s
+            %s
+            ORDER BY %s""" % (columns, table, columns, '' if unchanged else 'HAVING old IS NOT new', columns)
+        width = len(TABLES[table])
+        return [
+            Change(row[0] if width == 1 else tuple(row[:width]), row[width], row[width + 1])
+            for row in self.conn.execute(query, {'run': run, 'previous': previous})
+        ]
@@ -0,0 +1,133 @@
+# coding: utf-8
+# pylint: disable=C0103,W0232,C0301,W0703
+
+# Copyright 2019 by Leipzig University Library, http://ub.uni-leipzig.de
+#                   The Finc Authors, http://finc.info
+#                   Martin Czygan, <martin.czygan@uni-leipzig.de>
+#
+# This file is part of some open source application.
+#
+# Some open source application is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+#
+# Some open source application is distributed in the hope that it will
+# be useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+#
+# @license GPL-3.0+ <http://spdx.org/licenses/GPL-3.0+>
+"""
+Single pass processing of line delimited JSON, e.g. intermediate schema.
+
+Instead of running `jq` over `unpigz -c` once per derived file, decompress and
+parse the file once and hand each document to a number of sinks.
+
+    from siskin.pipeline import ValueSink, fanout
+
+    issns = ValueSink(fields=('rft.issn', 'rft.eissn'))
+    dois = ValueSink(fields=('doi', ), pattern='10.*')
+
+    fanout('input.ldj.gz', [issns, dois])
+
+    for issn in issns.values():
+        print(issn)
+
+    luigi.LocalTarget(dois.path).move('dois.tsv')
+
+A sink implements `add(doc, line)` with the decoded document and the raw line
+(bytes) and `close()`, which is called after the last document.
+"""
+
+import json
+import logging
+import os
+import re
+import tempfile
+
+import six
+
+from siskin.idset import sort_unique
+from siskin.stream import open_source
+
+logger = logging.getLogger('siskin')
+
+
+class ValueSink(object):
+    """
+    Collect the distinct values of a few fields. List values are flattened,
+    null and empty values are skipped. With a `pattern`, only the first match
+    of the pattern in a value is kept, e.g. '10.*' like `grep -o "10.*"`.
+
+    Values are written to a temporary file, which is sorted bytewise and
+    deduplicated with `LC_ALL=C sort -u` on close, so memory use does not
+    grow with the number of values. After close, the file at `path` holds the
+    values, one per line.
+    """
+    def __init__(self, fields, pattern=None, buffer_size='20%'):
+        self.fields = fields
+        self.pattern = re.compile(pattern) if pattern else None
+        self.buffer_size = buffer_size
+        fd, self.path = tempfile.mkstemp(prefix='siskin-')
+        self.handle = os.fdopen(fd, 'wb')
+
+    def add(self, doc, line=None):
+        for field in self.fields:
+            value = doc.get(field)
+            if value is None:
+                continue
+            if not isinstance(value, list):
+                value = [value]
+            for v in value:
+                if v is None:
+                    continue
+                if not isinstance(v, six.string_types):
+                    v = six.text_type(v)
+                if self.pattern is not None:
+                    match = self.pattern.search(v)
+                    if not match:
+                        continue
+                    v = match.group()
+                if v:
+                    self.handle.write(v.encode('utf-8') + b'\n')
+
+    def close(self):
+        if self.handle.closed:
+            return
+        self.handle.close()
+        sort_unique(self.path, self.path, buffer_size=self.buffer_size)
+
+    def values(self):
+        """
+        Yield the distinct values in bytewise order.
+        """
+        with open(self.path, 'rb') as handle:
+            for line in handle:
+                yield line.rstrip(b'\n').decode('utf-8')
+
+
+def fanout(source, sinks):
+    """
+    Read line delimited JSON from source (filename, plain or gzip compressed,
+    or binary file object) and pass every document to every sink. Empty lines
+    are skipped. Returns the number of documents.
+    """
+    count = 0
+    try:
+        with open_source(source) as handle:
+            for line in handle:
+                if not line.strip():
+                    continue
+                doc = json.loads(line.decode('utf-8'))
+                for sink in sinks:
+                    sink.add(doc, line)
+                count += 1
+    finally:
+        for sink in sinks:
+            sink.close()
+    logger.debug('%d documents passed to %d sinks', count, len(sinks))
+    return count
@@ -0,0 +1,140 @@
+# coding: utf-8
+# pylint: disable=C0103,W0232,C0301,W0703
+
+# Copyright 2019 by Leipzig University Library, http://ub.uni-leipzig.de
+#                   The Finc Authors, http://finc.info
+#                   Martin Czygan, <martin.czygan@uni-leipzig.de>
+#
+# This file is part of some open source application.
+#
+# Some open source application is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+#
+# Some open source application is distributed in the hope that it will
+# be useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+#
+# @license GPL-3.0+ <http://spdx.org/licenses/GPL-3.0+>
+"""
+Write RDF incrementally, as Turtle or N-Triples, instead of building an
+rdflib graph and serializing it as a single string.
+
+Triples are written grouped by subject and predicate, so the caller should
+pass them in that order, e.g. after sorting; see `PairSet` for a way to
+deduplicate and sort many (subject, object) pairs on disk.
+
+    with open("out.ttl", "w") as handle:
+        writer = TripleWriter(handle, prefixes={"amsl": "http://amsl.technology/"})
+        writer.write("http://x.y/a", "http://amsl.technology/coveredMediumID", ["urn:ISSN:1234-5678"])
+        writer.close()
+
+IRIs are expected to be escaped (e.g. with urllib quote) already; they are
+written as given.
+"""
+
+import itertools
+import logging
+import os
+import tempfile
+
+import six
+
+from siskin.idset import SortedIdentifiers
+
+logger = logging.getLogger('siskin')
+
+
+class TripleWriter(object):
+    """
+    Write triples to a text file handle, with format turtle or nt.
+    """
+    def __init__(self, handle, format='turtle', prefixes=None):
+        if format not in ('turtle', 'nt'):
+            raise ValueError('unsupported format: %s' % format)
+        self.handle = handle
+        self.format = format
+        self.prefixes = sorted((prefixes or {}).items(), key=lambda kv: len(kv[1]), reverse=True)
+        self.count = 0
+        if format == 'turtle':
+            for name, namespace in sorted(self.prefixes):
+                self.handle.write(u'@prefix %s: <%s> .\n' % (name, namespace))
+            self.handle.write(u'\n')
+
+    def term(self, iri):
+        """
+        Abbreviate an IRI with a prefix (turtle only), if the rest is a simple
+        local name.
+        """
+        if self.format == 'turtle':
+            for name, namespace in self.prefixes:
+                if iri.startswith(namespace):
+                    local = iri[len(namespace):]
+                    if local and local.replace('_', '').isalnum() and not local[0].isdigit():
+                        return u'%s:%s' % (name, local)
+        return u'<%s>' % iri
+
+    def write(self, subject, predicate, objects):
+        """
+        Write triples for a subject, a predicate and a number of object IRIs.
+        """
+        objects = [self.term(o) for o in objects]
+        if not objects:
+            return
+        s, p = self.term(subject), self.term(predicate)
+        if self.format == 'nt':
+            for o in objects:
+                self.handle.write(u'%s %s %s .\n' % (s, p, o))
+        else:
+            self.handle.write(u'%s %s %s .\n\n' % (s, p, u',\n        '.join(objects)))
+        self.count += len(objects)
+
+    def close(self):
+        logger.debug('wrote %d triples', self.count)
+
+
+class PairSet(object):
+    """
+    Collect (subject, object) pairs in a temporary file, then iterate over
+    them grouped by subject, sorted and without duplicates (with `sort -u`,
+    so memory does not grow with the number of pairs). Strings must not
+    contain control characters, like tabs or newlines.
+
+        with PairSet() as pairs:
+            pairs.add(u"a", u"x")
+            for subject, objects in pairs.groups():
+                ...
+
+    """
+    def __init__(self):
+        fd, self.path = tempfile.mkstemp(prefix='siskin-pairs-')
+        self.handle = os.fdopen(fd, 'wb')
+
+    def add(self, subject, obj):
+        if isinstance(subject, six.text_type):
+            subject = subject.encode('utf-8')
+        if isinstance(obj, six.text_type):
+            obj = obj.encode('utf-8')
+        self.handle.write(subject + b'\t' + obj + b'\n')
+
+    def groups(self):
+        """
+        Yield (subject, list of objects) tuples, as text.
+        """
+        self.handle.close()
+        with SortedIdentifiers(self.path) as lines:
+            pairs = (line.decode('utf-8').split(u'\t', 1) for line in lines)
+            for subject, group in itertools.groupby(pairs, key=lambda pair: pair[0]):
+                yield subject, [obj for _, obj in group]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.handle.close()
+        os.remove(self.path)
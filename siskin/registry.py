@@ -0,0 +1,250 @@
+# coding: utf-8
+# pylint: disable=C0103,W0232,C0301,W0703
+
+# Copyright 2019 by Leipzig University Library, http://ub.uni-leipzig.de
+#                   The Finc Authors, http://finc.info
+#                   Martin Czygan, <martin.czygan@uni-leipzig.de>
+#
+# This file is part of some open source application.
+#
+# Some open source application is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+#
+# Some open source application is distributed in the hope that it will
+# be useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+#
+# @license GPL-3.0+ <http://spdx.org/licenses/GPL-3.0+>
+"""
+Static task registry for the command line tools.
+
+Importing all sources and workflows pulls in many heavy dependencies. Instead,
+we find tasks by parsing the source files for class definitions, without
+importing them. A class is a task, if one of its bases ends with "Task" or is
+a task itself. The result is cached in the temporary directory and rebuilt,
+whenever a source file is added, removed or changed.
+
+    from siskin.registry import import_task_module
+
+    import_task_module("CrossrefExport")  # Imports siskin.sources.crossref only.
+
+Docstring and TAG of each task are recorded as well, so tools listing all
+tasks do not need to import any task module:
+
+    tasks, _ = load_details()
+    tasks["CrossrefExport"]["tag"]  # "49"
+
+"""
+
+import ast
+import glob
+import importlib
+import io
+import json
+import logging
+import os
+import tempfile
+
+from siskin import __version__
+
+logger = logging.getLogger('siskin')
+
+# Packages, whose modules define tasks.
+PACKAGES = ('siskin.sources', 'siskin.workflows')
+
+# TAG of task base classes defined outside siskin.
+EXTERNAL_TAGS = {'BaseTask': 'default'}
+
+
+def source_files():
+    """
+    Return the paths of all modules, that may define tasks.
+    """
+    base = os.path.dirname(os.path.abspath(__file__))
+    files = [os.path.join(base, 'common.py'), os.path.join(base, 'task.py')]
+    for package in PACKAGES:
+        directory = os.path.join(base, *package.split('.')[1:])
+        files += sorted(f for f in glob.glob(os.path.join(directory, '*.py')) if not f.endswith('__init__.py'))
+    return files
+
+
+def module_name(path):
+    """
+    Turn a path below the siskin package into a module name.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    relpath = os.path.relpath(os.path.abspath(path), root)
+    return os.path.splitext(relpath)[0].replace(os.sep, '.')
+
+
+def scan_classes(files):
+    """
+    Find task classes in files, return a dictionary mapping task names to a
+    dictionary with module, docstring and TAG (inherited from base tasks, if
+    not set on the class itself). Like luigi, only names starting with an
+    uppercase letter are included.
+    """
+    classes, defined = {}, {}
+    for path in files:
+        with io.open(path, encoding='utf-8') as handle:
+            tree = ast.parse(handle.read(), path)
+        module = module_name(path)
+        imported = {}
+        for node in tree.body:
+            if isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                for alias in node.names:
+                    imported[alias.asname or alias.name] = (node.module, alias.name)
+        for node in tree.body:
+            if not isinstance(node, ast.ClassDef):
+                continue
+            tag = None
+            for stmt in node.body:
+                if (isinstance(stmt, ast.Assign) and isinstance(stmt.value, ast.Str)
+                        and any(isinstance(t, ast.Name) and t.id == 'TAG' for t in stmt.targets)):
+                    tag = stmt.value.s
+            names = [base_name(base) for base in node.bases]
+            defined[(module, node.name)] = {
+                'tag': tag,
+                'names': names,
+                'module': module,
+                'imported': imported,
+            }
+            if node.name in classes:
+                continue
+            classes[node.name] = {
+                'module': module,
+                'bases': names,
+                'doc': ast.get_docstring(node, clean=False),
+            }
+
+    tasks = {}
+    changed = True
+    while changed:
+        changed = False
+        for name, info in classes.items():
+            if name in tasks:
+                continue
+            if any(base.endswith('Task') or base in tasks for base in info['bases']):
+                tasks[name] = info
+                changed = True
+
+    def tag(key, seen=()):
+        """
+        Resolve TAG of class (module, name) along its bases, looking up base
+        names in the same module first, then in its imports.
+        """
+        info = defined.get(key)
+        if info is None or key in seen:
+            return EXTERNAL_TAGS.get(key[1])
+        if info['tag'] is not None:
+            return info['tag']
+        for name in info['names']:
+            if (info['module'], name) in defined:
+                base = (info['module'], name)
+            else:
+                base = info['imported'].get(name, (None, name))
+            value = tag(base, seen + (key, ))
+            if value is not None:
+                return value
+        return None
+
+    return dict((name, {
+        'module': info['module'],
+        'doc': info['doc'],
+        'tag': tag((info['module'], name))
+    }) for name, info in tasks.items() if name[0].isupper())
+
+
+def base_name(node):
+    """
+    Last component of a base class expression, e.g. ExternalTask for
+    luigi.ExternalTask.
+    """
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    if isinstance(node, ast.Name):
+        return node.id
+    return ''
+
+
+def scan(files):
+    """
+    Find task classes in files, return a dictionary mapping task names to
+    module names.
+    """
+    return dict((name, info['module']) for name, info in scan_classes(files).items())
+
+
+# Bump, when the layout of the cached registry changes.
+REGISTRY_FORMAT = 2
+
+
+def registry_path():
+    return os.path.join(tempfile.gettempdir(), 'siskin_task_registry_%s_%s' % (__version__, REGISTRY_FORMAT))
+
+
+def load_details(path=None):
+    """
+    Return a tuple of the task name to details (module, doc, tag) dictionary
+    and the path to the cache file. The cache is rebuilt, if it is stale.
+    """
+    path = path or registry_path()
+    files = source_files()
+    mtimes = dict((f, os.path.getmtime(f)) for f in files)
+
+    if os.path.exists(path):
+        try:
+            with open(path) as handle:
+                cached = json.load(handle)
+            if cached.get('mtimes') == mtimes:
+                return cached['tasks'], path
+        except (ValueError, KeyError, AttributeError) as err:
+            logger.debug('ignoring broken task registry at %s: %s', path, err)
+
+    logger.debug('building task registry at %s', path)
+    tasks = scan_classes(files)
+    fd, tmp = tempfile.mkstemp(prefix='siskin-', dir=os.path.dirname(path))
+    with os.fdopen(fd, 'w') as output:
+        json.dump({'mtimes': mtimes, 'tasks': tasks}, output)
+    os.rename(tmp, path)
+    return tasks, path
+
+
+def load_registry(path=None):
+    """
+    Return a tuple of the task name to module name dictionary and the path to
+    the cache file. The cache is rebuilt, if it is stale.
+    """
+    tasks, path = load_details(path=path)
+    return dict((name, info['module']) for name, info in tasks.items()), path
+
+
+def import_all():
+    """
+    Import all task modules, like a star import of sources and workflows.
+    """
+    for package in PACKAGES:
+        for name in importlib.import_module(package).__all__:
+            if name.startswith('__'):
+                continue
+            importlib.import_module('%s.%s' % (package, name))
+
+
+def import_task_module(name):
+    """
+    Import the module defining task `name`, so luigi can find it. If the
+    task is not in the registry, import everything. Returns the module name
+    or None.
+    """
+    tasks, _ = load_registry()
+    if name in tasks:
+        importlib.import_module(tasks[name])
+        return tasks[name]
+    import_all()
+    return None
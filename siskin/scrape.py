@@ -0,0 +1,146 @@
+# coding: utf-8
+# pylint: disable=C0103,W0232,C0301,W0703
+
+# Copyright 2019 by Leipzig University Library, http://ub.uni-leipzig.de
+#                   The Finc Authors, http://finc.info
+#                   Martin Czygan, <martin.czygan@uni-leipzig.de>
+#
+# This file is part of some open source application.
+#
+# Some open source application is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+#
+# Some open source application is distributed in the hope that it will
+# be useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+#
+# @license GPL-3.0+ <http://spdx.org/licenses/GPL-3.0+>
+"""
+Fetch and extract many web pages, e.g. catalog search results.
+
+Pages are fetched concurrently by a bounded number of workers, requests are
+rate limited per host and all bodies go through a URL cache, so a rerun only
+fetches what is missing. Extraction runs on the raw page, with a regular
+expression or an lxml XPath expression instead of a full soup parse.
+
+    scraper = Scraper(cache=SQLiteURLCache(), workers=8, rate=4)
+    title = XPath("string(//title)")
+    for url, result in scraper.scrape(urls, title):
+        print(url, result)
+
+Results are yielded in the order of the given URLs.
+"""
+
+import collections
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import six
+from six.moves.urllib.parse import urlparse
+
+from siskin.utils import RateLimiter, SQLiteURLCache
+
+logger = logging.getLogger('siskin')
+
+
+class XPath(object):
+    """
+    Evaluate an XPath expression on an HTML page. Element results are turned
+    into their text content, so the result is a list of strings (or a single
+    value, for expressions like string(...) or count(...)).
+    """
+    def __init__(self, expr):
+        import lxml.etree
+        import lxml.html
+
+        self.expr = expr
+        self.xpath = lxml.etree.XPath(expr)
+        self.parser = lxml.html.HTMLParser(encoding='utf-8')
+        self.fromstring = lxml.html.fromstring
+
+    def __call__(self, body):
+        if isinstance(body, six.text_type):
+            body = body.encode('utf-8')
+        if not body.strip():
+            return []
+        result = self.xpath(self.fromstring(body, parser=self.parser))
+        if not isinstance(result, list):
+            return result
+        return [r if isinstance(r, six.string_types) else r.text_content() for r in result]
+
+
+class Regex(object):
+    """
+    Return the given group of the first match of a pattern in a page, or None.
+    """
+    def __init__(self, pattern, group=0, flags=re.S):
+        self.pattern = re.compile(pattern, flags)
+        self.group = group
+
+    def __call__(self, body):
+        match = self.pattern.search(body)
+        return match.group(self.group) if match else None
+
+
+class Scraper(object):
+    """
+    Fetch pages with at most `workers` concurrent requests and at most `rate`
+    requests per second and host. Cached pages are not rate limited.
+    """
+    def __init__(self, cache=None, workers=4, rate=1.0):
+        self.cache = cache or SQLiteURLCache()
+        self.workers = workers
+        self.rate = rate
+        self.limiters = {}
+        self.lock = threading.Lock()
+
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(workers, 1), max_retries=3)
+        self.cache.sess.mount('http://', adapter)
+        self.cache.sess.mount('https://', adapter)
+
+    def limiter(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.limiters:
+                self.limiters[host] = RateLimiter(rate=self.rate)
+            return self.limiters[host]
+
+    def fetch(self, url):
+        """
+        Return the body of a page, from cache or the web.
+        """
+        if not self.cache.is_cached(url):
+            self.limiter(url).wait()
+            logger.debug('fetch %s', url)
+        return self.cache.get(url)
+
+    def scrape(self, urls, extract=None):
+        """
+        Fetch all urls and yield (url, extract(body)) tuples, in order. Without
+        an extract function, the body is returned. At most a few pages per
+        worker are kept in memory.
+        """
+        extract = extract or (lambda body: body)
+
+        def work(url):
+            return extract(self.fetch(url))
+
+        pending = collections.deque()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for url in urls:
+                pending.append((url, executor.submit(work, url)))
+                if len(pending) >= self.workers * 4:
+                    url, future = pending.popleft()
+                    yield url, future.result()
+            while pending:
+                url, future = pending.popleft()
+                yield url, future.result()
@@ -0,0 +1,250 @@
+# coding: utf-8
+# pylint: disable=C0103,W0232,C0301,W0703
+
+# Copyright 2019 by Leipzig University Library, http://ub.uni-leipzig.de
+#                   The Finc Authors, http://finc.info
+#                   Martin Czygan, <martin.czygan@uni-leipzig.de>
+#
+# This file is part of some open source application.
+#
+# Some open source application is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+#
+# Some open source application is distributed in the hope that it will
+# be useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+#
+# @license GPL-3.0+ <http://spdx.org/licenses/GPL-3.0+>
+"""
+Solr client for counting queries, shared by coverage reports and checkups.
+
+A single session with a connection pool is used for all requests, requests
+are retried with exponential backoff and run concurrently with a bounded
+number of workers.
+
+Counting many queries one by one is slow; where possible, many counts are
+fetched with a single request, as facets:
+
+    solr = SolrClient("http://localhost:8983/solr/biblio", workers=4)
+    solr.count("source_id:49")                       # 123456
+    solr.counts(["issn:2091-2145", "issn:1234-567X"])  # [1, 0], concurrently
+    solr.facet("source_id")                          # {"49": 123456, ...}
+    solr.facet_queries(["issn:2091-2145", ...], q="institution:DE-15")
+    solr.matching(["issn:2091-2145", ...], q="institution:DE-15")  # {"issn:2091-2145"}
+    solr.pivot(["source_id", "institution"])         # {("49", "DE-15"): 1234, ...}
+
+"""
+
+import collections
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from six.moves.urllib.parse import urlencode
+
+import backoff
+
+logger = logging.getLogger('siskin')
+
+
+def quote(value):
+    """
+    Quote a value as a phrase, e.g. for a title in a query.
+    """
+    return u'"%s"' % value.replace(u'\\', u'\\\\').replace(u'"', u'\\"')
+
+
+def solr_url(index, core='biblio'):
+    """
+    Base URL of a core, given a URL (of the core or its select handler) or just
+    host and port, like 10.1.1.1:8085.
+    """
+    if index.startswith('http://') or index.startswith('https://'):
+        url = index.rstrip('/')
+        if url.endswith('/select'):
+            url = url[:-len('/select')]
+        return url
+    return 'http://%s/solr/%s' % (index, core)
+
+
+class SolrError(RuntimeError):
+    """
+    Solr answered with an HTTP error status.
+    """
+    def __init__(self, message, status):
+        super(SolrError, self).__init__(message)
+        self.status = status
+
+
+def is_client_error(exc):
+    """
+    True for errors, that a retry will not fix, e.g. a query syntax error.
+    """
+    return isinstance(exc, SolrError) and 400 <= exc.status < 500
+
+
+class SolrClient(object):
+    """
+    Issue select requests against a single Solr core.
+    """
+    def __init__(self, url, workers=4, max_tries=5, timeout=60, max_url_length=4096):
+        """
+        At most `workers` requests are in flight at once. Requests with long
+        query strings are sent as POST.
+        """
+        self.url = solr_url(url)
+        self.workers = workers
+        self.max_tries = max_tries
+        self.timeout = timeout
+        self.max_url_length = max_url_length
+        self.sess = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(workers, 1))
+        self.sess.mount('http://', adapter)
+        self.sess.mount('https://', adapter)
+
+    def select(self, params):
+        """
+        Run a query, params is a dictionary or a list of (key, value) pairs (for
+        repeated keys). Returns the decoded JSON response. Raises SolrError on
+        HTTP errors; 4xx errors are not retried.
+        """
+        if isinstance(params, dict):
+            params = sorted(params.items())
+        params = list(params) + [('wt', 'json')]
+        link = '%s/select' % self.url
+
+        @backoff.on_exception(backoff.expo, (RuntimeError, ValueError, requests.exceptions.RequestException),
+                              max_tries=self.max_tries,
+                              giveup=is_client_error)
+        def fetch():
+            query = urlencode(params)
+            if len(query) > self.max_url_length:
+                r = self.sess.post(link, data=params, timeout=self.timeout)
+            else:
+                r = self.sess.get('%s?%s' % (link, query), timeout=self.timeout)
+            if r.status_code >= 400:
+                raise SolrError('%s on %s: %s' % (r.status_code, link, r.text[:200]), r.status_code)
+            return json.loads(r.text)
+
+        return fetch()
+
+    def map(self, func, items):
+        """
+        Apply func to all items with at most `workers` threads, return the
+        results in order.
+        """
+        items = list(items)
+        if self.workers <= 1 or len(items) <= 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(func, items))
+
+    def count(self, q, **params):
+        """
+        Number of documents matching a query.
+        """
+        params.update({'q': q, 'rows': 0})
+        return self.select(params)['response']['numFound']
+
+    def counts(self, queries, **params):
+        """
+        Number of documents for each query, one request per query, run
+        concurrently.
+        """
+        return self.map(lambda q: self.count(q, **params), queries)
+
+    def facet(self, field, q='*:*', mincount=1, limit=-1, **params):
+        """
+        Dictionary of facet value to count for a single field.
+        """
+        params.update({
+            'q': q,
+            'rows': 0,
+            'facet': 'true',
+            'facet.field': field,
+            'facet.mincount': mincount,
+            'facet.limit': limit,
+        })
+        values = self.select(params)['facet_counts']['facet_fields'][field]
+        return dict(zip(values[::2], values[1::2]))
+
+    def facet_queries(self, queries, q='*:*', batch_size=200, **params):
+        """
+        Number of documents matching q and each of the queries, as a
+        dictionary from query to count. Queries are sent as facet.query, in
+        batches of batch_size, batches are run concurrently.
+
+        If Solr rejects a batch (HTTP 4xx, e.g. a syntax error in one query),
+        the batch is split in halves until the failing queries are found.
+        These are logged and get a count of None. If q itself is rejected,
+        SolrError is raised.
+        """
+        queries = list(queries)
+        distinct = list(collections.OrderedDict.fromkeys(queries))
+        batches = [distinct[i:i + batch_size] for i in range(0, len(distinct), batch_size)]
+
+        def run(batch, top=True):
+            pairs = sorted(dict(params, q=q, rows=0, facet='true').items())
+            pairs.extend(('facet.query', query) for query in batch)
+            try:
+                return self.select(pairs)['facet_counts']['facet_queries']
+            except SolrError as exc:
+                if not is_client_error(exc):
+                    raise
+                if top:
+                    # Fails, if the error is not in the facet queries.
+                    self.count(q, **params)
+                if len(batch) == 1:
+                    logger.warning('solr rejected facet query %s: %s', batch[0], exc)
+                    return {batch[0]: None}
+                logger.debug('solr rejected batch of %d facet queries, splitting', len(batch))
+                result = run(batch[:len(batch) // 2], top=False)
+                result.update(run(batch[len(batch) // 2:], top=False))
+                return result
+
+        result = {}
+        for counts in self.map(run, batches):
+            result.update(counts)
+        return dict((query, result.get(query, 0)) for query in queries)
+
+    def matching(self, queries, q='*:*', **kwargs):
+        """
+        The set of queries, that match at least one document (together with
+        q), resolved in batches with facet_queries.
+        """
+        return set(query for query, count in self.facet_queries(queries, q=q, **kwargs).items() if count)
+
+    def pivot(self, fields, q='*:*', mincount=1, limit=-1, **params):
+        """
+        Counts for all combinations of values of a few fields, as a dictionary
+        from tuple of values to count, e.g. documents per source and
+        institution.
+        """
+        name = ','.join(fields)
+        params.update({
+            'q': q,
+            'rows': 0,
+            'facet': 'true',
+            'facet.pivot': name,
+            'facet.pivot.mincount': mincount,
+            'facet.limit': limit,
+        })
+        result = {}
+
+        def walk(entries, prefix):
+            for entry in entries:
+                key = prefix + (entry['value'], )
+                if len(key) == len(fields):
+                    result[key] = entry['count']
+                else:
+                    walk(entry.get('pivot', []), key)
+
+        walk(self.select(params)['facet_counts']['facet_pivot'].get(name, []), ())
+        return result
@@ -773,6 +773,10 @@ class AMSLFilterConfig(AMSLTask):
     holding or content files each with between 10 and 50000 entries referenced
     about 200 times in total: around 20k records/s.
 
+    The siskin.filterconfig module evaluates the generated configuration in
+    Python with branches indexed by source id and collection, see
+    contrib/bench_filterconfig.py for a comparison with the naive evaluation.
+
     Case table (Feb 2019), X/-/o, yes, no, maybe.
 
     SID COLL ISIL LTHF LTCF ELTCF PI TCID
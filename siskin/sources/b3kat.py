@@ -68,7 +68,6 @@ dtype: int64
 """
 
 import datetime
-import os
 import tempfile
 
 import luigi
@@ -76,6 +75,7 @@ from gluish.format import TSV, Gzip
 from gluish.intervals import semiyearly
 from gluish.parameter import ClosestDateParameter
 from gluish.utils import shellout
+from siskin.harvest import PartDownloader
 from siskin.task import DefaultTask
 
 
@@ -111,26 +111,27 @@ class B3KatDownload(B3KatTask):
     """
     Download snapshot. Output is a single (large) MARC binary file. Typically
     the downloads are provided in May and November.
+
+    Parts are downloaded and converted concurrently and kept until all parts
+    are done, so a failed run can be resumed.
     """
     date = ClosestDateParameter(default=datetime.date.today())
+    workers = luigi.IntParameter(default=4, significant=False, description='number of concurrent downloads')
 
     def requires(self):
         return B3KatLinks(date=self.date)
 
     def run(self):
-        _, stopover = tempfile.mkstemp(prefix='siskin-')
         with self.input().open() as handle:
-            for i, row in enumerate(handle.iter_tsv(cols=('url', )), start=1):
-                downloaded = shellout("""curl -sL --fail "{url}" > {output} """, url=row.url)
-                output = shellout("""yaz-marcdump -i marcxml -o marc "{input}" >> {stopover}""",
-                                  input=downloaded,
-                                  stopover=stopover)
-                try:
-                    os.remove(downloaded)
-                    os.remove(output)
-                except OSError as err:
-                    self.logger.error(err)
+            urls = [row.url for row in handle.iter_tsv(cols=('url', ))]
 
+        def convert(path, output):
+            shellout("""yaz-marcdump -i marcxml -o marc "{input}" > {output}""", input=path, output=output)
+
+        downloader = PartDownloader('%s.parts' % self.output().path, convert=convert, workers=self.workers)
+        _, stopover = tempfile.mkstemp(prefix='siskin-')
+        stats = downloader.run(urls, stopover)
+        self.logger.debug('downloaded and converted %s parts', stats['parts'])
         luigi.LocalTarget(stopover).move(self.output().path)
 
     def output(self):
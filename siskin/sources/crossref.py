@@ -50,17 +50,12 @@ import json
 import os
 import socket
 import tempfile
-import time
-import urllib.error
-import urllib.parse
-import urllib.request
 from builtins import range
 
 import requests
 from future import standard_library
 from six import string_types
 
-import elasticsearch
 import luigi
 from gluish.common import Executable
 from gluish.format import TSV, Gzip
@@ -69,10 +64,11 @@ from gluish.parameter import ClosestDateParameter
 from gluish.utils import date_range, shellout
 from siskin import __version__
 from siskin.benchmark import timed
+from siskin.harvest import CursorHarvester
 from siskin.mail import send_mail
 from siskin.sources.amsl import AMSLFilterConfig, AMSLService
 from siskin.task import DefaultTask
-from siskin.utils import URLCache, load_set_from_target
+from siskin.utils import load_set_from_target
 
 standard_library.install_aliases()
 
@@ -100,9 +96,6 @@ class CrossrefHarvestChunkWithCursor(CrossrefTask):
 
     rows = luigi.IntParameter(default=1000, significant=False)
     max_retries = luigi.IntParameter(default=10, significant=False, description='HTTP retries')
-    attempts = luigi.IntParameter(default=3,
-                                  significant=False,
-                                  description='number of attempts to GET an URL that failed')
     sleep = luigi.IntParameter(default=1, significant=False, description='sleep between requests')
 
     def run(self):
@@ -120,61 +113,18 @@ class CrossrefHarvestChunkWithCursor(CrossrefTask):
         queries that use HTTPS and have appropriate contact information will be
         directed to a special pool of API machines that are reserved for polite
         users. (https://git.io/vFyN5), refs #9059.
-        """
-        cache = URLCache(directory=os.path.join(tempfile.gettempdir(), '.urlcache'))
-        adapter = requests.adapters.HTTPAdapter(max_retries=self.max_retries)
-        cache.sess.mount('http://', adapter)
-
-        filter = "from-{self.filter}-date:{self.begin},until-{self.filter}-date:{self.end}".format(self=self)
-        rows, offset = self.rows, 0
-        cursor = '*'
-
-        with self.output().open('w') as output:
-            params = {'rows': rows, 'filter': filter}
 
-            while True:
-                params['cursor'] = cursor
-
-                # Do not fail, if user has not configured mailto, https://git.io/vFyN5.
-                if self.config.get('crossref', 'mailto', fallback=None):
-                    params['mailto'] = self.config.get('crossref', 'mailto')
-
-                url = 'https://api.crossref.org/works?%s' % (urllib.parse.urlencode(params))
-
-                for attempt in range(1, self.attempts):
-                    if not cache.is_cached(url):
-                        time.sleep(self.sleep)
-                    body = cache.get(url)
-                    try:
-                        content = json.loads(body)
-                    except ValueError as err:
-                        if attempt == self.attempts - 1:
-                            self.logger.debug('URL was %s', url)
-                            self.logger.debug(err)
-                            self.logger.debug(body[:100] + '...')
-                            raise
-
-                        cache_file = cache.get_cache_file(url)
-                        if os.path.exists(cache_file):
-                            self.logger.debug('trying to recover by removing cached entry at %s', cache_file)
-                            os.remove(cache_file)
-                    else:
-                        break
-
-                count = len(content['message']['items'])
-                self.logger.debug("%s: %s", url, count)
-                if count == 0:
-                    break
-
-                body = body + '\n'
-                if isinstance(body, string_types):
-                    body = body.encode('utf-8')
-                output.write(body)
-                offset += rows
-
-                if not 'next-cursor' in content['message']:
-                    raise RuntimeError('missing key: next-cursor')
-                cursor = content['message']['next-cursor']
+        Pages are fetched via siskin.harvest.CursorHarvester, which keeps a
+        cursor checkpoint next to the output, so a failed run resumes at the
+        last page instead of restarting the window.
+        """
+        harvester = CursorHarvester(rows=self.rows,
+                                    filter=self.filter,
+                                    mailto=self.config.get('crossref', 'mailto', fallback=None),
+                                    rate=1.0 / self.sleep if self.sleep > 0 else 0,
+                                    max_tries=self.max_retries)
+        stats = harvester.harvest_window(self.begin, self.end, self.output().path)
+        self.logger.debug("harvested %s pages, %s items", stats['pages'], stats['items'])
 
     def output(self):
         return luigi.LocalTarget(path=self.path(ext='ldj.gz'), format=Gzip)
@@ -199,6 +149,54 @@ class CrossrefHarvest(luigi.WrapperTask, CrossrefTask):
         return self.input()
 
 
+class CrossrefHarvestParallel(CrossrefTask):
+    """
+    Harvest all missing windows of CrossrefHarvest concurrently in a single
+    process, with a politeness limit shared by all workers. The chunks are
+    written to the outputs of CrossrefHarvestChunkWithCursor, so a following
+    CrossrefHarvest finds them complete. Rerun to resume after a failure.
+
+        $ taskdo CrossrefHarvestParallel --workers 8 --rate 4
+
+    Output is a list of the harvested chunk paths.
+    """
+    begin = luigi.DateParameter(default=datetime.date(2006, 1, 1))
+    end = luigi.DateParameter(default=datetime.date.today())
+    update = luigi.Parameter(default='months', description='days, weeks or months')
+    filter = luigi.Parameter(default='deposit', description='index, deposit, update')
+
+    rows = luigi.IntParameter(default=1000, significant=False)
+    max_retries = luigi.IntParameter(default=10, significant=False, description='HTTP retries')
+    workers = luigi.IntParameter(default=4, significant=False, description='number of concurrent windows')
+    rate = luigi.FloatParameter(default=1.0, significant=False, description='max requests per second, overall')
+
+    def run(self):
+        if self.update not in ('days', 'weeks', 'months'):
+            raise RuntimeError('update can only be: days, weeks or months')
+        dates = [dt for dt in date_range(self.begin, self.end, 1, self.update)]
+        tasks = [
+            CrossrefHarvestChunkWithCursor(begin=dates[i], end=dates[i + 1], filter=self.filter)
+            for i in range(len(dates) - 1)
+        ]
+        windows = [((task.begin, task.end), task.output().path) for task in tasks]
+
+        harvester = CursorHarvester(rows=self.rows,
+                                    filter=self.filter,
+                                    mailto=self.config.get('crossref', 'mailto', fallback=None),
+                                    rate=self.rate,
+                                    max_tries=self.max_retries)
+        stats = harvester.harvest_windows(windows, workers=self.workers)
+        self.logger.debug("harvested %s windows, %s pages, %s items", stats['windows'], stats['pages'],
+                          stats['items'])
+
+        with self.output().open('w') as output:
+            for _, path in windows:
+                output.write_tsv(path)
+
+    def output(self):
+        return luigi.LocalTarget(path=self.path(), format=TSV)
+
+
 class CrossrefChunkItems(CrossrefTask):
     """
     Extract the message items, per chunk.
@@ -659,7 +657,7 @@ class CrossrefPrefixMapping(CrossrefTask):
                 if not line:
                     continue
                 if '\t' not in line:
-                    self.logger.warn("invalid prefix list row: %s", line)
+                    self.logger.warning("invalid prefix list row: %s", line)
                     continue
                 prefix, name = line.split('\t', 1)
                 namemap[prefix.strip()] = name.strip()
@@ -675,7 +673,7 @@ class CrossrefPrefixMapping(CrossrefTask):
                 doc = json.loads(line.decode('utf-8').strip())
                 doi = doc.get("doi")
                 if not doi:
-                    self.logger.warn("document without doi: %s", line)
+                    self.logger.warning("document without doi: %s", line)
                     continue
                 prefix, _ = doi.split("/", 1)
 
@@ -755,7 +753,7 @@ class CrossrefDataPrefixList(CrossrefTask):
                 doc = json.loads(line)
                 doi = doc.get("doi")
                 if not doi:
-                    self.logger.warn("document without doi: %s", line)
+                    self.logger.warning("document without doi: %s", line)
                     continue
                 prefix, _ = doi.split("/", 1)
                 seen.add(prefix)
@@ -35,11 +35,9 @@ import itertools
 import json
 import operator
 import os
-import tempfile
 import time
 from builtins import map, range
 
-import elasticsearch
 import luigi
 from gluish.common import Executable
 from gluish.format import TSV, Gzip
@@ -47,6 +45,7 @@ from gluish.intervals import monthly
 from gluish.parameter import ClosestDateParameter
 from gluish.utils import shellout
 from siskin.benchmark import timed
+from siskin.pipeline import ValueSink, fanout
 from siskin.task import DefaultTask
 from siskin.utils import load_set_from_file, load_set_from_target
 
@@ -200,55 +199,54 @@ class DOAJIntermediateSchema(DOAJTask):
         return luigi.LocalTarget(path=self.path(ext='ldj.gz'))
 
 
-class DOAJISSNList(DOAJTask):
+class DOAJIdentifierLists(DOAJTask):
     """
-    A list of DOAJ ISSNs.
+    ISSN and DOI lists of DOAJ, from a single pass over the intermediate schema.
     """
     date = ClosestDateParameter(default=datetime.date.today())
 
     def requires(self):
-        return {
-            'input': DOAJIntermediateSchema(date=self.date),
-            'jq': Executable(name='jq', message='http://git.io/NYpfTw')
-        }
+        return DOAJIntermediateSchema(date=self.date)
 
     @timed
     def run(self):
-        _, stopover = tempfile.mkstemp(prefix='siskin-')
-        shellout("""jq -r '.["rft.issn"][]?' <(unpigz -c {input}) >> {output} """,
-                 input=self.input().get('input').path,
-                 output=stopover)
-        shellout("""jq -r '.["rft.eissn"][]?' <(unpigz -c {input}) >> {output} """,
-                 input=self.input().get('input').path,
-                 output=stopover)
-        output = shellout("""sort -u {input} > {output} """, input=stopover)
-        luigi.LocalTarget(output).move(self.output().path)
+        issns = ValueSink(fields=('rft.issn', 'rft.eissn'))
+        dois = ValueSink(fields=('doi', ), pattern='10.*')
+        fanout(self.input().path, [issns, dois])
+        luigi.LocalTarget(issns.path).move(self.output().get('issn').path)
+        luigi.LocalTarget(dois.path).move(self.output().get('doi').path)
 
     def output(self):
-        return luigi.LocalTarget(path=self.path(), format=TSV)
+        return {
+            'issn': luigi.LocalTarget(path=self.path(ext='issn.tsv'), format=TSV),
+            'doi': luigi.LocalTarget(path=self.path(ext='doi.tsv'), format=TSV),
+        }
 
 
-class DOAJDOIList(DOAJTask):
+class DOAJISSNList(DOAJTask, luigi.WrapperTask):
     """
-    An best-effort list of DOAJ DOIs.
+    A list of DOAJ ISSNs.
     """
     date = ClosestDateParameter(default=datetime.date.today())
 
     def requires(self):
-        return {
-            'input': DOAJIntermediateSchema(date=self.date),
-            'jq': Executable(name='jq', message='http://git.io/NYpfTw'),
-        }
+        return DOAJIdentifierLists(date=self.date)
 
-    @timed
-    def run(self):
-        output = shellout(
-            """jq -r '.doi' <(unpigz -c {input}) | grep -v "null" | grep -o "10.*" 2> /dev/null | sort -u > {output} """,
-            input=self.input().get('input').path)
-        luigi.LocalTarget(output).move(self.output().path)
+    def output(self):
+        return self.input().get('issn')
+
+
+class DOAJDOIList(DOAJTask, luigi.WrapperTask):
+    """
+    An best-effort list of DOAJ DOIs.
+    """
+    date = ClosestDateParameter(default=datetime.date.today())
+
+    def requires(self):
+        return DOAJIdentifierLists(date=self.date)
 
     def output(self):
-        return luigi.LocalTarget(path=self.path(), format=TSV)
+        return self.input().get('doi')
 
 
 class DOAJDownloadDump(DOAJTask):
@@ -80,6 +80,7 @@ The 201805 shipment contains the following tags:
 """
 
 import datetime
+import hashlib
 import os
 import re
 import tempfile
@@ -91,9 +92,39 @@ from gluish.intervals import monthly
 from gluish.parameter import ClosestDateParameter
 from gluish.utils import shellout
 from siskin.common import Executable
+from siskin.pipeline import ValueSink, fanout
 from siskin.sources.amsl import AMSLFilterConfig
 from siskin.task import DefaultTask
-from siskin.utils import iterfiles
+from siskin.utils import FileScanCache, iterfiles
+
+reload_pattern = re.compile('.*konsortium_sachsen_('
+                            'literaturnachweise_psychologie|'
+                            'literaturnachweise_recht|'
+                            'literaturnachweise_sozialwissenschaften|'
+                            'literaturnachweise_technik|'
+                            'literaturnachweise_wirtschaftswissenschaften|'
+                            'fachzeitschriften|ebooks)_'
+                            '([A-Z]*)_reload_(20[0-9][0-9])([01][0-9]).*')
+
+# Version of cached scan results, bump the number, if scan_reload_file changes.
+reload_scan_version = '1-%s' % hashlib.sha1(reload_pattern.pattern.encode('utf-8')).hexdigest()
+
+
+def scan_reload_file(path):
+    """
+    Check, whether path is a complete zip file and parse kind, database, year
+    and month from the path. Returns a dictionary with error (or None) and
+    groups (or None, if path does not look like a reload file).
+    """
+    size = os.path.getsize(path)
+    if size < 22:
+        return {'error': 'too small (%s)' % size, 'groups': None}
+    try:
+        zipfile.ZipFile(path).close()
+    except zipfile.BadZipfile as err:
+        return {'error': str(err), 'groups': None}
+    match = reload_pattern.match(path)
+    return {'error': None, 'groups': list(match.groups()) if match else None}
 
 
 class GeniosTask(DefaultTask):
@@ -230,57 +261,49 @@ class GeniosReloadDates(GeniosTask):
     """
     date = luigi.DateParameter(default=datetime.date.today())
     strict = luigi.BoolParameter(default=False, description='fail, if we spot bad files')
+    workers = luigi.IntParameter(default=8, significant=False, description='number of threads for validation')
 
     def requires(self):
         return GeniosDropbox(date=self.date)
 
     def run(self):
         """
-        Reload files are marked with date (years + month).
+        Reload files are marked with date (years + month). Reload files do not
+        change after delivery, so the validation and the parsed path are cached
+        by path, size and modification time; only new files are opened. A
+        changed reload_pattern invalidates the cache.
         """
-        pattern = re.compile('.*konsortium_sachsen_('
-                             'literaturnachweise_psychologie|'
-                             'literaturnachweise_recht|'
-                             'literaturnachweise_sozialwissenschaften|'
-                             'literaturnachweise_technik|'
-                             'literaturnachweise_wirtschaftswissenschaften|'
-                             'fachzeitschriften|ebooks)_'
-                             '([A-Z]*)_reload_(20[0-9][0-9])([01][0-9]).*')
+        with self.input().open() as handle:
+            paths = [row.path for row in handle.iter_tsv(cols=('path', ))]
 
-        rows = []
+        cache = FileScanCache(os.path.join(self.taskdir(), 'scancache.db'),
+                              func=scan_reload_file,
+                              version=reload_scan_version)
+        scans = cache.scan(paths, workers=self.workers)
+        cache.close()
+        self.logger.debug("%d files cached, %d scanned", cache.stats['cached'], cache.stats['scanned'])
 
-        with self.input().open() as handle:
-            for row in handle.iter_tsv(cols=('path', )):
-                # If the file is too small to be zipfile, skip.
-                stinfo = os.stat(row.path)
-                if stinfo.st_size < 22:
-                    self.logger.warning("skipping file, too small (%s): %s", stinfo.st_size, row.path)
-                    if self.strict:
-                        raise RuntimeError('too small: %s' % row.path)
-                    continue
+        rows = []
 
-                # Partial Zip? Skip.
-                try:
-                    zipfile.ZipFile(row.path)
-                except zipfile.BadZipfile as err:
-                    self.logger.debug("%s: %s", err, row.path)
-                    if self.strict:
-                        raise err
-                    continue
+        for path, scan in zip(paths, scans):
+            if scan['error']:
+                self.logger.warning("skipping %s: %s", path, scan['error'])
+                if self.strict:
+                    raise RuntimeError('%s: %s' % (scan['error'], path))
+                continue
 
-                match = pattern.match(row.path)
-                if not match:
-                    continue
+            if scan['groups'] is None:
+                continue
 
-                cols = list(match.groups()) + [row.path]
-                # cols contains the [kind, database name, year, month, filename]
-                # ['ebooks', 'DFVE', '2016', '09', '.../siskin-data/genios/...reload_201609.zip']
+            cols = scan['groups'] + [path]
+            # cols contains the [kind, database name, year, month, filename]
+            # ['ebooks', 'DFVE', '2016', '09', '.../siskin-data/genios/...reload_201609.zip']
 
-                if cols[1] in self.database_blacklist:
-                    self.logger.debug("excluding blacklisted %s from further processing", cols[1])
-                    continue
+            if cols[1] in self.database_blacklist:
+                self.logger.debug("excluding blacklisted %s from further processing", cols[1])
+                continue
 
-                rows.append(cols)
+            rows.append(cols)
 
         with self.output().open('w') as output:
             for row in sorted(rows):
@@ -478,49 +501,50 @@ class GeniosCombinedExport(GeniosTask):
         return luigi.LocalTarget(path=self.path(ext=extensions.get(self.format, 'gz')))
 
 
-class GeniosISSNList(GeniosTask):
+class GeniosIdentifierLists(GeniosTask):
     """
-    A list of Genios ISSNs.
+    ISSN and DOI lists of Genios, from a single pass over the intermediate schema.
     """
     date = ClosestDateParameter(default=datetime.date.today())
 
     def requires(self):
+        return GeniosCombinedIntermediateSchema(date=self.date)
+
+    def run(self):
+        issns = ValueSink(fields=('rft.issn', 'rft.eissn'))
+        dois = ValueSink(fields=('doi', ))
+        fanout(self.input().path, [issns, dois])
+        luigi.LocalTarget(issns.path).move(self.output().get('issn').path)
+        luigi.LocalTarget(dois.path).move(self.output().get('doi').path)
+
+    def output(self):
         return {
-            'input': GeniosCombinedIntermediateSchema(date=self.date),
-            'jq': Executable(name='jq', message='https://github.com/stedolan/jq')
+            'issn': luigi.LocalTarget(path=self.path(ext='issn.tsv'), format=TSV),
+            'doi': luigi.LocalTarget(path=self.path(ext='doi.tsv'), format=TSV),
         }
 
-    def run(self):
-        _, output = tempfile.mkstemp(prefix='siskin-')
-        shellout("""jq -c -r '.["rft.issn"][]?' <(unpigz -c {input}) >> {output} """,
-                 input=self.input().get('input').path,
-                 output=output)
-        shellout("""jq -c -r '.["rft.eissn"][]?' <(unpigz -c {input}) >> {output} """,
-                 input=self.input().get('input').path,
-                 output=output)
-        output = shellout("""LC_ALL=C sort -S35% -u {input} > {output} """, input=output)
-        luigi.LocalTarget(output).move(self.output().path)
+
+class GeniosISSNList(GeniosTask, luigi.WrapperTask):
+    """
+    A list of Genios ISSNs.
+    """
+    date = ClosestDateParameter(default=datetime.date.today())
+
+    def requires(self):
+        return GeniosIdentifierLists(date=self.date)
 
     def output(self):
-        return luigi.LocalTarget(path=self.path(), format=TSV)
+        return self.input().get('issn')
 
 
-class GeniosDOIList(GeniosTask):
+class GeniosDOIList(GeniosTask, luigi.WrapperTask):
     """
     A list of Genios DOI.
     """
     date = ClosestDateParameter(default=datetime.date.today())
 
     def requires(self):
-        return {
-            'input': GeniosCombinedIntermediateSchema(date=self.date),
-            'jq': Executable(name='jq', message='https://github.com/stedolan/jq')
-        }
-
-    def run(self):
-        output = shellout("""jq -c -r '.["doi"]' <(unpigz -c {input}) | sort -S35% -u >> {output} """,
-                          input=self.input().get('input').path)
-        luigi.LocalTarget(output).move(self.output().path)
+        return GeniosIdentifierLists(date=self.date)
 
     def output(self):
-        return luigi.LocalTarget(path=self.path(), format=TSV)
+        return self.input().get('doi')
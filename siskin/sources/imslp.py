@@ -37,8 +37,6 @@ legacy-mapping = /path/to/json.file
 import datetime
 import json
 import os
-import shutil
-import tempfile
 
 import luigi
 from gluish.parameter import ClosestDateParameter
@@ -138,6 +136,7 @@ class IMSLPConvertNext(IMSLPTask):
     WIP, refs #12288, refs #13055. May merge with 15_marcbinary.py.
     """
     date = ClosestDateParameter(default=datetime.date.today())
+    processes = luigi.IntParameter(default=1, significant=False, description='worker processes, 0 for one per core')
 
     def requires(self):
         return {
@@ -152,7 +151,9 @@ class IMSLPConvertNext(IMSLPTask):
         with self.input().get("legacy-mapping").open() as handle:
             mapping = json.load(handle)
 
-        output = imslp_tarball_to_marc(self.input().get("data").path, legacy_mapping=mapping)
+        output = imslp_tarball_to_marc(self.input().get("data").path,
+                                       legacy_mapping=mapping,
+                                       processes=self.processes)
         luigi.LocalTarget(output).move(self.output().path)
 
     def output(self):
@@ -163,28 +164,24 @@ class IMSLPConvertNext(IMSLPTask):
 
 class IMSLPConvert(IMSLPTask):
     """
-    Extract and transform.
+    Extract and transform. The tarball is read as a stream, without extracting
+    it to a temporary directory.
 
     TODO, refs #13055 -- see IMSLPDownloadNext and IMSLPConvertNext and IMSLPLegacyMapping.
     """
 
     date = ClosestDateParameter(default=datetime.date.today())
-    debug = luigi.BoolParameter(description='do not delete temporary folder', significant=False)
+    processes = luigi.IntParameter(default=1, significant=False, description='worker processes, 0 for one per core')
 
     def requires(self):
         return IMSLPDownload(date=self.date)
 
     def run(self):
-        tempdir = tempfile.mkdtemp(prefix='siskin-')
-        shellout("tar -xzf {archive} -C {tempdir}", archive=self.input().path, tempdir=tempdir)
-        output = shellout("python {script} {tempdir} {output} {fieldmap}",
+        output = shellout("python {script} {archive} {output} {fieldmap} {processes}",
                           script=self.assets('15/15_marcbinary.py'),
-                          tempdir=tempdir,
-                          fieldmap=self.assets('15/15_fieldmap.json'))
-        if not self.debug:
-            shutil.rmtree(tempdir)
-        else:
-            self.logger.debug("not deleting temporary folder at %s", tempdir)
+                          archive=self.input().path,
+                          fieldmap=self.assets('15/15_fieldmap.json'),
+                          processes=self.processes)
         luigi.LocalTarget(output).move(self.output().path)
 
     def output(self):
@@ -48,6 +48,8 @@ from gluish.parameter import ClosestDateParameter
 from gluish.utils import shellout
 from siskin.benchmark import timed
 from siskin.common import Executable, FTPMirror
+from siskin.memberindex import MemberIndex
+from siskin.pipeline import ValueSink, fanout
 from siskin.sources.amsl import AMSLFilterConfig, AMSLService
 from siskin.task import DefaultTask
 from siskin.utils import SetEncoder, load_set_from_file, nwise
@@ -86,8 +88,8 @@ class JstorPaths(JstorTask):
 
 class JstorMembers(JstorTask):
     """
-    Extract a full list of archive members.
-    TODO: This should only be done once per file.
+    Extract a full list of archive members. JstorLatestMembers keeps its own
+    incremental index and does not need this list anymore.
     """
     date = ClosestDateParameter(default=datetime.date.today())
 
@@ -201,32 +203,43 @@ class JstorLatestMembers(JstorTask):
     XXX: Adjust snapshotting accordingly.
 
     Issue, refs #12669.
+
+    The latest archive for each member is kept in a persistent index (see
+    siskin.memberindex) in the task directory, which orders shipments by the
+    timestamp in the path. Only zip files not seen in a previous run are
+    listed, so a weekly run costs time proportional to the new shipments.
+    There is one index per version, only holding the members of that set.
     """
 
     date = ClosestDateParameter(default=datetime.date.today())
     version = luigi.IntParameter(default=2, description="#12669")
 
     def requires(self):
-        return JstorMembers(date=self.date)
+        return JstorPaths(date=self.date)
 
     @timed
     def run(self):
-        """
-        Expect input to be sorted by shipment date, so tac will actually be a perfect rewind.
-        """
         if self.version not in (1, 2):
             raise ValueError("supported versions: 1, 2 (refs #12669)")
 
-        if self.version == 1:
-            output = shellout(
-                "tac {input} | grep -v metadata | LC_ALL=C sort -S 35% -u -k2,2 | LC_ALL=C sort -S 35% -k1,1 > {output}",
-                input=self.input().path)
-        if self.version == 2:
-            output = shellout(
-                "tac {input} | grep metadata | LC_ALL=C sort -S 35% -u -k2,2 | LC_ALL=C sort -S 35% -k1,1 > {output}",
-                input=self.input().path)
+        with self.input().open() as handle:
+            paths = [row.path for row in handle.iter_tsv(cols=('path', )) if row.path.endswith('.zip')]
 
-        luigi.LocalTarget(output).move(self.output().path)
+        def in_version(archive, member):
+            """
+            Restrict the index to one set, so the latest entry is picked within that set.
+            """
+            is_metadata = 'metadata' in archive or 'metadata' in member
+            return is_metadata == (self.version == 2)
+
+        index = MemberIndex(os.path.join(self.taskdir(), 'members-%d.db' % self.version), predicate=in_version)
+        stats = index.update(paths)
+        self.logger.debug("indexed %d new archives, %d members updated", stats['archives'], stats['members'])
+
+        with self.output().open('w') as output:
+            for archive, member in index.latest():
+                output.write_tsv(archive, member)
+        index.close()
 
     def output(self):
         return luigi.LocalTarget(path=self.path(), format=TSV)
@@ -570,9 +583,9 @@ class JstorExport(JstorTask):
         return luigi.LocalTarget(path=self.path(ext=extensions.get(self.format, 'gz')))
 
 
-class JstorISSNList(JstorTask):
+class JstorIdentifierLists(JstorTask):
     """
-    A list of JSTOR ISSNs.
+    ISSN and DOI lists of JSTOR, from a single pass over the intermediate schema.
     """
     date = ClosestDateParameter(default=datetime.date.today())
 
@@ -581,34 +594,40 @@ class JstorISSNList(JstorTask):
 
     @timed
     def run(self):
-        _, stopover = tempfile.mkstemp(prefix='siskin-')
-        shellout("""jq -r '.["rft.issn"][]?' <(unpigz -c {input}) 2> /dev/null >> {output} """,
-                 input=self.input().path,
-                 output=stopover)
-        shellout("""jq -r '.["rft.eissn"][]?' <(unpigz -c {input}) 2> /dev/null >> {output} """,
-                 input=self.input().path,
-                 output=stopover)
-        output = shellout("""sort -u {input} > {output} """, input=stopover)
-        luigi.LocalTarget(output).move(self.output().path)
+        issns = ValueSink(fields=('rft.issn', 'rft.eissn'))
+        dois = ValueSink(fields=('doi', ))
+        fanout(self.input().path, [issns, dois])
+        luigi.LocalTarget(issns.path).move(self.output().get('issn').path)
+        luigi.LocalTarget(dois.path).move(self.output().get('doi').path)
 
     def output(self):
-        return luigi.LocalTarget(path=self.path(), format=TSV)
+        return {
+            'issn': luigi.LocalTarget(path=self.path(ext='issn.tsv'), format=TSV),
+            'doi': luigi.LocalTarget(path=self.path(ext='doi.tsv'), format=TSV),
+        }
 
 
-class JstorDOIList(JstorTask):
+class JstorISSNList(JstorTask, luigi.WrapperTask):
     """
-    A list of JSTOR DOIs.
+    A list of JSTOR ISSNs.
     """
     date = ClosestDateParameter(default=datetime.date.today())
 
     def requires(self):
-        return JstorIntermediateSchema(date=self.date)
+        return JstorIdentifierLists(date=self.date)
 
-    @timed
-    def run(self):
-        output = shellout("""jq -r '.doi' <(unpigz -c {input}) | grep -v null > {output} """, input=self.input().path)
-        output = shellout("""sort -u {input} > {output} """, input=output)
-        luigi.LocalTarget(output).move(self.output().path)
+    def output(self):
+        return self.input().get('issn')
+
+
+class JstorDOIList(JstorTask, luigi.WrapperTask):
+    """
+    A list of JSTOR DOIs.
+    """
+    date = ClosestDateParameter(default=datetime.date.today())
+
+    def requires(self):
+        return JstorIdentifierLists(date=self.date)
 
     def output(self):
-        return luigi.LocalTarget(path=self.path(), format=TSV)
+        return self.input().get('doi')
@@ -100,10 +100,10 @@ class KHMMARC(KHMTask):
         return KHMDropbox(date=self.date)
 
     def run(self):
-        output = shellout("""sed -e 's/'$(echo "\o001")'/ /g' < {input} > {output}""",
+        # The script replaces control characters (e.g. \001) in the dump while reading.
+        output = shellout("python {script} {input} {output}",
+                          script=self.assets("109/109_marcbinary.py"),
                           input=self.config.get('khm', 'dump'))
-        # TODO(miku): maybe check, if cleanup is still required.
-        output = shellout("python {script} {input} {output}", script=self.assets("109/109_marcbinary.py"), input=output)
         luigi.LocalTarget(output).move(self.output().path)
 
     def output(self):
@@ -29,12 +29,12 @@ Tickets: 15833, 15694
 """
 
 import datetime
+import tempfile
 
 import luigi
-from gluish.common import Executable
 from gluish.intervals import weekly
 from gluish.parameter import ClosestDateParameter
-from gluish.utils import shellout
+from siskin.harvest import SRUHarvester
 from siskin.task import DefaultTask
 
 
@@ -50,12 +50,12 @@ class KXPTask(DefaultTask):
 
 class KXPSRU(KXPTask):
     """
-    Fetch selection via SRU.
+    Fetch selection via SRU. The clauses of the selection are fetched
+    concurrently and converted to MARC on the fly; records are deduplicated
+    by PPN. Rerun to resume a failed harvest.
     """
     date = ClosestDateParameter(default=datetime.date.today())
-
-    def requires(self):
-        return Executable(name='srufetch', message='https://github.com/miku/srufetch')
+    workers = luigi.IntParameter(default=4, significant=False, description='number of concurrent queries')
 
     def run(self):
         # XXX: Move this to config, then gitlab.
@@ -88,9 +88,12 @@ class KXPSRU(KXPTask):
             pica.rvk="LT 5581*" or pica.rvk="LT 5582*" or pica.rvk="LT 5586*"
             or pica.rvk="LT 57240" or pica.sbn="vd17" or pica.sbn="vd18"
         """
-        output = shellout("""srufetch -x -q '{selector}' > {output} """, selector=selector)
-        output = shellout("""yaz-marcdump -i marcxml -o marc {input} > {output}""", input=output)
-        luigi.LocalTarget(output).move(self.output().path)
+        harvester = SRUHarvester(url='https://sru.k10plus.de/opac-de-627', workers=self.workers)
+        _, stopover = tempfile.mkstemp(prefix='siskin-')
+        stats = harvester.run(selector, '%s.parts' % self.output().path, stopover)
+        self.logger.debug('%s records from %s queries, %s duplicates', stats['written'], stats['queries'],
+                          stats['duplicates'])
+        luigi.LocalTarget(stopover).move(self.output().path)
 
     def output(self):
         return luigi.LocalTarget(path=self.path(ext="mrc"))
@@ -34,7 +34,6 @@ oai = https://example.com/oai/provider
 """
 
 import datetime
-import tempfile
 
 import luigi
 from gluish.common import Executable
@@ -43,6 +42,7 @@ from gluish.intervals import weekly
 from gluish.parameter import ClosestDateParameter
 from gluish.utils import shellout
 from siskin.decorator import deprecated
+from siskin.pipeline import ValueSink, fanout
 from siskin.sources.amsl import AMSLFilterConfig
 from siskin.task import DefaultTask
 
@@ -140,21 +140,12 @@ class ThiemeISSNList(ThiemeTask):
     date = luigi.DateParameter(default=datetime.date.today())
 
     def requires(self):
-        return {
-            'input': ThiemeIntermediateSchema(date=self.date),
-            'jq': Executable(name='jq', message='https://github.com/stedolan/jq')
-        }
+        return ThiemeIntermediateSchema(date=self.date)
 
     def run(self):
-        _, output = tempfile.mkstemp(prefix='siskin-')
-        shellout("""jq -c -r '.["rft.issn"][]?' <(unpigz -c {input}) >> {output} """,
-                 input=self.input().get('input').path,
-                 output=output)
-        shellout("""jq -c -r '.["rft.eissn"][]?' <(unpigz -c {input}) >> {output} """,
-                 input=self.input().get('input').path,
-                 output=output)
-        output = shellout("""sort -u {input} > {output} """, input=output)
-        luigi.LocalTarget(output).move(self.output().path)
+        issns = ValueSink(fields=('rft.issn', 'rft.eissn'))
+        fanout(self.input().path, [issns])
+        luigi.LocalTarget(issns.path).move(self.output().path)
 
     def output(self):
         return luigi.LocalTarget(path=self.path(), format=TSV)
@@ -77,43 +77,33 @@ class VDEHXML(VDEHTask):
         return luigi.LocalTarget(path=self.path(ext="xml"))
 
 
-class VDEHRemoveIllegalChars(VDEHTask):
+class VDEHRemoveIllegalChars(VDEHTask, luigi.WrapperTask):
     """
     Remove Nichtsortierzeichen.
 
-    https://stackoverflow.com/a/7774512, https://stackoverflow.com/a/36371662
-
     We want to remove unicode codepoint U+00AC (c2ac, o302 o254), aka the
-    "NOT SIGN", aka the "Nichtsortierzeichen".
-
-    When removing only o254, the dangling o302 causes problems (invalid
-    continuation byte) - but not always.
-
-    tr -d '[:cntrl:]' would not remove it, since c2ac starts with 0302,
-    which is used for control chars as well (https://is.gd/GRIjmy).
-
-    s/\u00AC\u00C2//g would not work for some reason.
-
-    Anecdata: The stripped file is 57740 bytes smaller.
+    "NOT SIGN", aka the "Nichtsortierzeichen". The 130 script strips it while
+    reading the records (MabXMLStream with replace), so no sanitized copy of
+    the MABxml is written any more. Kept as an alias for VDEHXML.
     """
     def requires(self):
         return VDEHXML()
 
-    def run(self):
-        output = shellout(r" sed -e $(echo -e 's/\o302\o254//g') < {input} > {output} ", input=self.input().path)
-        luigi.LocalTarget(output).move(self.output().path)
-
     def output(self):
-        return luigi.LocalTarget(path=self.path(ext='xml'))
+        return self.input()
 
 
 class VDEHMARC(VDEHTask):
-    """ Convert MABxml to BinaryMarc """
+    """
+    Convert MABxml to BinaryMarc. Records held by DE-105 in SWB are skipped;
+    all ISBN and ISSN/title pairs are checked against the index up front, in
+    a few batched requests.
+    """
 
     date = ClosestDateParameter(default=datetime.date.today())
 
     def requires(self):
-        return VDEHRemoveIllegalChars()
+        return VDEHXML()
 
     def run(self):
         output = shellout("""python {script} {input} {output} {server}""",
@@ -0,0 +1,471 @@
+# coding: utf-8
+# pylint: disable=C0103,W0232,C0301,W0703
+
+# Copyright 2019 by Leipzig University Library, http://ub.uni-leipzig.de
+#                   The Finc Authors, http://finc.info
+#                   Martin Czygan, <martin.czygan@uni-leipzig.de>
+#
+# This file is part of some open source application.
+#
+# Some open source application is free software: you can redistribute
+# it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, either
+# version 3 of the License, or (at your option) any later version.
+#
+# Some open source application is distributed in the hope that it will
+# be useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+#
+# @license GPL-3.0+ <http://spdx.org/licenses/GPL-3.0+>
+"""
+Streaming record conversion for the asset scripts.
+
+Readers yield one record at a time from XML, line delimited JSON, MARC or
+plain delimited text (plain or gzip compressed), so memory does not grow
+with the input file. A mapping function turns a single record into a MARC
+record (or None to skip it); `convert` writes the results through a
+buffered writer and keeps counts.
+
+    from siskin.stream import convert_file, xml_records
+
+    def mapping(record):
+        marcrecord = marcx.Record(force_utf8=True)
+        ...
+        return marcrecord
+
+    stats = convert_file("input.xml", "output.mrc", mapping, reader=xml_records, tag="record")
+
+A mapping signals a record that cannot be converted with a ValueError; these
+are counted as failed and only fatal beyond `max_failures`.
+
+To use more cores, `parallel_convert` runs the mapping in a process pool. It
+sends batches of records to the workers and writes results in input order.
+Records should be bytes or strings, e.g. from xml_records(..., parse=None),
+and the mapping must be a module level function, so both can be pickled.
+
+    stats = parallel_convert(xml_records("input.xml", parse=None), mapping, "output.mrc", processes=8)
+
+Sources with duplicates, that need to be merged before the conversion, can
+pass their records through `MergeDuplicates`, which keeps them on disk.
+
+"""
+
+import codecs
+import collections
+import contextlib
+import gzip
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import sqlite3
+import tarfile
+import time
+
+import six
+import xmltodict
+
+import pymarc
+from siskin.utils import nwise, xmlstream
+
+logger = logging.getLogger('siskin')
+
+
+@contextlib.contextmanager
+def open_source(source):
+    """
+    Open a filename (plain or gzip compressed) in binary mode. Filelike
+    objects are passed through and left open.
+    """
+    if not isinstance(source, six.string_types):
+        yield source
+        return
+    with open(source, 'rb') as handle:
+        magic = handle.read(2)
+    if magic == b'\x1f\x8b':
+        handle = gzip.open(source, 'rb')
+    else:
+        handle = io.open(source, 'rb')
+    try:
+        yield handle
+    finally:
+        handle.close()
+
+
+def xml_control_chars(replacement=b' '):
+    """
+    Replacements for the control characters, that are not allowed in XML 1.0
+    (all below 0x20, except tab, newline and carriage return).
+    """
+    return [(six.int2byte(i), replacement) for i in range(0x20) if i not in (0x09, 0x0a, 0x0d)]
+
+
+class SanitizingReader(object):
+    """
+    Filelike wrapper, that replaces byte sequences while reading, so a file
+    can be cleaned up on the fly instead of rewriting it first, e.g. with sed.
+    Sequences, that span chunks, are replaced, too.
+
+        with open_source("dump.xml") as handle:
+            for snippet in xmlstream(SanitizingReader(handle, xml_control_chars()), "record"):
+                ...
+
+    Single byte replacements by a single byte are applied in one pass.
+    """
+    def __init__(self, handle, replace=None, size=1 << 16):
+        self.handle = handle
+        self.size = size
+        self.buffer = b''
+        self.carry = b''
+        self.table = None
+        self.replace = []
+        table = bytearray(range(256))
+        for value, replacement in replace or ():
+            if len(value) == 1 and len(replacement) == 1:
+                table[ord(value)] = ord(replacement)
+                self.table = bytes(table)
+            else:
+                self.replace.append((value, replacement))
+        # Longest prefix of a multibyte sequence, that may end a chunk.
+        self.overlap = max([len(value) - 1 for value, _ in self.replace] or [0])
+
+    def clean(self, data):
+        for value, replacement in self.replace:
+            data = data.replace(value, replacement)
+        if self.table is not None:
+            data = data.translate(self.table)
+        return data
+
+    def partial(self, data):
+        """
+        Length of the longest suffix of data, that starts a multibyte sequence.
+        """
+        for n in range(min(self.overlap, len(data)), 0, -1):
+            if any(value.startswith(data[-n:]) for value, _ in self.replace):
+                return n
+        return 0
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            chunk = self.handle.read(self.size)
+            if not chunk:
+                self.buffer += self.clean(self.carry)
+                self.carry = b''
+                break
+            data = self.carry + chunk
+            n = self.partial(data)
+            data, self.carry = data[:len(data) - n], data[len(data) - n:]
+            self.buffer += self.clean(data)
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def delimited_records(source, delimiter=u'</record>', encoding='utf-8', size=1 << 16):
+    """
+    Yield the same strings as `content.split(delimiter)` would, but without
+    reading the whole content into memory first.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    with open_source(source) as handle:
+        buf = u''
+        while True:
+            chunk = handle.read(size)
+            if isinstance(chunk, six.text_type):
+                buf += chunk
+            else:
+                buf += decoder.decode(chunk, final=not chunk)
+            parts = buf.split(delimiter)
+            buf = parts.pop()
+            for part in parts:
+                yield part
+            if not chunk:
+                break
+        yield buf
+
+
+def xml_records(source, tag='record', parse=xmltodict.parse, **kwargs):
+    """
+    Yield each element named `tag` (without namespace), parsed by `parse`,
+    which defaults to xmltodict.parse and gets the serialized element. Pass
+    parse=None to get the raw bytes. Additional keyword arguments are passed
+    to parse, e.g. force_list.
+    """
+    with open_source(source) as handle:
+        for snippet in xmlstream(handle, tag):
+            if parse is None:
+                yield snippet
+            else:
+                yield parse(snippet, **kwargs)
+
+
+def tar_records(source, suffix=None):
+    """
+    Yield the content (bytes) of each regular file in a tar archive (plain or
+    compressed), in archive order. Members are read as a stream, so nothing
+    is extracted and the member list is never built. With `suffix`, only
+    members whose name ends with suffix are read.
+    """
+    if isinstance(source, six.string_types):
+        tar = tarfile.open(source, mode='r|*')
+    else:
+        tar = tarfile.open(fileobj=source, mode='r|*')
+    with contextlib.closing(tar):
+        for member in tar:
+            if not member.isfile():
+                continue
+            if suffix and not member.name.endswith(suffix):
+                continue
+            fobj = tar.extractfile(member)
+            try:
+                yield fobj.read()
+            finally:
+                fobj.close()
+            # Streaming mode keeps all members seen so far, drop them.
+            tar.members = []
+
+
+def jsonl_records(source):
+    """
+    Yield decoded documents from line delimited JSON, skipping empty lines.
+    """
+    with open_source(source) as handle:
+        for line in handle:
+            if not line.strip():
+                continue
+            yield json.loads(line.decode('utf-8') if isinstance(line, six.binary_type) else line)
+
+
+def marc_records(source):
+    """
+    Yield pymarc records from binary MARC.
+    """
+    with open_source(source) as handle:
+        for record in pymarc.MARCReader(handle, to_unicode=True, force_utf8=True):
+            yield record
+
+
+@contextlib.contextmanager
+def open_sink(output, buffer_size=1 << 20):
+    """
+    Open a filename for buffered binary writing, filelike objects are passed
+    through and left open.
+    """
+    if not isinstance(output, six.string_types):
+        yield output
+        return
+    with io.open(output, 'wb', buffering=buffer_size) as handle:
+        yield handle
+
+
+def convert_record(mapping, record, stats):
+    """
+    Apply mapping to a single record, update stats and return a list of
+    serialized MARC records.
+    """
+    stats['processed'] += 1
+    try:
+        result = mapping(record)
+    except ValueError as exc:
+        logger.warning('conversion failed: %s', exc)
+        stats['failed'] += 1
+        return []
+    if result is None:
+        stats['skipped'] += 1
+        return []
+    if not isinstance(result, (list, tuple)):
+        result = [result]
+    stats['written'] += len(result)
+    return [marcrecord.as_marc() for marcrecord in result]
+
+
+def convert(records, mapping, output, max_failures=None):
+    """
+    Apply mapping to each record and write the resulting MARC records to
+    output (filename or binary filelike). A mapping may return None (skip), a
+    record or a list of records.
+
+    Returns a counter with processed, written, skipped and failed records.
+    Raises RuntimeError, if more than `max_failures` records failed.
+    """
+    stats = collections.Counter()
+    started = time.time()
+
+    with open_sink(output) as handle:
+        for record in records:
+            for data in convert_record(mapping, record, stats):
+                handle.write(data)
+            if max_failures is not None and stats['failed'] > max_failures:
+                raise RuntimeError('more than %d records failed' % max_failures)
+
+    log_stats(stats, time.time() - started)
+    return stats
+
+
+def log_stats(stats, elapsed):
+    logger.debug('%d/%d/%d/%d records processed/written/skipped/failed in %0.2fs (%0.1f records/s)',
+                 stats['processed'], stats['written'], stats['skipped'], stats['failed'], elapsed,
+                 stats['processed'] / elapsed if elapsed > 0 else 0)
+
+
+def parallel_map(func, items, processes=None, batch_size=1000, initializer=None, initargs=()):
+    """
+    Apply func to batches (tuples) of items in a process pool and yield the
+    results in input order. At most two batches per process are in flight,
+    so items are consumed lazily. Defaults to one process per core. Large,
+    constant arguments should be passed to the workers once, via initializer.
+    """
+    processes = processes or multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(processes, initializer=initializer, initargs=initargs)
+    try:
+        pending = collections.deque()
+        for batch in nwise(items, n=batch_size):
+            pending.append(pool.apply_async(func, (batch, )))
+            if len(pending) >= 2 * processes:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+# Mapping function of a parallel_convert worker process.
+worker_mapping = None
+
+
+def init_worker(mapping):
+    global worker_mapping
+    worker_mapping = mapping
+
+
+def convert_batch(batch):
+    """
+    Worker side of parallel_convert, returns MARC bytes and stats.
+    """
+    stats = collections.Counter()
+    result = []
+    for record in batch:
+        result.extend(convert_record(worker_mapping, record, stats))
+    return result, stats
+
+
+def parallel_convert(records, mapping, output, processes=None, batch_size=1000, max_failures=None):
+    """
+    Like convert, but run mapping in `processes` worker processes. Output
+    order is the input order and the returned stats are summed over all
+    workers. Failures are checked after each batch.
+    """
+    stats = collections.Counter()
+    started = time.time()
+
+    with open_sink(output) as handle:
+        for result, batch_stats in parallel_map(convert_batch,
+                                                records,
+                                                processes=processes,
+                                                batch_size=batch_size,
+                                                initializer=init_worker,
+                                                initargs=(mapping, )):
+            for data in result:
+                handle.write(data)
+            stats.update(batch_stats)
+            if max_failures is not None and stats['failed'] > max_failures:
+                raise RuntimeError('more than %d records failed' % max_failures)
+
+    log_stats(stats, time.time() - started)
+    return stats
+
+
+def convert_file(inputfile, outputfile, mapping, reader=xml_records, max_failures=None, processes=1, **kwargs):
+    """
+    Shortcut for convert(reader(inputfile, **kwargs), mapping, outputfile),
+    uses parallel_convert, if processes is not 1.
+    """
+    if processes == 1:
+        return convert(reader(inputfile, **kwargs), mapping, outputfile, max_failures=max_failures)
+    return parallel_convert(reader(inputfile, **kwargs),
+                            mapping,
+                            outputfile,
+                            processes=processes,
+                            max_failures=max_failures)
+
+
+class MergeDuplicates(object):
+    """
+    Merge records (dictionaries, that can be serialized as JSON) with the
+    same key in a temporary SQLite table, so memory does not grow with the
+    number of records. Records are looked up by a hash of `key(record)`, the
+    first record with a key is kept and the `field` values of any later
+    duplicates are appended to it, separated by `separator`; missing (None)
+    values are skipped. Records with a key of None are never merged.
+
+        merged = MergeDuplicates(key=lambda r: (r["title"], r["type"]), field="url")
+        for record in records:
+            merged.add(record)
+        for record in merged:
+            ...
+
+    Records are yielded in the order they were first seen. All changes are
+    written in a single transaction.
+    """
+    def __init__(self, key, field, separator=u'||', path=''):
+        """
+        By default the table lives in a private temporary database, that is
+        removed on close.
+        """
+        self.key = key
+        self.field = field
+        self.separator = separator
+        self.stats = collections.Counter()
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode = OFF")
+        self.conn.execute("PRAGMA synchronous = OFF")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS records (
+            id INTEGER PRIMARY KEY, key BLOB UNIQUE, doc TEXT, value TEXT)""")
+
+    def digest(self, record):
+        key = self.key(record)
+        if key is None:
+            return None
+        return sqlite3.Binary(hashlib.sha1(json.dumps(key, sort_keys=True).encode('utf-8')).digest())
+
+    def add(self, record):
+        digest, value = self.digest(record), record.get(self.field)
+        if digest is not None:
+            if value is None:
+                # Nothing to merge, but the record is still a duplicate.
+                cursor = self.conn.execute("UPDATE records SET value = value WHERE key = ?", (digest, ))
+            else:
+                cursor = self.conn.execute("UPDATE records SET value = COALESCE(value || ?, '') || ? WHERE key = ?",
+                                           (self.separator, value, digest))
+            if cursor.rowcount > 0:
+                self.stats['merged'] += 1
+                return
+        self.conn.execute("INSERT INTO records (key, doc, value) VALUES (?, ?, ?)",
+                          (digest, json.dumps(record), value))
+        self.stats['added'] += 1
+
+    def __iter__(self):
+        self.conn.commit()
+        for doc, value in self.conn.execute("SELECT doc, value FROM records ORDER BY id"):
+            record = json.loads(doc)
+            record[self.field] = value
+            yield record
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
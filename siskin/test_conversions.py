@@ -1,5 +1,10 @@
+import io
+import os
+import tarfile
+import tempfile
+
 import pymarc
-from siskin.conversions import imslp_xml_to_marc
+from siskin.conversions import imslp_tarball_to_marc, imslp_xml_to_marc
 
 
 def test_imslp_xml_to_marc():
@@ -38,3 +43,30 @@ def test_imslp_xml_to_marc():
     assert result["100"]["a"] == "Skramstad, Hans"
     assert result["245"]["a"] == "Vals for pianoforte"
     assert result["856"]["u"] == "http://imslp.org/wiki/Vals_(Skramstad,_Hans)"
+
+
+def test_imslp_tarball_to_marc():
+    template = """<?xml version="1.0"?>
+    <document docID="imslp{i}">
+      <identifier identifierEncodingSchema="originalID">work{i}</identifier>
+      <creator><mainForm>Composer {i}</mainForm></creator>
+      <title>Title {i}</title>
+      <url urlEncodingSchema="originalDetailView">http://imslp.org/wiki/{i}</url>
+    </document>
+    """
+    _, tarball = tempfile.mkstemp(suffix=".tar.gz")
+    with tarfile.open(tarball, "w:gz") as tar:
+        for i in range(20):
+            data = template.format(i=i).encode("utf-8")
+            info = tarfile.TarInfo(name="imslp/%02d.xml" % i)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+    for processes in (1, 2):
+        output = imslp_tarball_to_marc(tarball, processes=processes)
+        with open(output, "rb") as handle:
+            titles = [record["245"]["a"] for record in pymarc.MARCReader(handle)]
+        assert titles == ["Title %s" % i for i in range(20)]
+        os.remove(output)
+
+    os.remove(tarball)
@@ -0,0 +1,40 @@
+# coding: utf-8
+"""
+Tests for the ISSN coverage matrix.
+"""
+
+import io
+
+from siskin.coverage import (CoverageMatrix, int_to_issn, issn_array, issn_to_int, kbart_issn_array)
+
+
+def test_issn_to_int():
+    for issn in ("0000-0000", "2091-2145", "1234-567X", "9999-999X"):
+        assert int_to_issn(issn_to_int(issn)) == issn
+    assert issn_to_int("1234-567x") == issn_to_int("1234567X")
+    assert issn_to_int(b" 2091-2145\n") == issn_to_int("2091-2145")
+    assert issn_to_int("n/a") is None
+    # Integers sort like the strings.
+    issns = ["0000-0001", "0000-0009", "0000-000X", "0000-0010", "2091-2145"]
+    assert sorted(issns, key=issn_to_int) == issns
+
+
+def test_coverage_matrix():
+    crossref = issn_array(["2091-2145", "2091-2234", "", "2091-2560", "2091-2609"])
+    doaj = issn_array(["2091-2145\n", "1234-567X\n"])
+    matrix = CoverageMatrix([("crossref", crossref), ("doaj", doaj)])
+
+    kbart = io.StringIO(u"publication_title\tprint_identifier\tonline_identifier\n"
+                        u"A\t2091-2145\t1234-567X\n"
+                        u"B\t2091-2234\t\n"
+                        u"C\t\t2091-2730\n"
+                        u"short\n")
+    issns = kbart_issn_array(kbart)
+    assert list(matrix.report(issns)) == [
+        ("1234-567X", "doaj"),
+        ("2091-2145", "crossref|doaj"),
+        ("2091-2234", "crossref"),
+        ("2091-2730", "NOT_FOUND"),
+    ]
+    assert matrix.matrix(issns).tolist() == [[False, True], [True, True], [True, False], [False, False]]
+    assert list(matrix.report(kbart_issn_array([]))) == []
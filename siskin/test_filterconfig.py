@@ -0,0 +1,49 @@
+# coding: utf-8
+"""
+Compiled and naive filterconfig evaluation must agree.
+"""
+
+import io
+import itertools
+
+from siskin.filterconfig import FilterConfig, kbart_issns, naive_isils
+
+config = {
+    "DE-15": {
+        "or": [
+            {"and": [{"source": ["49"]}, {"collection": ["Crossref", "Other"]}, {"holdings": {"urls": ["u1"]}}]},
+            {"and": [{"source": ["34"]}, {"subject": ["Music"]}]},
+        ]
+    },
+    "DE-14": {"and": [{"source": ["49", "55"]}, {"collection": ["Crossref"]}]},
+    "DE-Ch1": {"or": [{"source": ["28"]}, {"and": [{"source": ["55"]}, {"not": {"holdings": {"urls": ["u2"]}}}]}]},
+    "DE-D161": {"and": [{"source": ["55"]}, {"holdings": {"urls": ["u1"]}}, {"holdings": {"urls": ["u2", "missing"]}}]},
+}
+
+
+def test_kbart_issns():
+    content = u"publication_title\tprint_identifier\tonline_identifier\nA\t1111-1111\t\nB\t\t2222-2222\n"
+    assert kbart_issns(io.StringIO(content)) == {"1111-1111", "2222-2222"}
+
+
+def test_compiled_matches_naive():
+    holdings = {"u1": {"1111-1111"}, "u2": {"2222-2222"}}
+    matcher = FilterConfig(config, holdings=holdings)
+    assert len(matcher.generic) == 1
+
+    docs = []
+    for sid, coll, issns, subjects in itertools.product(["28", "34", "49", "55", "99"], [[], ["Crossref"], ["Other"]],
+                                                        [[], ["1111-1111"], ["1111-1111", "2222-2222"]],
+                                                        [[], ["Music"]]):
+        docs.append({
+            "finc.source_id": sid,
+            "finc.mega_collection": coll,
+            "rft.issn": issns,
+            "x.subjects": subjects,
+        })
+
+    for doc in docs:
+        assert matcher.isils(doc) == naive_isils(config, doc, holdings)
+
+    doc = {"finc.source_id": "55", "finc.mega_collection": ["Crossref"], "rft.issn": ["1111-1111", "2222-2222"]}
+    assert matcher.isils(doc) == ["DE-14", "DE-D161"]
@@ -0,0 +1,347 @@
+# coding: utf-8
+"""
+Test cursor harvests against a local stand-in for the Crossref /works API,
+part downloads and SRU harvests against local stubs.
+"""
+
+import datetime
+import gzip
+import io
+import json
+import os
+import threading
+
+import pytest
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler
+from six.moves.urllib.parse import parse_qs, urlparse
+
+import pymarc
+from siskin.harvest import (CursorHarvester, PartDownloader, SRUHarvester, check_gzip, iter_marc, marc_control_field,
+                            split_or)
+from siskin.utils import RateLimiter
+
+
+def works_handler(pages=3, fail_at=None, seen=None):
+    """
+    Return a handler serving `pages` pages per filter; cursor "*" starts, then
+    "c1", "c2", ... The request for cursor `fail_at` fails with HTTP 500.
+    """
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query)
+            cursor = query['cursor'][0]
+            with lock:
+                if seen is not None:
+                    seen.append((query['filter'][0], cursor))
+            if cursor == fail_at:
+                self.send_response(500)
+                self.end_headers()
+                return
+            page = 0 if cursor == '*' else int(cursor[1:])
+            items = [{'DOI': '10.1/%s-%s' % (query['filter'][0], page)}] if page < pages else []
+            body = json.dumps({'message': {'items': items, 'next-cursor': 'c%d' % (page + 1)}})
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(body.encode('utf-8'))
+
+    return Handler
+
+
+def read_pages(path):
+    with gzip.open(path, 'rb') as handle:
+        return [json.loads(line.decode('utf-8')) for line in handle]
+
+
+def test_harvest_windows(http_server, tmpdir):
+    url = http_server(works_handler(pages=3))
+    harvester = CursorHarvester(url=url + '/works', rate=0)
+    windows = [((datetime.date(2019, m, 1), datetime.date(2019, m + 1, 1)), str(tmpdir.join('%s.ldj.gz' % m)))
+               for m in range(1, 5)]
+
+    stats = harvester.harvest_windows(windows, workers=3)
+
+    assert stats['windows'] == 4
+    assert stats['pages'] == 12
+    for _, path in windows:
+        pages = read_pages(path)
+        assert len(pages) == 3
+        assert not os.path.exists(path + '.checkpoint')
+        assert not os.path.exists(path + '.part')
+
+    # Completed windows are skipped.
+    assert harvester.harvest_windows(windows, workers=3)['windows'] == 0
+
+
+def test_harvest_empty_window(http_server, tmpdir):
+    path = str(tmpdir.join('window.ldj.gz'))
+    url = http_server(works_handler(pages=0))
+    harvester = CursorHarvester(url=url + '/works', rate=0)
+
+    stats = harvester.harvest_window(datetime.date(2019, 1, 1), datetime.date(2019, 2, 1), path)
+
+    assert stats['pages'] == 0
+    assert os.path.getsize(path) > 0
+    assert read_pages(path) == []
+
+
+def test_harvest_window_resume(http_server, tmpdir):
+    path = str(tmpdir.join('window.ldj.gz'))
+    begin, end = datetime.date(2019, 1, 1), datetime.date(2019, 2, 1)
+
+    url = http_server(works_handler(pages=4, fail_at='c2'))
+    harvester = CursorHarvester(url=url + '/works', rate=0, max_tries=1)
+    try:
+        harvester.harvest_window(begin, end, path)
+    except RuntimeError:
+        pass
+    assert not os.path.exists(path)
+    assert os.path.exists(path + '.checkpoint')
+
+    seen = []
+    url = http_server(works_handler(pages=4, seen=seen))
+    harvester = CursorHarvester(url=url + '/works', rate=0)
+    stats = harvester.harvest_window(begin, end, path)
+
+    assert [cursor for _, cursor in seen] == ['c2', 'c3', 'c4']
+    assert stats['pages'] == 2
+    assert len(read_pages(path)) == 4
+
+
+def test_rate_limiter():
+    limiter = RateLimiter(rate=100)
+    started = datetime.datetime.now()
+    threads = [threading.Thread(target=limiter.wait) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert (datetime.datetime.now() - started).total_seconds() >= 0.09
+
+
+def parts_handler(parts, failures=None, truncate=None, requests=None, encoding=None):
+    """
+    Serve gzip compressed parts at /teil<N>.xml.gz with range support. A
+    path in `failures` answers with HTTP 500 as long as its count is
+    positive, a path in `truncate` sends only half of the body once. With
+    `encoding`, a Content-Encoding header is sent.
+    """
+    failures = failures if failures is not None else {}
+    truncate = truncate if truncate is not None else set()
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            with lock:
+                if requests is not None:
+                    requests.append((self.path, self.headers.get('Range')))
+                if failures.get(self.path, 0) > 0:
+                    failures[self.path] -= 1
+                    self.send_response(500)
+                    self.end_headers()
+                    return
+                cut = self.path in truncate
+                truncate.discard(self.path)
+            body = parts[self.path]
+            start = 0
+            if self.headers.get('Range'):
+                start = int(self.headers.get('Range').split('=')[1].rstrip('-'))
+                self.send_response(206)
+            else:
+                self.send_response(200)
+            self.send_header('Content-Length', str(len(body) - start))
+            if encoding:
+                self.send_header('Content-Encoding', encoding)
+            self.end_headers()
+            self.wfile.write(body[start:len(body) // 2] if cut else body[start:])
+
+    return Handler
+
+
+def gzip_bytes(data):
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb') as handle:
+        handle.write(data)
+    return buf.getvalue()
+
+
+def upper(src, dst):
+    with gzip.open(src, 'rb') as handle, open(dst, 'wb') as output:
+        output.write(handle.read().upper())
+
+
+def test_check_gzip(tmpdir):
+    path = str(tmpdir.join('x.gz'))
+    data = gzip_bytes(b'hello' * 1000)
+    with open(path, 'wb') as handle:
+        handle.write(data + data)
+    check_gzip(path)
+    with open(path, 'wb') as handle:
+        handle.write(data[:len(data) // 2])
+    with pytest.raises(ValueError):
+        check_gzip(path)
+
+
+def test_part_downloader(http_server, tmpdir):
+    content = dict((i, ''.join('part %d %d\n' % (i, j) for j in range(10000)).encode('utf-8')) for i in range(1, 6))
+    parts = dict(('/teil%d.xml.gz' % i, gzip_bytes(data)) for i, data in content.items())
+    failures = {'/teil2.xml.gz': 2, '/teil4.xml.gz': 100}
+    seen = []
+    url = http_server(parts_handler(parts, failures=failures, truncate={'/teil3.xml.gz'}, requests=seen))
+    urls = [url + '/teil%d.xml.gz' % i for i in range(1, 6)]
+    directory, output = str(tmpdir.join('parts')), str(tmpdir.join('out'))
+
+    downloader = PartDownloader(directory, convert=upper, workers=3, max_tries=3, chunk_size=1024)
+    with pytest.raises(RuntimeError):
+        downloader.run(urls, output)
+    assert [r for path, r in seen if path == '/teil3.xml.gz'][-1].startswith('bytes=')
+
+    # Rerun only fetches the missing part.
+    failures['/teil4.xml.gz'] = 0
+    del seen[:]
+    stats = downloader.run(urls, output)
+    assert [path for path, _ in seen] == ['/teil4.xml.gz']
+    assert stats['parts'] == 5
+    assert not os.path.exists(directory)
+
+    with open(output, 'rb') as handle:
+        assert handle.read() == b''.join(content[i].upper() for i in range(1, 6))
+
+
+def test_part_downloader_content_encoding(http_server, tmpdir):
+    content = b'part 1\n' * 10000
+    url = http_server(parts_handler({'/teil1.xml.gz': gzip_bytes(content)}, encoding='gzip'))
+    directory, output = str(tmpdir.join('parts')), str(tmpdir.join('out'))
+
+    stats = PartDownloader(directory, convert=upper, max_tries=1).run([url + '/teil1.xml.gz'], output)
+    assert stats['parts'] == 1
+    with open(output, 'rb') as handle:
+        assert handle.read() == content.upper()
+
+
+def test_split_or():
+    assert split_or('a="1"') == ['a="1"']
+    assert split_or('a="1" or (b="2" or c="3") OR d="x or y"') == ['a="1"', '(b="2" or c="3")', 'd="x or y"']
+    assert split_or("""pica.rvk="LR
+                    57240" or pica.sbn="vd17"
+                    or pica.sbn="vd17" """) == ['pica.rvk="LR 57240"', 'pica.sbn="vd17"']
+    assert split_or('a="1" and b="oracle"') == ['a="1" and b="oracle"']
+    with pytest.raises(ValueError):
+        split_or('a="1" or or b="2"')
+
+
+def test_split_or_mixed_booleans():
+    # Left to right: (a or b) and c, not a or (b and c).
+    assert split_or('a="1" or b="2" and c="3"') == ['a="1" or b="2" and c="3"']
+    assert split_or('a="1"  OR b="2" NOT c="3"') == ['a="1" or b="2" NOT c="3"']
+    assert split_or('a="1" or b="2" prox/unit=word c="3"') == ['a="1" or b="2" prox/unit=word c="3"']
+    assert split_or('a="1" or (b="2" and c="3")') == ['a="1"', '(b="2" and c="3")']
+
+
+def marcxml(ppn):
+    return ('<record xmlns="http://www.loc.gov/MARC21/slim"><leader>00000nam a2200000   4500</leader>'
+            '<controlfield tag="001">%s</controlfield><datafield tag="245" ind1="1" ind2="0">'
+            '<subfield code="a">Titel %s</subfield></datafield></record>' % (ppn, ppn))
+
+
+def sru_handler(results, fail=None, seen=None):
+    """
+    Serve an SRU 1.1 searchRetrieve for the queries in results (query to list
+    of PPN). Requests for a (query, startRecord) in fail answer with HTTP 500
+    as long as the count is positive, unknown queries get a diagnostic.
+    """
+    fail = fail if fail is not None else {}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            params = dict((k, v[0]) for k, v in parse_qs(urlparse(self.path).query).items())
+            query, start, rows = params['query'], int(params['startRecord']), int(params['maximumRecords'])
+            assert params['recordSchema'] == 'marcxml' and params['operation'] == 'searchRetrieve'
+            with lock:
+                if seen is not None:
+                    seen.append((query, start))
+                if fail.get((query, start), 0) > 0:
+                    fail[(query, start)] -= 1
+                    self.send_response(500)
+                    self.end_headers()
+                    return
+            body = ['<zs:searchRetrieveResponse xmlns:zs="http://www.loc.gov/zing/srw/"><zs:version>1.1</zs:version>']
+            if query not in results:
+                body.append('<zs:diagnostics><diag:diagnostic xmlns:diag="http://www.loc.gov/zing/srw/diagnostic/">'
+                            '<diag:message>Unsupported index</diag:message></diag:diagnostic></zs:diagnostics>')
+            else:
+                ppns = results[query]
+                body.append('<zs:numberOfRecords>%d</zs:numberOfRecords><zs:records>' % len(ppns))
+                for i, ppn in enumerate(ppns[start - 1:start - 1 + rows], start=start):
+                    body.append('<zs:record><zs:recordSchema>marcxml</zs:recordSchema>'
+                                '<zs:recordData>%s</zs:recordData>'
+                                '<zs:recordPosition>%d</zs:recordPosition></zs:record>' % (marcxml(ppn), i))
+                body.append('</zs:records>')
+                if start - 1 + rows < len(ppns):
+                    body.append('<zs:nextRecordPosition>%d</zs:nextRecordPosition>' % (start + rows))
+            body.append('</zs:searchRetrieveResponse>')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/xml')
+            self.end_headers()
+            self.wfile.write(''.join(body).encode('utf-8'))
+
+    return Handler
+
+
+def read_ppns(path):
+    with open(path, 'rb') as handle:
+        return [marc_control_field(data) for data in iter_marc(handle)]
+
+
+def test_sru_harvester(http_server, tmpdir):
+    results = {
+        'pica.bkl="05.15"': ['%d' % i for i in range(1, 8)],
+        'pica.ssg="bbi"': ['%d' % i for i in range(5, 13)],
+        'pica.sbn="vd17"': [],
+    }
+    fail = {('pica.ssg="bbi"', 4): 100}
+    seen = []
+    url = http_server(sru_handler(results, fail=fail, seen=seen))
+    query = 'pica.bkl="05.15" or pica.ssg="bbi"\n or pica.sbn="vd17"'
+    directory, output = str(tmpdir.join('parts')), str(tmpdir.join('out.mrc'))
+
+    harvester = SRUHarvester(url=url, rows=3, workers=3, max_tries=2)
+    with pytest.raises(RuntimeError):
+        harvester.run(query, directory, output)
+    assert not os.path.exists(output)
+
+    # Rerun resumes the failed query with the failed page.
+    fail.clear()
+    del seen[:]
+    stats = harvester.run(query, directory, output)
+    assert seen == [('pica.ssg="bbi"', 4), ('pica.ssg="bbi"', 7)]
+    assert stats['queries'] == 3
+    assert stats['duplicates'] == 3
+    assert read_ppns(output) == ['%d' % i for i in range(1, 13)]
+    assert not os.path.exists(directory)
+
+    with open(output, 'rb') as handle:
+        records = list(pymarc.MARCReader(handle, to_unicode=True, force_utf8=True))
+    assert records[11]['245']['a'] == 'Titel 12'
+
+
+def test_sru_harvester_diagnostic(http_server, tmpdir):
+    seen = []
+    url = http_server(sru_handler({}, seen=seen))
+    harvester = SRUHarvester(url=url, max_tries=3)
+    with pytest.raises(RuntimeError) as exc:
+        harvester.fetch_page('x.y="z"', 1)
+    assert 'Unsupported index' in str(exc.value)
+    assert len(seen) == 1
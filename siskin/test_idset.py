@@ -0,0 +1,58 @@
+# coding: utf-8
+"""
+Tests for merge based identifier set operations.
+"""
+
+import itertools
+import os
+
+import pytest
+
+from siskin.idset import (SortedIdentifiers, difference, intersection, is_sorted, merge, overlaps, union, unique)
+
+
+def test_unique():
+    assert list(unique([b"a", b"a", b"b", b"c", b"c"])) == [b"a", b"b", b"c"]
+    with pytest.raises(ValueError):
+        list(unique([b"b", b"a"]))
+
+
+def test_set_operations():
+    a, b, c = [b"1", b"2", b"3", b"5"], [b"2", b"3", b"4"], [b"3", b"5", b"6"]
+    assert list(merge(a, b)) == [(b"1", (0, )), (b"2", (0, 1)), (b"3", (0, 1)), (b"4", (1, )), (b"5", (0, ))]
+    assert list(intersection(a, b, c)) == [b"3"]
+    assert list(union(a, b, c)) == [b"1", b"2", b"3", b"4", b"5", b"6"]
+    assert list(difference(a, b)) == [b"1", b"5"]
+    assert list(difference(a, b, c)) == [b"1"]
+
+
+def test_sorted_identifiers(tmpdir):
+    path = str(tmpdir.join("ids"))
+    with open(path, "wb") as handle:
+        handle.write(b"10.2/b\n10.1/a\n\n10.2/b\n10.10/z\n")
+    assert not is_sorted(path)
+
+    with SortedIdentifiers(path) as ids:
+        assert ids.tempfile is not None
+        assert list(ids) == [b"10.1/a", b"10.10/z", b"10.2/b"]
+        # Repeatable.
+        assert list(ids) == [b"10.1/a", b"10.10/z", b"10.2/b"]
+        tempfile = ids.tempfile
+    assert not os.path.exists(tempfile)
+
+
+def test_overlaps():
+    lists = {
+        "a": set(b"%d" % i for i in range(0, 100, 2)),
+        "b": set(b"%d" % i for i in range(0, 100, 3)),
+        "c": set(b"%d" % i for i in range(0, 100, 5)),
+    }
+    names = sorted(lists)
+    seen = []
+    result = overlaps([(name, sorted(lists[name])) for name in names], callback=lambda v, c: seen.append((v, c)))
+
+    assert result.sizes == dict((name, len(lists[name])) for name in names)
+    assert list(result.pairs()) == [(k1, k2, len(lists[k1] & lists[k2])) for k1, k2 in itertools.combinations(names, 2)]
+    assert result.intersection("a", "b", "c") == len(lists["a"] & lists["b"] & lists["c"])
+    assert (b"30", ("a", "b", "c")) in seen
+    assert (b"9", ("b", )) in seen
@@ -3,12 +3,13 @@
 A few tests for the mab module, refs #8392.
 """
 
+import gzip
 import os
 import tempfile
 
 import pytest
 
-from siskin.mab import MabXMLFile
+from siskin.mab import LinkCollector, MabXMLFile, MabXMLStream, ReplacingReader, SetCollector, collect
 
 try:
     from StringIO import StringIO
@@ -183,3 +184,142 @@ def test_replace_shortcut():
     assert record.field("419") is None
     assert record.field("419", code="c") == "2017"
     assert record.field("419", "c") == "2017"
+
+
+def test_stream_equals_file():
+    """
+    Streaming yields the same records as eager parsing.
+    """
+    for s in (sample_file_one, sample_file_two):
+        eager = [(r.dd or {}).get("feld") for r in MabXMLFile(s)]
+        streamed = [(r.dd or {}).get("feld") for r in MabXMLStream(s)]
+        assert eager == streamed
+
+    for name in ("mab0.xml", "mab1.xml", "mab2.xml"):
+        path = os.path.join(os.path.dirname(__file__), "..", "fixtures", name)
+        eager = [(r.status(), r.typ(), r.dd.get("feld")) for r in MabXMLFile(path)]
+        streamed = [(r.status(), r.typ(), r.dd.get("feld")) for r in MabXMLStream(path)]
+        assert eager == streamed
+
+
+def test_stream_sources():
+    """
+    Filelike, filename and gzip compressed input; repeated iteration.
+    """
+    assert len([_ for _ in MabXMLStream(StringIO(sample_file_two))]) == 2
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".xml.gz") as f:
+        pass
+    with gzip.open(f.name, "wb") as handle:
+        handle.write(sample_file_two.encode("utf-8"))
+
+    stream = MabXMLStream(f.name)
+    assert len([_ for _ in stream]) == 2
+    assert len([_ for _ in stream]) == 2
+    os.remove(f.name)
+
+
+def test_stream_replace_and_encoding():
+    data = sample_file_two.replace('encoding="UTF-8"', 'encoding="ISO-8859-1"')
+    with tempfile.NamedTemporaryFile(delete=False) as f:
+        f.write(data.replace("2016", u"2016¬").encode("latin-1"))
+
+    record = next(iter(MabXMLStream(f.name, replace=(u"¬", ""), encoding="latin-1")))
+    assert record.field("419", code="c") == "2016"
+    assert record.field("710") == "hochfester Stahl"
+    os.remove(f.name)
+
+
+def test_replacing_reader_without_newlines():
+    """
+    Replacements across chunk boundaries, input without any newline is
+    read in bounded pieces.
+    """
+    text = u'<?xml version="1.0" encoding="ISO-8859-1"?><datei>' + u"ab¬c" * 1000 + u"</datei>"
+
+    class Handle(object):
+        def __init__(self):
+            self.handle = StringIO(text)
+            self.sizes = []
+
+        def read(self, size=-1):
+            self.sizes.append(size)
+            return self.handle.read(size)
+
+    for size in (1, 2, 3, 7, 1024):
+        handle = Handle()
+        reader = ReplacingReader(handle, replace=[(u"¬", u""), (u"ca", u"X")], size=size)
+        data = b"".join(iter(lambda: reader.read(5), b""))
+        assert data == text.replace(u"ISO-8859-1", u"utf-8").replace(u"¬", u"").replace(u"ca", u"X").encode("utf-8")
+        assert max(handle.sizes) == size
+
+def test_stream_invalid_input():
+    for s in ("""<xml></xml>""", """<a></a>""", """<datei><datensatz>"""):
+        with pytest.raises(ValueError):
+            list(MabXMLStream(s))
+    assert list(MabXMLStream("""<datei></datei>""")) == []
+
+
+def test_stream_records_numbers():
+    """
+    Only the requested fields are parsed.
+    """
+    records = list(MabXMLStream(sample_file_one).records(numbers=("001", "089")))
+    assert [f["@nr"] for f in records[0].dd["feld"]] == ["001", "089"]
+    assert records[0].field("089") == "2006"
+    assert records[0].field("331") is None
+    assert records[0].typ() == "u"
+
+
+def test_collect():
+    data = """<datei>
+    <datensatz typ="h"><feld nr="001" ind=" ">000123</feld><feld nr="331" ind=" ">Parent</feld></datensatz>
+    <datensatz typ="u"><feld nr="001" ind=" ">2</feld><feld nr="010" ind=" ">000123</feld><feld nr="089" ind=" ">1999</feld></datensatz>
+    <datensatz typ="u"><feld nr="001" ind=" ">3</feld><feld nr="010" ind=" ">123</feld><feld nr="089" ind=" ">2000</feld></datensatz>
+    <datensatz typ="u"><feld nr="001" ind=" ">4</feld><feld nr="010" ind=" ">123</feld></datensatz>
+    </datei>"""
+    stream = MabXMLStream(data)
+    links = LinkCollector("010", "089", normalize=lambda v: v.lstrip("0"))
+    titles = SetCollector(("331", ), lambda record: [record.field("331")] if record.field("331") else [])
+
+    assert collect(stream, links, titles) == (links, titles)
+    assert links.get("123") == ["1999", "2000"]
+    assert links.get("2") is None
+    assert titles.values == set(["Parent"])
+
+    # The second pass sees complete records.
+    assert [r.field("001") for r in stream] == ["000123", "2", "3", "4"]
+
+
+def naive_field(dd, number, code=None, alt=None):
+    """
+    Linear scan, as MabRecord.field was implemented before indexing.
+    """
+    for f in dd.get("feld", []):
+        if f.get("@nr") == number:
+            if code:
+                for sf in f.get("uf", []):
+                    if sf.get("@code") == code:
+                        return sf.get("#text", alt)
+            else:
+                return f.get("#text", alt)
+    return alt
+
+
+def test_record_index():
+    """
+    Indexed access returns the same values as a linear scan.
+    """
+    for name in ("mab0.xml", "mab1.xml", "mab2.xml"):
+        path = os.path.join(os.path.dirname(__file__), "..", "fixtures", name)
+        for record in MabXMLFile(path):
+            numbers = set(f.get("@nr") for f in record.dd.get("feld", [])) | {"999"}
+            for number in numbers:
+                for code in (None, "a", "b", "c", "u", "x"):
+                    assert record.field(number, code=code) == naive_field(record.dd, number, code=code)
+                    assert record.field(number, code=code, alt="") == naive_field(record.dd, number, code=code, alt="")
+
+    record = MabXMLFile(sample_file_two).next()
+    assert record.fields("710") == ["hochfester Stahl", "Blechumformen", u"Pressh\xe4rten"]
+    assert record.fields("419", code="b") == ["World Scientific Publishing"]
+    assert record.fields("060") == []
@@ -0,0 +1,72 @@
+# coding: utf-8
+"""
+Tests for the persistent latest member index.
+"""
+
+import os
+import zipfile
+
+from siskin.memberindex import MemberIndex, shipment_timestamp
+
+
+def make_zip(path, names):
+    with zipfile.ZipFile(path, "w") as zf:
+        for name in names:
+            zf.writestr(name, "<x/>")
+    return path
+
+
+def test_shipment_timestamp():
+    assert shipment_timestamp("/x/jstor-journals-2018-03-10T06-52-44Z-part-001.zip") == "20180310065244"
+    assert shipment_timestamp("/x/MMS_2015-03-23-18-04-17/ocealing_20170904T133503_1.zip") == "20170904133503"
+    assert shipment_timestamp("/x/MMS_2015-03-23-18-04-17/a.zip") == "20150323180417"
+    assert shipment_timestamp("/x/a.zip") == ""
+
+
+def test_member_index(tmpdir):
+    # Later shipments sort before earlier ones by path.
+    a = make_zip(str(tmpdir.join("z-2018-01-01T00-00-00Z.zip")), ["j/1.xml", "j/2.xml", "j/readme.txt"])
+    b = make_zip(str(tmpdir.join("a-2018-06-01T00-00-00Z.zip")), ["j/2.xml", "j/3.xml"])
+
+    index = MemberIndex(str(tmpdir.join("index", "members.db")))
+    stats = index.update([a, b])
+    assert stats["archives"] == 2
+    assert list(index.latest()) == [(b, "j/2.xml"), (b, "j/3.xml"), (a, "j/1.xml")]
+
+    # Only the new archive is listed.
+    c = make_zip(str(tmpdir.join("m-2019-01-01T00-00-00Z.zip")), ["j/1.xml"])
+    stats = index.update([a, b, c])
+    assert stats["archives"] == 1
+    assert list(index.latest()) == [(b, "j/2.xml"), (b, "j/3.xml"), (c, "j/1.xml")]
+    index.close()
+
+    # Index persists, a vanished archive triggers a rebuild.
+    index = MemberIndex(str(tmpdir.join("index", "members.db")))
+    assert index.update([a, b, c])["archives"] == 0
+    os.remove(c)
+    assert index.update([a, b])["archives"] == 2
+    assert list(index.latest()) == [(b, "j/2.xml"), (b, "j/3.xml"), (a, "j/1.xml")]
+
+
+def test_member_index_changed_archive(tmpdir):
+    a = make_zip(str(tmpdir.join("a-2018-01-01T00-00-00Z.zip")), ["j/1.xml", "j/2.xml"])
+    index = MemberIndex(str(tmpdir.join("members.db")))
+    index.update([a])
+
+    # A replaced archive keeps only the members it still contains.
+    make_zip(a, ["j/1.xml", "j/3.xml", "j/4.xml"])
+    os.utime(a, (0, 0))
+    assert index.update([a])["archives"] == 1
+    assert list(index.latest()) == [(a, "j/1.xml"), (a, "j/3.xml"), (a, "j/4.xml")]
+    index.close()
+
+
+def test_member_index_predicate(tmpdir):
+    a = make_zip(str(tmpdir.join("a-2018-01-01T00-00-00Z.zip")), ["j/1.xml", "j/2.xml"])
+    b = make_zip(str(tmpdir.join("metadata-2018-06-01T00-00-00Z.zip")), ["j/1.xml"])
+
+    # The latest member is picked among the selected members only.
+    index = MemberIndex(str(tmpdir.join("members.db")), predicate=lambda archive, member: "metadata" not in archive)
+    index.update([a, b])
+    assert list(index.latest()) == [(a, "j/1.xml"), (a, "j/2.xml")]
+    index.close()
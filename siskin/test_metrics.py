@@ -0,0 +1,40 @@
+# coding: utf-8
+"""
+Tests for the title count time series.
+"""
+
+import pytest
+
+from siskin.metrics import Change, MetricsStore
+
+
+def test_metrics_store(tmpdir):
+    store = MetricsStore(str(tmpdir.join("metrics", "checkup.sqlite")))
+    assert store.latest() == (None, None)
+
+    first = store.record(date="2019-01-01T00:00:00",
+                         sources={49: 10, 28: 5},
+                         institutions={"DE-15": 10, "DE-14": 5},
+                         titles={(49, "DE-15"): 10, (28, "DE-14"): 5})
+    second = store.record(date="2019-02-01T00:00:00",
+                          sources={49: 8, 30: 5},
+                          institutions={"DE-15": 8, "DE-14": 5},
+                          titles={(49, "DE-15"): 8, (30, "DE-14"): 5})
+
+    assert store.latest() == (second, first)
+    assert [date for _, date in store.runs()] == ["2019-01-01T00:00:00", "2019-02-01T00:00:00"]
+    assert store.values("titles") == {(49, "DE-15"): 8, (30, "DE-14"): 5}
+    assert store.values("sources", run=first) == {49: 10, 28: 5}
+
+    assert store.diff("sources") == [Change(28, 5, None), Change(30, None, 5), Change(49, 10, 8)]
+    assert store.diff("institutions") == [Change("DE-15", 10, 8)]
+    assert store.diff("institutions", unchanged=True) == [Change("DE-14", 5, 5), Change("DE-15", 10, 8)]
+    assert store.diff("titles", run=first, previous=second) == [
+        Change((28, "DE-14"), None, 5),
+        Change((30, "DE-14"), 5, None),
+        Change((49, "DE-15"), 8, 10),
+    ]
+
+    with pytest.raises(ValueError):
+        store.record(collections={"x": 1})
+    store.close()
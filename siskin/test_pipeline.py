@@ -0,0 +1,45 @@
+# coding: utf-8
+"""
+Tests for the single pass line delimited JSON pipeline.
+"""
+
+import gzip
+import json
+import os
+
+from siskin.pipeline import ValueSink, fanout
+
+docs = [
+    {"finc.source_id": "55", "rft.issn": ["2222-2222", "1111-1111"], "rft.eissn": ["3333-3333"], "doi": "10.1/a"},
+    {"finc.source_id": "55", "rft.issn": ["1111-1111"], "doi": None},
+    {"finc.source_id": "48", "rft.eissn": [], "doi": "https://doi.org/10.2/b"},
+]
+
+
+def test_value_sink_bytewise_order():
+    sink = ValueSink(fields=("doi", ))
+    for doi in ("10.1/b", "10.1/B", "10.1/a", "10.1/b", u"10.1/\u00e4"):
+        sink.add({"doi": doi})
+    sink.close()
+    assert list(sink.values()) == ["10.1/B", "10.1/a", "10.1/b", u"10.1/\u00e4"]
+    os.remove(sink.path)
+
+
+def test_fanout(tmpdir):
+    path = str(tmpdir.join("input.ldj.gz"))
+    with gzip.open(path, "wb") as handle:
+        for doc in docs:
+            handle.write(json.dumps(doc).encode("utf-8") + b"\n\n")
+
+    issns = ValueSink(fields=("rft.issn", "rft.eissn"))
+    dois = ValueSink(fields=("doi", ), pattern="10.*")
+
+    assert fanout(path, [issns, dois]) == 3
+    assert list(issns.values()) == ["1111-1111", "2222-2222", "3333-3333"]
+    assert list(dois.values()) == ["10.1/a", "10.2/b"]
+
+    with open(dois.path, "rb") as handle:
+        assert handle.read() == b"10.1/a\n10.2/b\n"
+
+    for sink in (issns, dois):
+        os.remove(sink.path)
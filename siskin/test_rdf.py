@@ -0,0 +1,51 @@
+# coding: utf-8
+"""
+Tests for the streaming triple writer.
+"""
+
+import io
+
+import pytest
+import rdflib
+
+from siskin.rdf import PairSet, TripleWriter
+
+AMSL = "http://amsl.technology/"
+DISCO = "http://amsl.technology/discovery/Metadatenkollektion/"
+
+
+def write(pairs, format):
+    output = io.StringIO()
+    with PairSet() as ps:
+        for s, o in pairs:
+            ps.add(s, o)
+        writer = TripleWriter(output, format=format, prefixes={"amsl": AMSL, "disco": DISCO})
+        for s, objects in ps.groups():
+            writer.write(s, AMSL + "coveredMediumID", objects)
+        writer.close()
+    return writer, output.getvalue()
+
+
+@pytest.mark.parametrize("format", ["turtle", "nt"])
+def test_triple_writer(format):
+    pairs = [
+        (DISCO + "Foo%20Bar", "urn:ISSN:1234-5678"),
+        (DISCO + "Crossref", "urn:ISSN:0000-000X"),
+        (DISCO + "Foo%20Bar", "urn:ISSN:0000-000X"),
+        (DISCO + "Foo", "urn:ISSN:1234-5678"),
+        (DISCO + "Foo%20Bar", "urn:ISSN:1234-5678"),
+    ]
+    writer, data = write(pairs, format)
+    assert writer.count == 4
+
+    graph = rdflib.Graph().parse(data=data, format=format)
+    expected = set((rdflib.URIRef(s), rdflib.URIRef(AMSL + "coveredMediumID"), rdflib.URIRef(o)) for s, o in pairs)
+    assert set(graph) == expected
+
+
+def test_triple_writer_turtle_layout():
+    _, data = write([(DISCO + "Crossref", "urn:ISSN:2"), (DISCO + "Crossref", "urn:ISSN:1")], "turtle")
+    assert data == (u"@prefix amsl: <http://amsl.technology/> .\n"
+                    u"@prefix disco: <http://amsl.technology/discovery/Metadatenkollektion/> .\n\n"
+                    u"disco:Crossref amsl:coveredMediumID <urn:ISSN:1>,\n"
+                    u"        <urn:ISSN:2> .\n\n")
@@ -0,0 +1,72 @@
+# coding: utf-8
+"""
+Tests for the static task registry.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from siskin.registry import import_task_module, load_details, load_registry, scan, scan_classes
+
+
+def test_scan():
+    with tempfile.NamedTemporaryFile(mode="w", suffix=".py", delete=False) as f:
+        f.write("class Base(DefaultTask):\n    pass\n\n"
+                "class Derived(Base, luigi.ExternalTask):\n    pass\n\n"
+                "class Helper(object):\n    pass\n\n"
+                "class _Private(DefaultTask):\n    pass\n")
+    tasks = scan([f.name])
+    os.remove(f.name)
+
+    assert sorted(tasks) == ["Base", "Derived"]
+
+
+def test_scan_classes_doc_and_tag():
+    with tempfile.NamedTemporaryFile(mode="w", suffix=".py", delete=False) as f:
+        f.write("from gluish.task import BaseTask\n\n"
+                "class Base(DefaultTask):\n    \"\"\" Base. \"\"\"\n    TAG = '49'\n\n"
+                "class Derived(Base):\n    pass\n\n"
+                "class Other(BaseTask):\n    pass\n")
+    tasks = scan_classes([f.name])
+    os.remove(f.name)
+
+    assert tasks["Base"]["doc"] == " Base. "
+    assert tasks["Base"]["tag"] == "49"
+    assert tasks["Derived"]["doc"] is None
+    assert tasks["Derived"]["tag"] == "49"
+    # Base defined outside the scanned files.
+    assert tasks["Other"]["tag"] == "default"
+
+
+def test_load_details():
+    tasks, path = load_details(path=tempfile.mktemp())
+    os.remove(path)
+    assert tasks["CrossrefExport"]["tag"] == "49"
+    assert tasks["ZDBTask"]["tag"] == "default"
+    assert "ZDB" in tasks["ZDBTask"]["doc"]
+
+
+def test_load_registry_rebuild():
+    _, path = tempfile.mkstemp()
+    with open(path, "w") as output:
+        output.write("{broken")
+
+    tasks, result = load_registry(path=path)
+    assert result == path
+    assert tasks["CrossrefExport"] == "siskin.sources.crossref"
+    assert tasks["AIExport"] == "siskin.workflows.ai"
+
+    # A fresh file is used as is.
+    mtime = os.path.getmtime(path)
+    time.sleep(0.01)
+    cached, _ = load_registry(path=path)
+    assert cached == tasks
+    assert os.path.getmtime(path) == mtime
+    os.remove(path)
+
+
+def test_import_task_module():
+    assert import_task_module("CrossrefExport") == "siskin.sources.crossref"
+    assert "siskin.sources.crossref" in sys.modules
@@ -0,0 +1,75 @@
+# coding: utf-8
+"""
+Tests for concurrent page scraping.
+"""
+
+import threading
+
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler
+
+from siskin.scrape import Regex, Scraper, XPath
+from siskin.utils import SQLiteURLCache
+
+PAGE = u"""<html><head><title>Results</title></head><body>
+<div class="box floatleft">Treffer<b>1</b>-<b>20</b>von<b>%d</b></div>
+<div class="floatleft">second</div>
+</body></html>"""
+
+
+def catalog_handler(seen):
+    class Handler(BaseHTTPRequestHandler):
+        lock = threading.Lock()
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            with self.lock:
+                seen.append(self.path)
+            n = int(self.path.split("=")[-1])
+            body = (PAGE % n if n > 0 else u"Keine Ergebnisse!").encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def test_extractors():
+    assert XPath("//div[contains(concat(' ', @class, ' '), ' floatleft ')]")(PAGE % 7) == [
+        "Treffer1-20von7",
+        "second",
+    ]
+    assert XPath("string(//title)")(PAGE % 7) == "Results"
+    assert XPath("//div")(u"") == []
+    assert Regex(r"von<b>(\d+)</b>", group=1)(PAGE % 466) == "466"
+    assert Regex(r"nothing")(PAGE % 466) is None
+
+
+def test_scraper(http_server, tmpdir):
+    seen = []
+    url = http_server(catalog_handler(seen))
+    urls = ["%s/Search?lookfor=%d" % (url, i) for i in range(20)]
+    count = Regex(r"von<b>(\d+)</b>", group=1)
+
+    scraper = Scraper(cache=SQLiteURLCache(directory=str(tmpdir)), workers=4, rate=0)
+    results = list(scraper.scrape(urls, count))
+    assert results == [(u, str(i) if i > 0 else None) for i, u in enumerate(urls)]
+    assert len(seen) == 20
+
+    # Second run is served from cache.
+    scraper = Scraper(cache=SQLiteURLCache(directory=str(tmpdir)), workers=4, rate=0)
+    assert list(scraper.scrape(urls[:5]))[0][1] == u"Keine Ergebnisse!"
+    assert len(seen) == 20
+
+
+def test_scraper_rate_limit(http_server, tmpdir):
+    seen = []
+    url = http_server(catalog_handler(seen))
+    scraper = Scraper(cache=SQLiteURLCache(directory=str(tmpdir)), workers=4, rate=50)
+    limiter = scraper.limiter(url + "/a")
+    assert scraper.limiter(url + "/b") is limiter
+    assert scraper.limiter("http://example.com/") is not limiter
+    assert len(list(scraper.scrape(["%s/x=%d" % (url, i) for i in range(5)]))) == 5
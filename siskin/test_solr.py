@@ -0,0 +1,187 @@
+# coding: utf-8
+"""
+Tests for the Solr client, against a small stub Solr.
+"""
+
+import collections
+import json
+
+import pytest
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler
+from six.moves.urllib.parse import parse_qsl, urlparse
+
+from siskin.solr import SolrClient, SolrError, quote, solr_url
+
+DOCS = [
+    {
+        "source_id": "49",
+        "institution": ["DE-15", "DE-14"],
+        "issn": ["2091-2145"]
+    },
+    {
+        "source_id": "49",
+        "institution": ["DE-15"],
+        "issn": ["2091-2145", "1234-567X"]
+    },
+    {
+        "source_id": "28",
+        "institution": ["DE-14"],
+        "issn": ["1234-567X"]
+    },
+    {
+        "source_id": "28",
+        "institution": [],
+        "issn": []
+    },
+]
+
+
+def as_list(value):
+    return value if isinstance(value, list) else [value]
+
+
+def matches(doc, query):
+    """
+    Evaluate *:*, field:value, field:"value" and conjunctions with AND.
+    """
+    for clause in query.split(" AND "):
+        if clause == "*:*":
+            continue
+        field, value = clause.split(":", 1)
+        value = value.strip('"')
+        if value not in as_list(doc.get(field)):
+            return False
+    return True
+
+
+def stub_solr(requests_seen):
+    """
+    Handler answering select requests with numFound, facet fields, facet
+    queries and two level pivots. Queries containing "((" are rejected with
+    HTTP 400.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            self.answer(parse_qsl(urlparse(self.path).query))
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8")
+            self.answer(parse_qsl(body))
+
+        def answer(self, pairs):
+            requests_seen.append(pairs)
+            params = collections.defaultdict(list)
+            for key, value in pairs:
+                params[key].append(value)
+            if any("((" in value for key, value in pairs if key in ("q", "facet.query")):
+                self.send_response(400)
+                self.end_headers()
+                return
+            docs = [doc for doc in DOCS if matches(doc, params["q"][0])]
+            response = {"response": {"numFound": len(docs), "docs": []}, "facet_counts": {}}
+            for field in params.get("facet.field", []):
+                counter = collections.Counter(v for doc in docs for v in as_list(doc[field]))
+                response["facet_counts"]["facet_fields"] = {field: [x for kv in counter.most_common() for x in kv]}
+            if "facet.query" in params:
+                response["facet_counts"]["facet_queries"] = dict(
+                    (q, sum(1 for doc in docs if matches(doc, q))) for q in params["facet.query"])
+            for name in params.get("facet.pivot", []):
+                first, second = name.split(",")
+                pivot = []
+                for value in sorted(set(doc[first] for doc in docs)):
+                    subset = [doc for doc in docs if doc[first] == value]
+                    counter = collections.Counter(v for doc in subset for v in doc[second])
+                    pivot.append({
+                        "field": first,
+                        "value": value,
+                        "count": len(subset),
+                        "pivot": [{
+                            "field": second,
+                            "value": k,
+                            "count": v
+                        } for k, v in counter.items()]
+                    })
+                response["facet_counts"]["facet_pivot"] = {name: pivot}
+            body = json.dumps(response).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def test_solr_url():
+    assert solr_url("10.1.1.1:8085") == "http://10.1.1.1:8085/solr/biblio"
+    assert solr_url("http://localhost:8983/solr/biblio/") == "http://localhost:8983/solr/biblio"
+    assert solr_url("https://index.example.com/solr/biblio/select") == "https://index.example.com/solr/biblio"
+
+
+def test_quote():
+    assert quote(u'Stahl und Eisen') == u'"Stahl und Eisen"'
+    assert quote(u'a "b" c\\d') == u'"a \\"b\\" c\\\\d"'
+
+
+def test_solr_client(http_server):
+    seen = []
+    solr = SolrClient(http_server(stub_solr(seen)) + "/solr/biblio", workers=3)
+
+    assert solr.count("source_id:49") == 2
+    assert solr.counts(["issn:2091-2145", "issn:1234-567X", "issn:0000-0000"]) == [2, 2, 0]
+    assert solr.facet("source_id") == {"49": 2, "28": 2}
+    assert solr.pivot(["source_id", "institution"]) == {
+        ("28", "DE-14"): 1,
+        ("49", "DE-14"): 1,
+        ("49", "DE-15"): 2,
+    }
+
+
+def test_solr_client_facet_queries(http_server):
+    seen = []
+    solr = SolrClient(http_server(stub_solr(seen)) + "/solr/biblio", workers=2, max_url_length=200)
+    queries = ['issn:"%04d-0000"' % i for i in range(100)] + ['issn:"2091-2145"', 'issn:"1234-567X"']
+
+    counts = solr.facet_queries(queries + ['issn:"2091-2145"'], q="institution:DE-15", batch_size=50)
+
+    # Three batches, sent as POST, since the query string is long.
+    assert len(seen) == 3
+    assert counts['issn:"2091-2145"'] == 2
+    assert counts['issn:"1234-567X"'] == 1
+    assert counts['issn:"0001-0000"'] == 0
+    assert len(counts) == 102
+
+
+def test_solr_client_matching(http_server):
+    seen = []
+    solr = SolrClient(http_server(stub_solr(seen)) + "/solr/biblio/select")
+    queries = ['issn:"2091-2145"', 'issn:"1234-567X"', 'issn:"0000-0000"']
+    assert solr.matching(queries, q="institution:DE-14") == set(['issn:"2091-2145"', 'issn:"1234-567X"'])
+    assert solr.matching(queries,
+                         q="source_id:49 AND institution:DE-15") == set(['issn:"2091-2145"', 'issn:"1234-567X"'])
+    assert solr.matching(queries, q="source_id:28 AND institution:DE-15") == set()
+    assert len(seen) == 3
+
+
+def test_solr_client_rejected_queries(http_server):
+    seen = []
+    solr = SolrClient(http_server(stub_solr(seen)) + "/solr/biblio", max_tries=3)
+    queries = ['issn:"%04d-0000"' % i for i in range(6)] + ['issn:"2091-2145"', "issn:((", 'issn:"1234-567X"']
+
+    counts = solr.facet_queries(queries, q="institution:DE-15", batch_size=100)
+    assert counts["issn:(("] is None
+    assert counts['issn:"2091-2145"'] == 2
+    assert counts['issn:"0001-0000"'] == 0
+    # No retries: the batch of 9, q alone, then halves 4 and 5, 2 and 3, 1 and 2,
+    # 1 and 1 (the rejected query).
+    assert len(seen) == 10
+
+    del seen[:]
+    with pytest.raises(SolrError):
+        solr.facet_queries(queries, q="institution:((")
+    assert len(seen) == 2
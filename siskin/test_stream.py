@@ -0,0 +1,206 @@
+# coding: utf-8
+"""
+Tests for streaming record readers and the conversion loop.
+"""
+
+import gzip
+import io
+import json
+import os
+import subprocess
+import sys
+import tarfile
+
+import pymarc
+import pytest
+
+import marcx
+from siskin.stream import (MergeDuplicates, SanitizingReader, convert, convert_file, delimited_records, jsonl_records,
+                           marc_records, parallel_convert, parallel_map, tar_records, xml_control_chars, xml_records)
+from siskin.utils import xmlstream
+
+
+def test_delimited_records():
+    content = u"<record>ä</record>\n<record>b</record>\n</collection>"
+    for size in (1, 2, 3, 7, 1024):
+        records = list(delimited_records(io.BytesIO(content.encode("utf-8")), size=size))
+        assert records == content.split(u"</record>")
+    assert list(delimited_records(io.BytesIO(b""))) == [u""]
+
+
+def test_xml_records_gzip(tmpdir):
+    path = str(tmpdir.join("records.xml.gz"))
+    with gzip.open(path, "wb") as handle:
+        handle.write(b'<collection xmlns="http://x"><record><id>1</id></record><record><id>2</id></record></collection>')
+
+    assert [r["ns0:record"]["ns0:id"] for r in xml_records(path, tag="record")] == ["1", "2"]
+    assert len(list(xml_records(path, tag="record", parse=None))) == 2
+
+
+def test_tar_records():
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tar:
+        for name, data in (("a/1.xml", b"<a/>"), ("a/2.txt", b"x"), ("a/3.xml", b"<b/>")):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+        info = tarfile.TarInfo("a/dir")
+        info.type = tarfile.DIRTYPE
+        tar.addfile(info)
+
+    buf.seek(0)
+    assert list(tar_records(buf)) == [b"<a/>", b"x", b"<b/>"]
+    buf.seek(0)
+    assert list(tar_records(buf, suffix=".xml")) == [b"<a/>", b"<b/>"]
+
+
+def test_jsonl_records():
+    data = b'{"a": 1}\n\n{"a": 2}\n'
+    assert [doc["a"] for doc in jsonl_records(io.BytesIO(data))] == [1, 2]
+
+
+def make_record(identifier):
+    record = marcx.Record(force_utf8=True)
+    record.strict = False
+    record.add("001", data=identifier)
+    record.add("245", a="Title %s" % identifier)
+    return record
+
+
+def test_convert_and_marc_records():
+    def mapping(doc):
+        if doc["id"] == "skip":
+            return None
+        if doc["id"] == "fail":
+            raise ValueError("cannot convert")
+        return make_record(doc["id"])
+
+    docs = [{"id": "1"}, {"id": "skip"}, {"id": "fail"}, {"id": "2"}]
+    output = io.BytesIO()
+    stats = convert(docs, mapping, output)
+
+    assert stats["processed"] == 4
+    assert stats["written"] == 2
+    assert stats["skipped"] == 1
+    assert stats["failed"] == 1
+
+    output.seek(0)
+    assert [r["001"].value() for r in marc_records(output)] == ["1", "2"]
+
+    with pytest.raises(RuntimeError):
+        convert(docs, mapping, io.BytesIO(), max_failures=0)
+
+
+def test_convert_file(tmpdir):
+    path, output = str(tmpdir.join("input.ldj")), str(tmpdir.join("output.mrc"))
+    with open(path, "w") as f:
+        f.write("\n".join(json.dumps({"id": str(i)}) for i in range(10)))
+
+    stats = convert_file(path, output, lambda doc: make_record(doc["id"]), reader=jsonl_records)
+    assert stats["written"] == 10
+    assert len(list(marc_records(output))) == 10
+
+
+def convert_bytes(data):
+    """
+    Module level mapping, so it can be sent to worker processes.
+    """
+    value = data.decode("utf-8")
+    if value == "fail":
+        raise ValueError("cannot convert")
+    if value == "skip":
+        return None
+    return make_record(value)
+
+
+def test_parallel_convert():
+    records = [str(i).encode("utf-8") for i in range(100)] + [b"skip", b"fail"]
+    output = io.BytesIO()
+    stats = parallel_convert(records, convert_bytes, output, processes=3, batch_size=7)
+
+    assert stats["processed"] == 102
+    assert stats["written"] == 100
+    assert stats["skipped"] == 1
+    assert stats["failed"] == 1
+
+    output.seek(0)
+    assert [r["001"].value() for r in marc_records(output)] == [str(i) for i in range(100)]
+
+    with pytest.raises(RuntimeError):
+        parallel_convert(records, convert_bytes, io.BytesIO(), processes=2, max_failures=0)
+
+
+def square(batch):
+    return [v * v for v in batch]
+
+
+def test_parallel_map_order():
+    result = [v for batch in parallel_map(square, range(1000), processes=4, batch_size=10) for v in batch]
+    assert result == [v * v for v in range(1000)]
+
+
+def test_merge_duplicates():
+    records = [
+        {"id": "1", "title": u"Ä", "url": "a"},
+        {"id": "2", "title": "B", "url": "b"},
+        {"id": "3", "title": u"Ä", "url": "c"},
+        {"id": "4", "title": None, "url": "d"},
+        {"id": "5", "title": None, "url": "e"},
+        {"id": "6", "title": u"Ä", "url": ""},
+    ]
+    key = lambda r: None if r["title"] is None else (r["title"], )
+    with MergeDuplicates(key=key, field="url") as merged:
+        for record in records:
+            merged.add(record)
+        assert [(r["id"], r["url"]) for r in merged] == [("1", "a||c||"), ("2", "b"), ("4", "d"), ("5", "e")]
+        assert merged.stats == {"added": 4, "merged": 2}
+
+
+def test_merge_duplicates_missing_value():
+    records = [
+        {"id": "1", "title": "A"},
+        {"id": "2", "title": "A", "url": "b"},
+        {"id": "3", "title": "A", "url": None},
+        {"id": "4", "title": "C"},
+        {"id": "5", "title": "C"},
+    ]
+    with MergeDuplicates(key=lambda r: (r["title"], ), field="url") as merged:
+        for record in records:
+            merged.add(record)
+        assert [(r["id"], r["url"]) for r in merged] == [("1", "b"), ("4", None)]
+        assert merged.stats == {"added": 2, "merged": 3}
+
+
+def test_sanitizing_reader():
+    data = u"<a>\x01Stahl\u00ac und \u00acEisen\x1f\t\u00ac</a>\n\xc2".encode("utf-8")
+    expected = data.replace(b"\xc2\xac", b"").replace(b"\x01", b" ").replace(b"\x1f", b" ")
+    replace = xml_control_chars() + [(b"\xc2\xac", b"")]
+    for size in (1, 2, 3, 7, 1024):
+        for n in (-1, 1, 5):
+            reader = SanitizingReader(io.BytesIO(data), replace, size=size)
+            chunks = [reader.read(n)]
+            while chunks[-1]:
+                chunks.append(reader.read(n))
+            assert b"".join(chunks) == expected
+    assert SanitizingReader(io.BytesIO(data)).read() == data
+
+
+def test_sanitizing_reader_xmlstream():
+    data = b"<collection><record>a\x01b</record><record>c</record></collection>"
+    snippets = list(xmlstream(SanitizingReader(io.BytesIO(data), xml_control_chars(), size=4), "record"))
+    assert snippets == [b"<record>a b</record>", b"<record>c</record>"]
+
+
+def test_xml_records_default_namespace(tmpdir):
+    """
+    The 103 conversion reads OAI records, that declare a default namespace.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = os.path.join(root, "siskin", "assets", "103", "103_marcbinary.py")
+    output = str(tmpdir.join("103.mrc"))
+    env = dict(os.environ, PYTHONPATH=root)
+    subprocess.check_call([sys.executable, script, os.path.join(root, "fixtures", "103.xml"), output], env=env)
+    with open(output, "rb") as handle:
+        records = list(pymarc.MARCReader(handle))
+    assert [r["245"]["a"] for r in records] == ["Stadtansicht", "Hafen"]
+    assert [r["856"]["u"] for r in records] == ["http://example.org/1", "http://example.org/3"]
@@ -1,16 +1,20 @@
 import io
 import json
 import os
+import subprocess
+import sys
 import tempfile
+import zlib
 
+import pytest
 import requests
 
 import marcx
 import pymarc
 import responses
-from siskin.utils import (SetEncoder, URLCache, check_isbn, check_issn, dictcheck, get_task_import_cache, load_set,
-                          marc_build_field_008, marc_build_imprint, marc_clean_record, marc_clean_subfields, nwise,
-                          random_string, scrape_html_listing, xmlstream)
+from siskin.utils import (FileScanCache, SetEncoder, SQLiteURLCache, URLCache, check_isbn, check_issn, dictcheck,
+                          get_task_import_cache, load_set, marc_build_field_008, marc_build_imprint, marc_clean_record,
+                          marc_clean_subfields, nwise, random_string, scrape_html_listing, xmlstream)
 
 
 def test_set_encoder_dumps():
@@ -69,6 +73,52 @@ def test_get_cache_file(tmpdir):
     assert fn.startswith(str(tmpdir))
 
 
+@responses.activate
+def test_sqlite_url_cache(tmpdir):
+    responses.add(responses.GET, 'http://fake.com/1', body=u'Hällo', status=200)
+    responses.add(responses.GET, 'http://fake.com/2', body=u'x' * 1000, status=200)
+
+    cache = SQLiteURLCache(directory=str(tmpdir), shards=2)
+    assert cache.get_cache_file('http://fake.com/1').startswith(str(tmpdir))
+    assert cache.is_cached('http://fake.com/1') is False
+    assert cache.get('http://fake.com/1') == u'Hällo'
+    assert cache.is_cached('http://fake.com/1') is True
+    assert cache.get('http://fake.com/1') == u'Hällo'
+    assert len(responses.calls) == 1
+
+    cache.get('http://fake.com/2')
+    cache.remove('http://fake.com/1')
+    assert cache.is_cached('http://fake.com/1') is False
+    assert cache.is_cached('http://fake.com/2') is True
+
+    # Evict by size, then by age.
+    cache.get('http://fake.com/1')
+    assert cache.evict(max_size=20) == 1
+    assert cache.is_cached('http://fake.com/2') is False
+    assert cache.evict(max_age=-1) == 1
+    assert cache.is_cached('http://fake.com/1') is False
+
+    # Expired entries count as missing.
+    cache = SQLiteURLCache(directory=str(tmpdir), shards=2, max_age=-1)
+    cache.get('http://fake.com/1')
+    assert cache.is_cached('http://fake.com/1') is False
+
+
+@responses.activate
+def test_sqlite_url_cache_evict_oldest_across_shards(tmpdir):
+    urls = ['http://fake.com/%d' % i for i in range(8)]
+    for url in urls:
+        responses.add(responses.GET, url, body=url * 10, status=200)
+
+    cache = SQLiteURLCache(directory=str(tmpdir), shards=3)
+    for url in urls:
+        cache.get(url)
+    size = len(zlib.compress((urls[0] * 10).encode('utf-8')))
+
+    assert cache.evict(max_size=3 * size) == 5
+    assert [cache.is_cached(url) for url in urls] == [False] * 5 + [True] * 3
+
+
 @responses.activate
 def test_scrape_html_listing():
     responses.add(responses.GET, 'http://fake.com/1', body='<html></html>', status=200)
@@ -228,3 +278,49 @@ def test_check_issn():
     assert check_issn("1234-5678X") == "1234-5678"
     assert check_issn("1234-5678X3344") == "1234-5678"
     assert check_issn("9780201038019 is an valid isbn") == "978020103"
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason="module __getattr__ and -X importtime require Python 3.7+")
+def test_lazy_imports():
+    code = ("import sys, siskin.utils as u; "
+            "assert 'bs4' not in sys.modules and 'siskin.mappings' not in sys.modules; "
+            "assert u.languages['german'] == 'ger'; "
+            "assert u.requests is sys.modules['requests']")
+    subprocess.check_call([sys.executable, "-c", code])
+
+    # Import time budget, see contrib/bench_import.py.
+    bench = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "contrib", "bench_import.py")
+    subprocess.check_call([sys.executable, bench, "-n", "3"])
+
+
+def test_file_scan_cache(tmpdir):
+    paths = [str(tmpdir.join("%s.txt" % i)) for i in range(5)]
+    for path in paths:
+        with open(path, "w") as output:
+            output.write(path)
+
+    calls = []
+
+    def func(path):
+        calls.append(path)
+        return {"size": os.path.getsize(path)}
+
+    cache = FileScanCache(str(tmpdir.join("cache", "scans.db")), func=func)
+    assert cache.scan(paths) == [{"size": len(p)} for p in paths]
+    assert cache.stats["scanned"] == 5
+
+    with open(paths[0], "a") as output:
+        output.write("changed")
+    os.utime(paths[0], (0, 0))
+    cache = FileScanCache(str(tmpdir.join("cache", "scans.db")), func=func)
+    assert cache.scan(paths)[0] == {"size": len(paths[0]) + 7}
+    assert cache.stats == {"cached": 4, "scanned": 1}
+    assert calls.count(paths[0]) == 2
+
+    # Another version drops all cached results.
+    cache = FileScanCache(str(tmpdir.join("cache", "scans.db")), func=func, version="2")
+    cache.scan(paths)
+    assert cache.stats == {"cached": 0, "scanned": 5}
+    cache = FileScanCache(str(tmpdir.join("cache", "scans.db")), func=func, version="2")
+    cache.scan(paths)
+    assert cache.stats == {"cached": 5, "scanned": 0}
@@ -27,8 +27,10 @@ Various utilities.
 
 from __future__ import print_function
 
+import collections
 import errno
 import hashlib
+import heapq
 import itertools
 import json
 import logging
@@ -36,29 +38,60 @@ import operator
 import os
 import random
 import re
+import sqlite3
 import string
 import sys
 import tempfile
+import threading
+import time
 import xml.etree.cElementTree as ET
+import zlib
 
-import bs4
-import requests
 import six
-from dateutil import relativedelta
-from future import standard_library
 from six import string_types
-
-import backoff
-import luigi
-from siskin import __version__
-from siskin.mappings import languages
 from six.moves.urllib.parse import urlparse
 
 # XXX: move to six.
-standard_library.install_aliases()
+if six.PY2:
+    from future import standard_library
+    standard_library.install_aliases()
 
 logger = logging.getLogger('siskin')
 
+# Heavy dependencies are imported on first use, since most callers only need a
+# small helper. For compatibility, they are still available as module
+# attributes: lazily with a module __getattr__ (Python 3.7+), imported at
+# once on older versions.
+_lazy_attributes = {
+    'backoff': ('backoff', None),
+    'bs4': ('bs4', None),
+    'languages': ('siskin.mappings', 'languages'),
+    'luigi': ('luigi', None),
+    'relativedelta': ('dateutil.relativedelta', None),
+    'requests': ('requests', None),
+}
+
+
+def _import_attribute(name):
+    import importlib
+    modname, attr = _lazy_attributes[name]
+    value = importlib.import_module(modname)
+    if attr is not None:
+        value = getattr(value, attr)
+    globals()[name] = value
+    return value
+
+
+if sys.version_info >= (3, 7):
+
+    def __getattr__(name):
+        if name not in _lazy_attributes:
+            raise AttributeError('module %r has no attribute %r' % (__name__, name))
+        return _import_attribute(name)
+else:
+    for _name in _lazy_attributes:
+        _import_attribute(_name)
+
 
 class SetEncoder(json.JSONEncoder):
     """
@@ -175,23 +208,11 @@ def get_task_import_cache():
     (few seconds), so the import cache shortens the startup time of the command
     line tools by only importing the module the given task is in.
 
+    The mapping is built by scanning the source files, see siskin.registry.
     It is save to remove the file returned by `taskimportcache` at any time.
     """
-    task_import_cache = None
-    path = os.path.join(tempfile.gettempdir(), 'siskin_task_import_cache_%s' % __version__)
-    if not os.path.exists(path):
-        logger.debug("creating task import cache at %s", path)
-        from siskin.cacheutils import _write_task_import_cache
-        _write_task_import_cache(path)
-
-    with open(path) as handle:
-        try:
-            task_import_cache = json.load(handle)
-        except Exception as err:
-            print("failed to load task import cache, remove %s, then try again" % path, file=sys.stderr)
-            sys.exit(1)
-
-    return task_import_cache, path
+    from siskin.registry import load_registry
+    return load_registry()
 
 
 def load_set(obj, func=lambda v: v):
@@ -200,7 +221,10 @@ def load_set(obj, func=lambda v: v):
     """
     s = set()
 
-    if isinstance(obj, luigi.LocalTarget):
+    # Without luigi imported, there cannot be a luigi target.
+    luigi = sys.modules.get('luigi')
+
+    if luigi is not None and isinstance(obj, luigi.LocalTarget):
         with obj.open() as handle:
             for line in (line.strip() for line in handle):
                 if not line:
@@ -246,6 +270,8 @@ class URLCache(object):
     It is not very efficient, as it creates lots of directories.
     > 396140 directories, 334024 files ... ...
 
+    For many URLs, use SQLiteURLCache, which has the same interface.
+
     To clean the cache just remove the cache directory.
 
     >>> cache = URLCache()
@@ -275,6 +301,8 @@ class URLCache(object):
         We therefore treat HTTP 500 errors as something to retry on,
         at most `max_tries` times.
         """
+        import requests
+
         self.directory = directory or tempfile.gettempdir()
         self.sess = requests.session()
         self.max_tries = max_tries
@@ -305,6 +333,8 @@ class URLCache(object):
         """
         Return URL, either from cache or the web.
         """
+        import backoff
+
         @backoff.on_exception(backoff.expo, RuntimeError, max_tries=self.max_tries)
         def fetch(url):
             """
@@ -324,6 +354,301 @@ class URLCache(object):
             return handle.read()
 
 
+class SQLiteURLCache(object):
+    """
+    A URL content cache with the same interface as URLCache, but storing all
+    entries in a fixed number of SQLite files (shards) instead of one file per
+    URL, so lookups do not need any directory or stat calls. Bodies are stored
+    zlib compressed.
+
+    Concurrent writers (threads or processes) are fine, the shards use WAL
+    journaling and wait for locks. Entries older than `max_age` seconds count
+    as missing; `evict` removes expired entries and the least recently
+    fetched ones, until the cache is below `max_size` bytes (compressed).
+
+    >>> cache = SQLiteURLCache(directory="/tmp/.urlcache", max_age=86400)
+    >>> cache.is_cached("https://www.google.com")
+    False
+
+    >>> page = cache.get("https://www.google.com")
+    >>> cache.is_cached("https://www.google.com")
+    True
+
+    >>> cache.evict(max_size=10 * 1 << 30)
+    """
+    def __init__(self, directory=None, max_tries=12, shards=16, max_age=None, max_size=None):
+        """
+        Same as URLCache, the cache lives below `directory`, which defaults to
+        the temporary directory.
+        """
+        import requests
+
+        self.directory = directory or tempfile.gettempdir()
+        self.sess = requests.session()
+        self.max_tries = max_tries
+        self.shards = shards
+        self.max_age = max_age
+        self.max_size = max_size
+        self.local = threading.local()
+
+        if not os.path.exists(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+    def get_cache_file(self, url):
+        """
+        Return the path to the shard file, that holds the entry for a URL.
+        """
+        digest = hashlib.sha1(six.b(url)).hexdigest()
+        return os.path.join(self.directory, 'urlcache-%02d.db' % (int(digest[:8], 16) % self.shards))
+
+    def _connection(self, url):
+        """
+        Return a (per thread) connection and the key for a URL.
+        """
+        path = self.get_cache_file(url)
+        if not hasattr(self.local, 'conns'):
+            self.local.conns = {}
+        if path not in self.local.conns:
+            conn = sqlite3.connect(path, timeout=600)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""CREATE TABLE IF NOT EXISTS cache (
+                                key TEXT PRIMARY KEY,
+                                url TEXT,
+                                body BLOB,
+                                size INTEGER,
+                                fetched REAL)""")
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_fetched ON cache (fetched)')
+            self.local.conns[path] = conn
+        return self.local.conns[path], hashlib.sha1(six.b(url)).hexdigest()
+
+    def _select(self, url, column):
+        """
+        Return the row with the given column for a fresh entry or None.
+        """
+        conn, key = self._connection(url)
+        if self.max_age is None:
+            return conn.execute('SELECT %s FROM cache WHERE key = ? LIMIT 1' % column, (key, )).fetchone()
+        return conn.execute('SELECT %s FROM cache WHERE key = ? AND fetched >= ? LIMIT 1' % column,
+                            (key, time.time() - self.max_age)).fetchone()
+
+    def _lookup(self, url):
+        """
+        Return the uncompressed body or None, if there is no fresh entry.
+        """
+        row = self._select(url, 'body')
+        if row is None:
+            return None
+        return zlib.decompress(row[0]).decode('utf-8')
+
+    def is_cached(self, url):
+        return self._select(url, '1') is not None
+
+    def remove(self, url):
+        """
+        Remove a single entry, e.g. after it turned out to be garbage.
+        """
+        conn, key = self._connection(url)
+        with conn:
+            conn.execute('DELETE FROM cache WHERE key = ?', (key, ))
+
+    def get(self, url, force=False):
+        """
+        Return URL, either from cache or the web.
+        """
+        import backoff
+
+        @backoff.on_exception(backoff.expo, RuntimeError, max_tries=self.max_tries)
+        def fetch(url):
+            """
+            Nested function, so we can configure number of retries.
+            """
+            r = self.sess.get(url, timeout=600)
+            if r.status_code >= 400:
+                raise RuntimeError('%s on %s' % (r.status_code, url))
+            body = zlib.compress(r.text.encode('utf-8'))
+            conn, key = self._connection(url)
+            with conn:
+                conn.execute('INSERT OR REPLACE INTO cache (key, url, body, size, fetched) VALUES (?, ?, ?, ?, ?)',
+                             (key, url, sqlite3.Binary(body), len(body), time.time()))
+            return r.text
+
+        if not force:
+            body = self._lookup(url)
+            if body is not None:
+                return body
+        return fetch(url)
+
+    def evict(self, max_age=None, max_size=None):
+        """
+        Remove entries older than `max_age` seconds, then the oldest entries,
+        until all shards together hold at most `max_size` bytes. Defaults to
+        the values given at initialization. Returns the number of removed
+        entries.
+        """
+        max_age = max_age if max_age is not None else self.max_age
+        max_size = max_size if max_size is not None else self.max_size
+
+        conns = []
+        for i in range(self.shards):
+            path = os.path.join(self.directory, 'urlcache-%02d.db' % i)
+            if os.path.exists(path):
+                conn = sqlite3.connect(path, timeout=600)
+                conns.append(conn)
+
+        removed = 0
+        try:
+            if max_age is not None:
+                for conn in conns:
+                    with conn:
+                        removed += conn.execute('DELETE FROM cache WHERE fetched < ?',
+                                                (time.time() - max_age, )).rowcount
+            if max_size is not None:
+                total = sum(conn.execute('SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()[0] for conn in conns)
+                if total > max_size:
+                    # Global oldest first cutoff across all shards: merge the
+                    # ordered shards and count the entries to drop per shard.
+                    cursors = [
+                        conn.execute('SELECT fetched, key, size FROM cache ORDER BY fetched, key') for conn in conns
+                    ]
+                    counts = [0] * len(conns)
+                    tagged = [six.moves.map(lambda row, i=i: (row, i), cursor) for i, cursor in enumerate(cursors)]
+                    for (_, _, size), i in heapq.merge(*tagged):
+                        if total <= max_size:
+                            break
+                        counts[i] += 1
+                        total -= size
+                    for cursor in cursors:
+                        cursor.close()
+                    for conn, count in zip(conns, counts):
+                        if count == 0:
+                            continue
+                        with conn:
+                            removed += conn.execute(
+                                """DELETE FROM cache WHERE key IN (
+                                       SELECT key FROM cache ORDER BY fetched, key LIMIT ?)""", (count, )).rowcount
+        finally:
+            for conn in conns:
+                conn.close()
+        return removed
+
+
+class FileScanCache(object):
+    """
+    Persistent cache for the result of a function of a file, e.g. a validity
+    check, keyed by path, size and modification time. Files that did not
+    change since the last scan are not opened again. Results must be JSON
+    serializable.
+
+    All cached results are dropped, if `version` differs from the version
+    of the cache; change it, whenever func would return something else,
+    e.g. use a hash of a pattern func matches paths against.
+
+    >>> cache = FileScanCache("/tmp/scans.db", func=lambda path: zipfile.is_zipfile(path), version="1")
+    >>> cache.scan(["a.zip", "b.zip"], workers=8)
+    [True, False]
+
+    """
+    def __init__(self, path, func, version=''):
+        self.path = path
+        self.func = func
+        self.version = version
+
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            try:
+                os.makedirs(directory)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+        self.conn = sqlite3.connect(path, timeout=600)
+        with self.conn:
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS scans (
+                                    path TEXT PRIMARY KEY,
+                                    size INTEGER,
+                                    mtime REAL,
+                                    result TEXT)""")
+            self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if row is None or row[0] != version:
+                self.conn.execute('DELETE FROM scans')
+                self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (version, ))
+
+    def close(self):
+        self.conn.close()
+
+    def scan(self, paths, workers=4):
+        """
+        Return the results for all paths, in order. New or changed files are
+        passed to func in a pool of `workers` threads. Entries for files not
+        in paths are dropped. Sets `stats` to a counter of cached and scanned
+        files.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        cached = dict((row[0], (row[1], row[2], row[3]))
+                      for row in self.conn.execute('SELECT path, size, mtime, result FROM scans'))
+        results, pending = {}, []
+
+        for path in paths:
+            st = os.stat(path)
+            entry = cached.get(path)
+            if entry is not None and entry[:2] == (st.st_size, st.st_mtime):
+                results[path] = json.loads(entry[2])
+            else:
+                pending.append((path, st))
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            scanned = list(executor.map(lambda item: self.func(item[0]), pending))
+
+        with self.conn:
+            for (path, st), result in zip(pending, scanned):
+                results[path] = result
+                self.conn.execute('INSERT OR REPLACE INTO scans (path, size, mtime, result) VALUES (?, ?, ?, ?)',
+                                  (path, st.st_size, st.st_mtime, json.dumps(result)))
+            stale = set(cached) - set(results)
+            self.conn.executemany('DELETE FROM scans WHERE path = ?', [(path, ) for path in stale])
+
+        self.stats = collections.Counter(cached=len(results) - len(pending), scanned=len(pending))
+        return [results[path] for path in paths]
+
+
+class RateLimiter(object):
+    """
+    A thread safe, process wide politeness limit. Callers block in `wait`
+    until at least 1 / rate seconds have passed since the last granted slot,
+    regardless of which thread requested it.
+
+    >>> limiter = RateLimiter(rate=2)
+    >>> for url in urls:
+    ...     limiter.wait()
+    ...     requests.get(url)
+
+    A rate of zero or less disables limiting.
+    """
+    def __init__(self, rate=1.0):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self.lock = threading.Lock()
+        self.next_slot = 0
+
+    def wait(self):
+        """
+        Block until the next slot is available.
+        """
+        if self.interval == 0:
+            return
+        with self.lock:
+            now = time.time()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
 def scrape_html_listing(url, with_head=False):
     """
     Given a URL to a webpage containing a simple (Apache) file listing, try to
@@ -342,6 +667,9 @@ def scrape_html_listing(url, with_head=False):
     Optionally, only include links in the list which return something ok on
     HTTP HEAD (might take a while).
     """
+    import bs4
+    import requests
+
     filelike_p = re.compile(r"[0-9-_\w.]*[.][a-z0-9]{2,4}")
 
     # Find base url to prepend on relative links.
@@ -500,6 +828,7 @@ def marc_build_field_008(year="", periodicity="", language=""):
 
     if language and isinstance(language, six.string_types):
         if len(language) != 3:
+            from siskin.mappings import languages
             lang = language.lower()
             language = languages.get(lang, "   ")
             if language == "   ":
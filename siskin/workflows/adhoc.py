@@ -37,6 +37,7 @@ import luigi
 import xlsxwriter
 from gluish.format import TSV, Gzip
 from gluish.utils import shellout
+from siskin.solr import SolrClient
 from siskin.sources.amsl import AMSLCollections, AMSLService
 from siskin.sources.crossref import (CrossrefCollections, CrossrefCollectionsCount, CrossrefCollectionsDifference,
                                      CrossrefExport)
@@ -158,33 +159,36 @@ class K10Matches(AdhocTask):
 
     ai = luigi.Parameter(default="http://localhost:8983/solr/biblio")
     finc = luigi.Parameter(default="http://localhost:8983/solr/biblio")
+    workers = luigi.IntParameter(default=4, significant=False, description="concurrent solr requests")
 
     def run(self):
         r = requests.get("https://is.gd/AW3bCB")
+        rows = []
+        for line in r.text.split('\n'):
+            try:
+                issn, count = line.split(',')
+            except ValueError as exc:
+                self.logger.debug(exc)
+                continue
+            rows.append((issn, count))
+
+        # A few faceted requests per index instead of one request per ISSN.
+        queries = ["issn:%s" % issn for issn, _ in rows]
+        results = {}
+        for name, url in (('ai', self.ai), ('finc', self.finc)):
+            results[name] = SolrClient(url, workers=self.workers).facet_queries(queries)
+
+        skipped = 0
         with self.output().open("w") as output:
-            for line in r.text.split('\n'):
-                try:
-                    issn, count = line.split(',')
-
-                    results = {}
-
-                    results['ai'] = requests.get("%s/select?q=issn:%s&rows=0&wt=json" % (self.ai, issn))
-                    if results['ai'].status_code != 200:
-                        raise RuntimeError("ai reponded with %s" % rr.status_code)
-
-                    results['finc'] = requests.get("%s/select?q=issn:%s&rows=0&wt=json" % (self.finc, issn))
-                    if results['finc'].status_code != 200:
-                        raise RuntimeError("finc reponded with %s" % rr.status_code)
-
-                    output.write_tsv(
-                        issn,
-                        count,
-                        str(results['ai'].json().get("response").get("numFound")),
-                        str(results['finc'].json().get("response").get("numFound")),
-                    )
-
-                except Exception as exc:
-                    self.logger.debug(exc)
+            for (issn, count), query in zip(rows, queries):
+                ai, finc = results['ai'][query], results['finc'][query]
+                if ai is None or finc is None:
+                    # The query failed, do not report it as a count.
+                    skipped += 1
+                    continue
+                output.write_tsv(issn, count, str(ai), str(finc))
+        if skipped:
+            self.logger.warning('%d ISSN skipped, since their queries failed', skipped)
 
     def output(self):
         return luigi.LocalTarget(path=self.path(digest=True), format=TSV)
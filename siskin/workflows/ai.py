@@ -40,24 +40,26 @@ import re
 import shutil
 import string
 import tempfile
-import urllib
 
-import requests
 import six
-from bs4 import BeautifulSoup
 from dateutil.relativedelta import relativedelta
+from six.moves.urllib.parse import quote
 
 import luigi
-import rdflib
 from gluish.common import Executable
 from gluish.format import TSV, Gzip
 from gluish.intervals import weekly
 from gluish.parameter import ClosestDateParameter
 from gluish.utils import shellout
 from siskin.benchmark import timed
+from siskin.coverage import CoverageMatrix, kbart_issn_array
 from siskin.database import sqlitedb
-from siskin.sources.amsl import (AMSLFilterConfigFreeze, AMSLFreeContent, AMSLHoldingsFile, AMSLOpenAccessKBART,
-                                 AMSLService)
+from siskin.idset import SortedIdentifiers, overlaps
+from siskin.rdf import PairSet, TripleWriter
+from siskin.scrape import Scraper, XPath
+from siskin.solr import SolrClient
+from siskin.sources.amsl import (AMSLCollectionsISILList, AMSLFilterConfigFreeze, AMSLFreeContent, AMSLHoldingsFile,
+                                 AMSLOpenAccessKBART, AMSLService)
 from siskin.sources.arxiv import ArxivIntermediateSchema
 from siskin.sources.base import BaseSingleFile
 from siskin.sources.ceeol import CeeolJournalsIntermediateSchema
@@ -77,7 +79,7 @@ from siskin.sources.pqdt import PQDTIntermediateSchema
 from siskin.sources.springer import SpringerIntermediateSchema
 from siskin.sources.thieme import ThiemeIntermediateSchema, ThiemeISSNList
 from siskin.task import DefaultTask
-from siskin.utils import URLCache, load_set_from_target
+from siskin.utils import SQLiteURLCache
 
 
 class AITask(DefaultTask):
@@ -104,11 +106,18 @@ class AIDOIStats(AITask):
 
     @timed
     def run(self):
+        names = list(self.input().keys())
+        lists = [(name, SortedIdentifiers(self.input().get(name).path)) for name in names]
+        try:
+            result = overlaps(lists)
+        finally:
+            for _, ids in lists:
+                ids.close()
+
+        sizes = result.sizes
         with self.output().open('w') as output:
-            for k1, k2 in itertools.combinations(list(self.input().keys()), 2):
-                s1 = load_set_from_target(self.input().get(k1))
-                s2 = load_set_from_target(self.input().get(k2))
-                output.write_tsv(k1, k2, len(s1), len(s2), len(s1.intersection(s2)))
+            for k1, k2, common in result.pairs():
+                output.write_tsv(k1, k2, sizes[k1], sizes[k2], common)
 
     def output(self):
         return luigi.LocalTarget(path=self.path(), format=TSV)
@@ -130,11 +139,18 @@ class AIISSNStats(AITask):
 
     @timed
     def run(self):
+        names = list(self.input().keys())
+        lists = [(name, SortedIdentifiers(self.input().get(name).path)) for name in names]
+        try:
+            result = overlaps(lists)
+        finally:
+            for _, ids in lists:
+                ids.close()
+
+        sizes = result.sizes
         with self.output().open('w') as output:
-            for k1, k2 in itertools.combinations(list(self.input().keys()), 2):
-                s1 = load_set_from_target(self.input().get(k1))
-                s2 = load_set_from_target(self.input().get(k2))
-                output.write_tsv(k1, k2, len(s1), len(s2), len(s1.intersection(s2)))
+            for k1, k2, common in result.pairs():
+                output.write_tsv(k1, k2, sizes[k1], sizes[k2], common)
 
     def output(self):
         return luigi.LocalTarget(path=self.path(), format=TSV)
@@ -156,12 +172,24 @@ class AIISSNOverlaps(AITask):
 
     @timed
     def run(self):
+        names = list(self.input().keys())
+        common = collections.defaultdict(list)
+
+        def collect(value, combination):
+            for pair in itertools.combinations(combination, 2):
+                common[pair].append(value)
+
+        lists = [(name, SortedIdentifiers(self.input().get(name).path)) for name in names]
+        try:
+            overlaps(lists, callback=collect)
+        finally:
+            for _, ids in lists:
+                ids.close()
+
         with self.output().open('w') as output:
-            for k1, k2 in itertools.combinations(list(self.input().keys()), 2):
-                s1 = load_set_from_target(self.input().get(k1))
-                s2 = load_set_from_target(self.input().get(k2))
-                for issn in sorted(s1.intersection(s2)):
-                    output.write_tsv(k1, k2, issn)
+            for k1, k2 in itertools.combinations(names, 2):
+                for issn in common[(k1, k2)]:
+                    output.write_tsv(k1, k2, issn.decode('utf-8'))
 
     def output(self):
         return luigi.LocalTarget(path=self.path(), format=TSV)
@@ -532,46 +560,42 @@ class AICollectionsAndSerialNumbers(AITask):
     names from AMSL - however, the raw data contains these names ...
     """
     date = ClosestDateParameter(default=datetime.date.today())
+    format = luigi.Parameter(default='turtle', description='turtle or nt')
 
     def requires(self):
         return AIIntermediateSchema(date=self.date)
 
     def run(self):
         """
-        Create a graph with two namespaces.
+        Collect distinct (collection, ISSN) pairs on disk, then write them out
+        as turtle or n-triples, grouped by collection.
         """
-        g = rdflib.Graph()
-        ns = {
-            "amsl": rdflib.Namespace('http://amsl.technology/'),
-            "disco": rdflib.Namespace('http://amsl.technology/discovery/Metadatenkollektion/'),
-        }
-
-        p = ns["amsl"].coveredMediumID
-        disco = ns["disco"]
-
-        with self.input().open() as handle:
-            for i, line in enumerate(handle):
-                if i % 100000 == 0:
-                    self.logger.debug("%s %s", i, len(g))
-
-                doc = json.loads(line)
-                issns = list(itertools.chain(doc.get('rft.issn', []), doc.get('rft.eissn', [])))
-                colls = doc.get('finc.mega_collection', [])
+        amsl = 'http://amsl.technology/'
+        disco = 'http://amsl.technology/discovery/Metadatenkollektion/'
 
-                for issn in issns:
-                    for c in colls:
-                        s = disco[urllib.quote(c.encode('utf-8'))]
+        with PairSet() as pairs:
+            with self.input().open() as handle:
+                for i, line in enumerate(handle):
+                    if i % 100000 == 0:
+                        self.logger.debug("%s", i)
 
-                        uri = 'urn:ISSN:%s' % urllib.quote(issn)
-                        o = rdflib.URIRef(uri.strip())
+                    doc = json.loads(line)
+                    issns = list(itertools.chain(doc.get('rft.issn', []), doc.get('rft.eissn', [])))
+                    colls = doc.get('finc.mega_collection', [])
 
-                        g.add((s, p, o))
+                    for issn in issns:
+                        o = ('urn:ISSN:%s' % quote(issn.encode('utf-8'))).strip()
+                        for c in colls:
+                            pairs.add(disco + quote(c.encode('utf-8')), o)
 
-        with self.output().open('w') as output:
-            output.write(g.serialize(format='turtle'))
+            with self.output().open('w') as output:
+                writer = TripleWriter(output, format=self.format, prefixes={'amsl': amsl, 'disco': disco})
+                for s, objects in pairs.groups():
+                    writer.write(s, amsl + 'coveredMediumID', objects)
+                writer.close()
 
     def output(self):
-        return luigi.LocalTarget(path=self.path(ext='ttl'))
+        return luigi.LocalTarget(path=self.path(ext='ttl' if self.format == 'turtle' else 'nt'))
 
 
 class AICoverageISSN(AITask):
@@ -607,37 +631,59 @@ class AICoverageISSN(AITask):
         }
 
     def run(self):
-        issns = collections.defaultdict(set)
+        sources = ['crossref', 'jstor', 'degruyter', 'doaj', 'gbi', 'elsevierjournals', 'thieme']
+        matrix = CoverageMatrix.from_targets(self.input(), sources)
 
         with self.input().get('file').open() as handle:
-            for row in handle:
-                fields = row.strip().split('\t')
-                if len(fields) < 3:
-                    continue
+            issns = kbart_issn_array(handle)
 
-                if re.search(r'[0-9]{4}-[0-9]{3}[0-9X]', fields[1]):
-                    issns['file'].add(fields[1])
+        with self.output().open('w') as output:
+            for issn, label in matrix.report(issns):
+                output.write_tsv(issn, label)
 
-                if re.search(r'[0-9]{4}-[0-9]{3}[0-9X]', fields[2]):
-                    issns['file'].add(fields[2])
+    def output(self):
+        return luigi.LocalTarget(path=self.path(), format=TSV)
 
-        sources = ['crossref', 'jstor', 'degruyter', 'doaj', 'gbi', 'elsevierjournals', 'thieme']
 
-        for source in sources:
-            with self.input().get(source).open() as handle:
-                for row in handle:
-                    issns[source].add(row.strip())
+class AICoverageISSNMatrix(AITask):
+    """
+    Like AICoverageISSN, but for the holding files of all ISIL of a shard at
+    once. The source lists are only loaded once.
+
+    DE-15   2091-2145   crossref|doaj
+    DE-15   2091-2730   NOT_FOUND
+    DE-105  0171-4880   crossref
+    """
+    date = ClosestDateParameter(default=datetime.date.today())
+    shard = luigi.Parameter(default='UBL-ai', description='only collect items for this shard')
+
+    def requires(self):
+        return {
+            'crossref': CrossrefUniqISSNList(date=self.date),
+            'jstor': JstorISSNList(date=self.date),
+            'degruyter': DegruyterISSNList(date=self.date),
+            'doaj': DOAJISSNList(date=self.date),
+            'gbi': GeniosISSNList(date=self.date),
+            'elsevierjournals': ElsevierJournalsISSNList(date=self.date),
+            'thieme': ThiemeISSNList(date=self.date),
+            'isils': AMSLCollectionsISILList(shard=self.shard),
+        }
+
+    def run(self):
+        with self.input().get('isils').open() as handle:
+            isils = [row.isil for row in handle.iter_tsv(cols=('isil', ))]
+
+        files = yield dict((isil, AMSLHoldingsFile(isil=isil)) for isil in isils)
+
+        sources = ['crossref', 'jstor', 'degruyter', 'doaj', 'gbi', 'elsevierjournals', 'thieme']
+        matrix = CoverageMatrix.from_targets(self.input(), sources)
 
         with self.output().open('w') as output:
-            for issn in sorted(issns['file']):
-                fields = []
-                for source in sources:
-                    if issn in issns[source]:
-                        fields.append(source)
-                if len(fields) == 0:
-                    output.write_tsv(issn, "NOT_FOUND")
-                else:
-                    output.write_tsv(issn, "|".join(fields))
+            for isil in isils:
+                with files[isil].open() as handle:
+                    issns = kbart_issn_array(handle)
+                for issn, label in matrix.report(issns):
+                    output.write_tsv(isil, issn, label)
 
     def output(self):
         return luigi.LocalTarget(path=self.path(), format=TSV)
@@ -658,6 +704,8 @@ class AIISSNCoverageCatalogMatches(AITask):
     """
     date = ClosestDateParameter(default=datetime.date.today())
     isil = luigi.Parameter(default='DE-15')
+    workers = luigi.IntParameter(default=4, significant=False, description='concurrent requests')
+    rate = luigi.FloatParameter(default=2.0, significant=False, description='requests per second')
 
     def requires(self):
         return AICoverageISSN(date=self.date, isil=self.isil)
@@ -666,40 +714,43 @@ class AIISSNCoverageCatalogMatches(AITask):
         if not self.isil == 'DE-15':
             raise RuntimeError('not implemented except for DE-15')
 
-        cache = URLCache(directory=os.path.join(tempfile.gettempdir(), '.urlcache'))
-        adapter = requests.adapters.HTTPAdapter(max_retries=3)
-        cache.sess.mount('http://', adapter)
+        cache = SQLiteURLCache(directory=os.path.join(tempfile.gettempdir(), '.urlcache'))
+        scraper = Scraper(cache=cache, workers=self.workers, rate=self.rate)
+        floatleft = XPath("//div[contains(concat(' ', normalize-space(@class), ' '), ' floatleft ')]")
+
+        def status(body):
+            if 'Keine Ergebnisse!' in body:
+                return 'ERR_NOT_IN_CATALOG'
+            rs = floatleft(body)
+            if len(rs) == 0:
+                return 'ERR_LAYOUT'
+            match = re.search(r'Treffer([0-9]+)-([0-9]+)von([0-9]+)', rs[0])
+            if match:
+                return 'FOUND_RESULTS_%s' % match.group(3)
+            return 'ERR_NO_MATCH'
 
         with self.input().open() as handle:
-            with self.output().open('w') as output:
-                for i, row in enumerate(handle.iter_tsv(cols=('issn', 'status'))):
-                    if row.status == 'NOT_FOUND':
-                        link = 'https://katalog.ub.uni-leipzig.de/Search/Results?lookfor=%s&type=ISN' % row.issn
-                        self.logger.info('fetch #%05d: %s' % (i, link))
-                        body = cache.get(link)
-                        if 'Keine Ergebnisse!' in body:
-                            output.write_tsv(row.issn, 'ERR_NOT_IN_CATALOG', link)
-                        else:
-                            soup = BeautifulSoup(body)
-                            rs = soup.findAll("div", {"class": "floatleft"})
-                            if len(rs) == 0:
-                                output.write_tsv(row.issn, 'ERR_LAYOUT', link)
-                                continue
-                            first = rs[0]
-                            match = re.search(r'Treffer([0-9]+)-([0-9]+)von([0-9]+)', first.text)
-                            if match:
-                                total = match.group(3)
-                                output.write_tsv(row.issn, 'FOUND_RESULTS_%s' % total, link)
-                            else:
-                                output.write_tsv(row.issn, 'ERR_NO_MATCH', link)
+            issns = [row.issn for row in handle.iter_tsv(cols=('issn', 'status')) if row.status == 'NOT_FOUND']
+
+        links = ['https://katalog.ub.uni-leipzig.de/Search/Results?lookfor=%s&type=ISN' % issn for issn in issns]
+        with self.output().open('w') as output:
+            for i, (issn, (link, result)) in enumerate(zip(issns, scraper.scrape(links, status))):
+                if i % 1000 == 0:
+                    self.logger.info('fetched %d/%d', i, len(links))
+                output.write_tsv(issn, result, link)
 
     def output(self):
         return luigi.LocalTarget(path=self.path(), format=TSV)
 
 
 class AIISSNCoverageSolrMatches(AITask):
+    """
+    Number of documents per ISSN of a holding file, in finc (if not found in
+    AI) or AI.
+    """
     date = ClosestDateParameter(default=datetime.date.today())
     isil = luigi.Parameter(default='DE-15')
+    workers = luigi.IntParameter(default=4, significant=False, description='concurrent solr requests')
 
     def requires(self):
         return AICoverageISSN(date=self.date, isil=self.isil)
@@ -708,30 +759,27 @@ class AIISSNCoverageSolrMatches(AITask):
         if self.isil != 'DE-15':
             raise RuntimeError('not implemented except for DE-15')
 
-        cache = URLCache(directory=os.path.join(tempfile.gettempdir(), '.urlcache'))
-        adapter = requests.adapters.HTTPAdapter(max_retries=3)
-        cache.sess.mount('http://', adapter)
-
         finc = self.config.get('ai', 'finc-solr')
         ai = self.config.get('ai', 'ai-solr')
 
-        def numFound(link):
-            """ Given a SOLR query URL, return the number of docs found. """
-            body = cache.get(link)
-            content = json.loads(body)
-            return content['response']['numFound']
-
         with self.input().open() as handle:
-            with self.output().open('w') as output:
-                for i, row in enumerate(handle.iter_tsv(cols=('issn', 'status'))):
-                    if row.status == 'NOT_FOUND':
-                        link = '%s/select?q=institution:%s+AND+issn:%s&wt=json' % (finc, self.isil, row.issn)
-                        self.logger.info('fetch #%05d: %s', i, link)
-                        output.write_tsv('finc', row.issn, numFound(link), link)
-                    else:
-                        link = '%s/select?q=institution:%s+AND+issn:%s&wt=json' % (ai, self.isil, row.issn)
-                        self.logger.info('fetch #%05d: %s', i, link)
-                        output.write_tsv('ai', row.issn, numFound(link), link)
+            rows = list(handle.iter_tsv(cols=('issn', 'status')))
+
+        # Count all ISSN of an index with a few faceted requests.
+        counts = {}
+        for name, url in (('finc', finc), ('ai', ai)):
+            issns = [row.issn for row in rows if (row.status == 'NOT_FOUND') == (name == 'finc')]
+            solr = SolrClient(url, workers=self.workers)
+            found = solr.facet_queries(['issn:"%s"' % issn for issn in issns], q='institution:%s' % self.isil)
+            for issn in issns:
+                counts[(name, issn)] = found['issn:"%s"' % issn]
+            self.logger.debug('counted %d ISSN in %s', len(issns), url)
+
+        with self.output().open('w') as output:
+            for row in rows:
+                name, url = ('finc', finc) if row.status == 'NOT_FOUND' else ('ai', ai)
+                link = '%s/select?q=institution:%s+AND+issn:%s&wt=json' % (url, self.isil, row.issn)
+                output.write_tsv(name, row.issn, counts[(name, row.issn)], link)
 
     def output(self):
         return luigi.LocalTarget(path=self.path(), format=TSV)